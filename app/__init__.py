@@ -1,31 +1,91 @@
 # ABOUTME: Flask application factory and initialization
-# ABOUTME: Creates and configures the Flask app with all extensions and blueprints
+# ABOUTME: Creates the full admin app or a lean profile serving only MediaMTX auth
 
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
-from flask_migrate import Migrate
-from flask_login import LoginManager
 
+from app.database import RoutingSession
 from config import config_by_name
 
-# Initialize extensions
-db = SQLAlchemy()
-migrate = Migrate()
-login_manager = LoginManager()
+# Initialize extensions (Flask-Migrate and Flask-Login are set up by the full profile only)
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+login_manager = None
 
+PROFILES = ('full', 'auth')
 
-def create_app(config_name='default'):
-    """Application factory pattern for creating Flask app instances"""
+
+def create_app(config_name='default', profile=None):
+    """
+    Application factory pattern for creating Flask app instances
+
+    The 'full' profile (the default) serves everything. The 'auth' profile
+    registers only the MediaMTX blueprint and the database, and never imports
+    Flask-Migrate, Flask-Login, forms or ldap3, so auth workers start faster.
+    The profile comes from APP_PROFILE unless given.
+    """
     app = Flask(__name__)
 
     # Load configuration
     app.config.from_object(config_by_name[config_name])
+    profile = profile or app.config.get('APP_PROFILE', 'full')
+    if profile not in PROFILES:
+        raise ValueError(f'Unknown APP_PROFILE: {profile}')
+    app.config['APP_PROFILE'] = profile
 
     # Initialize extensions with app
+    from app import database
+    database.configure(app)
     db.init_app(app)
-    migrate.init_app(app, db)
+    database.init_engines(app)
+
+    from app.query_stats import query_stats
+    query_stats.init_app(app)
+
+    from app.services.invalidation import invalidation_bus
+    from app.services.key_snapshot import key_snapshot
+    from app.services.change_feed import init_change_feed
+    from app.services.stats_service import init_stats_counters
+    from app.services.customer_service import init_customer_versions
+    from app.services.warmup import warmup
+    from app.services.write_queue import write_queue
+    invalidation_bus.init_app(app)
+    key_snapshot.init_app(app)
+    init_change_feed()
+    init_stats_counters()
+    init_customer_versions()
+    warmup.init_app(app)
+    write_queue.init_app(app)
+
+    from app.mediamtx import mediamtx_bp
+    app.register_blueprint(mediamtx_bp, url_prefix='/api')
+
+    if profile == 'auth':
+        return app
+
+    _init_admin(app)
+    return app
+
+
+def _init_admin(app):
+    """Set up migrations, logins, background jobs and the admin blueprints"""
+    global login_manager
+    from flask_migrate import Migrate
+    from flask_login import LoginManager
+
+    Migrate(app, db)
+    if login_manager is None:
+        login_manager = LoginManager()
     login_manager.init_app(app)
 
+    from app.services.expiry import expiry_scheduler
+    from app.services.ldap_sync import ldap_sync_scheduler
+    from app.services.ldap_executor import ldap_executor
+    from app.services.principal_cache import principal_cache
+    expiry_scheduler.init_app(app)
+    ldap_sync_scheduler.init_app(app)
+    ldap_executor.init_app(app)
+    principal_cache.init_app(app)
+
     # Configure login manager
     login_manager.login_view = 'auth.login'
     login_manager.login_message = 'Please log in to access this page.'
@@ -37,12 +97,10 @@ def create_app(config_name='default'):
     app.register_blueprint(auth_bp, url_prefix='/auth')
     app.register_blueprint(api_bp, url_prefix='/api')
 
-    # Register user loader
-    from app.models.user import User
-
+    # Register user loader: a cached principal, not a User row, per request
     @login_manager.user_loader
     def load_user(user_id):
-        return User.query.get(int(user_id))
+        return principal_cache.get(int(user_id))
 
     # Add root route
     from flask import redirect, url_for
@@ -54,5 +112,3 @@ def create_app(config_name='default'):
         if current_user.is_authenticated:
             return redirect(url_for('api.dashboard'))
         return redirect(url_for('auth.login'))
-
-    return app
@@ -1,8 +1,12 @@
-# ABOUTME: API blueprint initialization for MediaMTX integration and admin endpoints
-# ABOUTME: Provides external auth webhook and customer management APIs
+# ABOUTME: API blueprint initialization for the admin UI and management endpoints
+# ABOUTME: Provides the customer, API key and user management pages and APIs
 
 from flask import Blueprint
+from app.database import remember_write
 
 api_bp = Blueprint('api', __name__)
 
-from app.api import routes, mediamtx
+# After a write, this user's REST reads skip the replicas for a while
+api_bp.after_request(remember_write)
+
+from app.api import routes
@@ -0,0 +1,30 @@
+# ABOUTME: Weak ETags and If-None-Match handling for REST resources with version counters
+# ABOUTME: Lets a view answer 304 from a version lookup, before loading or serializing anything
+
+from typing import Optional
+from flask import Response, request
+
+
+def version_etag(*parts) -> str:
+    """ETag value from a resource name and its version counters"""
+    return '.'.join(str(part) for part in parts)
+
+
+def not_modified(etag: str) -> Optional[Response]:
+    """A 304 response if the request's If-None-Match already holds etag, else None"""
+    if request.if_none_match.contains_weak(etag):
+        return tagged(Response(status=304), etag)
+    return None
+
+
+def tagged(response: Response, etag: str) -> Response:
+    """
+    Set a weak ETag on a successful response
+
+    Weak, because usage timestamps such as last_used_at are left out of the
+    version counters: a 304 means nothing but those has changed.
+    """
+    if response.status_code in (200, 304):
+        response.set_etag(etag, weak=True)
+        response.headers['Cache-Control'] = 'private, no-cache'
+    return response
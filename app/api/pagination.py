@@ -0,0 +1,112 @@
+# ABOUTME: Keyset pagination and NDJSON streaming for the REST list endpoints, offset pages for search
+# ABOUTME: List pages are ordered by id and continue after the last id returned; without paging, the full list streams
+
+import json
+from typing import Callable
+
+from flask import Response, current_app, jsonify, request, stream_with_context, url_for
+from app import db
+
+
+# Any of these asks for id-ordered pages; without them a list endpoint returns every row as before
+PAGE_ARGS = ('after_id', 'limit', 'format')
+
+
+class PageArgsError(ValueError):
+    """Invalid after_id, limit or format query parameter"""
+
+
+def _non_negative_int(name: str, default):
+    value = request.args.get(name)
+    if value is None:
+        return default
+    if not value.isdigit():
+        raise PageArgsError(f'{name} must be a non-negative integer')
+    return int(value)
+
+
+def _json_array(rows, serialize: Callable[[object], dict]):
+    yield '['
+    for i, row in enumerate(rows):
+        yield (',' if i else '') + json.dumps(serialize(row))
+    yield ']'
+
+
+def list_response(statement, serialize: Callable[[object], dict], full_order=()):
+    """
+    Respond with one page of statement's rows (a select of one model), or all of them as NDJSON
+
+    Without any of the PAGE_ARGS, every row is returned as one JSON array in
+    full_order, the response these endpoints gave before they were paged. It
+    streams API_STREAM_BATCH_SIZE rows at a time, like NDJSON.
+
+    Query parameters:
+    - after_id: only rows with a larger id (default 0)
+    - limit: page size (default API_PAGE_SIZE, at most API_MAX_PAGE_SIZE)
+    - format=ndjson: stream one JSON object per line instead of a page, reading
+      API_STREAM_BATCH_SIZE rows at a time; limit then defaults to no limit
+
+    A page is a JSON array. When more rows follow, a Link header with
+    rel="next" gives the URL of the next page.
+    """
+    if not any(name in request.args for name in PAGE_ARGS):
+        rows = db.session.execute(statement.order_by(*full_order).execution_options(
+            yield_per=current_app.config.get('API_STREAM_BATCH_SIZE', 1000)
+        )).scalars()
+        return Response(stream_with_context(_json_array(rows, serialize)), mimetype='application/json')
+
+    try:
+        after_id = _non_negative_int('after_id', 0)
+        output = request.args.get('format', 'json')
+        if output not in ('json', 'ndjson'):
+            raise PageArgsError('format must be json or ndjson')
+        stream = output == 'ndjson'
+        limit = _non_negative_int('limit', None if stream else current_app.config.get('API_PAGE_SIZE', 100))
+        if not stream:
+            limit = min(max(limit, 1), current_app.config.get('API_MAX_PAGE_SIZE', 1000))
+    except PageArgsError as e:
+        return jsonify({'error': str(e)}), 400
+
+    id_column = statement.column_descriptions[0]['entity'].id
+    statement = statement.where(id_column > after_id).order_by(id_column)
+    if stream:
+        if limit is not None:
+            statement = statement.limit(limit)
+        # Run the query now, inside the view, so it uses this request's read routing
+        rows = db.session.execute(statement.execution_options(
+            yield_per=current_app.config.get('API_STREAM_BATCH_SIZE', 1000)
+        )).scalars()
+        lines = (json.dumps(serialize(row)) + '\n' for row in rows)
+        return Response(stream_with_context(lines), mimetype='application/x-ndjson')
+
+    rows = db.session.execute(statement.limit(limit + 1)).scalars().all()
+    response = jsonify([serialize(row) for row in rows[:limit]])
+    if len(rows) > limit:
+        next_url = url_for(request.endpoint, **request.view_args, after_id=rows[limit - 1].id, limit=limit)
+        response.headers['Link'] = f'<{next_url}>; rel="next"'
+    return response
+
+
+def ranked_response(search: Callable[[int, int], list], serialize: Callable[[object], dict]):
+    """
+    Respond with one page of ranked results: search(limit, offset) returns them best first
+
+    Ranked results have no id order to continue from, so they page by offset.
+    Query parameters: offset (default 0) and limit (default API_PAGE_SIZE, at
+    most API_MAX_PAGE_SIZE). When more results follow, a Link header with
+    rel="next" gives the URL of the next page.
+    """
+    try:
+        offset = _non_negative_int('offset', 0)
+        limit = _non_negative_int('limit', current_app.config.get('API_PAGE_SIZE', 100))
+        limit = min(max(limit, 1), current_app.config.get('API_MAX_PAGE_SIZE', 1000))
+    except PageArgsError as e:
+        return jsonify({'error': str(e)}), 400
+
+    rows = search(limit + 1, offset)
+    response = jsonify([serialize(row) for row in rows[:limit]])
+    if len(rows) > limit:
+        args = dict(request.args, offset=offset + limit, limit=limit)
+        next_url = url_for(request.endpoint, **request.view_args, **args)
+        response.headers['Link'] = f'<{next_url}>; rel="next"'
+    return response
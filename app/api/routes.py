@@ -1,21 +1,31 @@
 # ABOUTME: Admin API routes for customer and API key management
 # ABOUTME: Provides CRUD operations for managing customers and their access keys
 
-from flask import render_template, request, jsonify, flash, redirect, url_for
+from flask import current_app, render_template, request, jsonify, flash, redirect, url_for, make_response
 from flask_login import login_required, current_user
 from app.api import api_bp
+from app.api.etags import not_modified, tagged, version_etag
+from app.api.pagination import list_response, ranked_response
 from app.auth.decorators import admin_required
+from app.database import replica_reads
+from app.models.api_key import ALL_ACTIONS, ApiKey
+from app.models.customer import Customer
 from app.services.customer_service import CustomerService
 from app.services.api_key_service import ApiKeyService
+from app.services.search_service import SearchService
+from app.services.stats_service import StatsService
 from app.services.user_service import UserService
 
+# Customers listed under "Recent Customers" on the dashboard
+DASHBOARD_CUSTOMERS = 10
+
 
 @api_bp.route('/dashboard')
 @login_required
 def dashboard():
     """Main dashboard showing customers and statistics"""
-    customers = CustomerService.get_all_customers()
-    return render_template('dashboard.html', customers=customers)
+    customers = StatsService.customers_with_key_counts(limit=DASHBOARD_CUSTOMERS)
+    return render_template('dashboard.html', customers=customers, stats=StatsService.get_counters())
 
 
 # Customer Management Routes
@@ -23,9 +33,26 @@ def dashboard():
 @api_bp.route('/customers', methods=['GET'])
 @login_required
 def list_customers():
-    """List all customers"""
-    customers = CustomerService.get_all_customers()
-    return render_template('customers/list.html', customers=customers)
+    """List customers newest first, or with ?q= the best matching customers and API keys, a page at a time"""
+    query = request.args.get('q', '').strip()
+    if not query:
+        page_size = current_app.config.get('CUSTOMERS_PAGE_SIZE', 50)
+        after_id = request.args.get('after_id', type=int)
+        rows = StatsService.customers_with_key_counts(limit=page_size + 1, after_id=after_id)
+        next_after_id = rows[page_size - 1].Customer.id if len(rows) > page_size else None
+        return render_template(
+            'customers/list.html', query=query, customers=rows[:page_size],
+            after_id=after_id, next_after_id=next_after_id,
+        )
+
+    page_size = current_app.config.get('SEARCH_PAGE_SIZE', 25)
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    matches = SearchService.search_customers(query, limit=page_size + 1, offset=offset)
+    keys = SearchService.search_keys(query, limit=page_size) if offset == 0 else []
+    return render_template(
+        'customers/list.html', query=query, keys=keys, offset=offset, page_size=page_size,
+        customers=StatsService.with_key_counts(matches[:page_size]), has_more=len(matches) > page_size,
+    )
 
 
 @api_bp.route('/customers/create', methods=['GET', 'POST'])
@@ -120,8 +147,7 @@ def create_api_key(customer_id):
             api_key, plaintext = ApiKeyService.create_api_key(
                 customer_id=customer_id,
                 name=data['name'],
-                can_publish=data.get('can_publish', 'off') == 'on',
-                can_read=data.get('can_read', 'off') == 'on',
+                actions=[a for a in ALL_ACTIONS if data.get(f'can_{a}', 'off') == 'on'],
                 expires_in_days=int(data['expires_in_days']) if data.get('expires_in_days') else None
             )
             flash('API key created successfully!', 'success')
@@ -179,28 +205,76 @@ def delete_api_key(key_id):
 
 @api_bp.route('/api/v1/customers', methods=['GET'])
 @login_required
+@replica_reads
 def api_list_customers():
-    """REST API: List all customers"""
-    customers = CustomerService.get_all_customers()
-    return jsonify([c.to_dict() for c in customers])
+    """REST API: List customers, all newest first, or by id a page at a time or streamed (see list_response)"""
+    return list_response(
+        CustomerService.select_customers(), lambda c: c.to_dict(),
+        full_order=(Customer.created_at.desc(), Customer.id.desc()),
+    )
 
 
 @api_bp.route('/api/v1/customers/<int:customer_id>', methods=['GET'])
 @login_required
+@replica_reads
 def api_get_customer(customer_id):
-    """REST API: Get customer details"""
-    customer = CustomerService.get_customer_by_id(customer_id)
-    if not customer:
+    """REST API: Get customer details; 304 when If-None-Match holds the current ETag"""
+    versions = CustomerService.get_versions(customer_id)
+    if not versions:
         return jsonify({'error': 'Customer not found'}), 404
-    return jsonify(customer.to_dict(include_keys=True))
+    etag = version_etag('customer', customer_id, *versions)
+    cached = not_modified(etag)
+    if cached:
+        return cached
+    customer = CustomerService.get_customer_by_id(customer_id)
+    return tagged(jsonify(customer.to_dict(include_keys=True)), etag)
 
 
 @api_bp.route('/api/v1/customers/<int:customer_id>/keys', methods=['GET'])
 @login_required
+@replica_reads
 def api_list_keys(customer_id):
-    """REST API: List API keys for a customer"""
-    keys = ApiKeyService.get_customer_keys(customer_id)
-    return jsonify([k.to_dict() for k in keys])
+    """
+    REST API: List a customer's API keys, all newest first, or by id a page at a time or streamed (see list_response)
+
+    The ETag follows the customer's keys_version, so any key change for the
+    customer invalidates every page.
+    """
+    versions = CustomerService.get_versions(customer_id)
+    etag = version_etag('keys', customer_id, versions[1]) if versions else None
+    if etag:
+        cached = not_modified(etag)
+        if cached:
+            return cached
+    response = make_response(list_response(
+        ApiKeyService.select_customer_keys(customer_id), lambda k: k.to_dict(),
+        full_order=(ApiKey.created_at.desc(), ApiKey.id.desc()),
+    ))
+    return tagged(response, etag) if etag else response
+
+
+@api_bp.route('/api/v1/search/customers', methods=['GET'])
+@login_required
+@replica_reads
+def api_search_customers():
+    """REST API: Customers matching ?q=, best first, a page at a time (see ranked_response)"""
+    query = request.args.get('q')
+    return ranked_response(
+        lambda limit, offset: SearchService.search_customers(query, limit=limit, offset=offset),
+        lambda c: c.to_dict(),
+    )
+
+
+@api_bp.route('/api/v1/search/keys', methods=['GET'])
+@login_required
+@replica_reads
+def api_search_keys():
+    """REST API: API keys matching ?q= by name or prefix, best first, a page at a time (see ranked_response)"""
+    query = request.args.get('q')
+    return ranked_response(
+        lambda limit, offset: SearchService.search_keys(query, limit=limit, offset=offset),
+        lambda k: k.to_dict(),
+    )
 
 
 # User Management Routes
@@ -1,6 +1,8 @@
 # ABOUTME: Authentication routes for LDAP/AD login and session management
 # ABOUTME: Handles user login, logout, and profile using custom LDAP service
 
+from datetime import datetime
+
 from flask import render_template, redirect, url_for, flash, request
 from flask_login import login_user, logout_user, login_required, current_user
 
@@ -8,6 +10,7 @@ from app.auth import auth_bp
 from app.auth.forms import LoginForm
 from app import db
 from app.models.user import User
+from app.services.ldap_executor import LDAPUnavailable
 from app.services.ldap_service import LDAPService
 
 
@@ -24,7 +27,11 @@ def login():
         password = form.password.data
 
         # Authenticate against LDAP
-        ldap_user = LDAPService.authenticate(username, password)
+        try:
+            ldap_user = LDAPService.authenticate(username, password)
+        except LDAPUnavailable:
+            flash('The directory is unavailable. Please try again shortly.', 'warning')
+            return render_template('auth/login.html', form=form), 503
 
         if ldap_user:
             # Get or create user in our database
@@ -37,6 +44,7 @@ def login():
                     email=ldap_user.get('email'),
                     display_name=ldap_user.get('display_name'),
                     dn=ldap_user.get('dn'),
+                    dn_resolved_at=datetime.utcnow(),
                 )
                 db.session.add(user)
                 db.session.commit()
@@ -74,4 +82,4 @@ def logout():
 @login_required
 def profile():
     """User profile page"""
-    return render_template('auth/profile.html', user=current_user)
+    return render_template('auth/profile.html', user=User.query.get_or_404(current_user.id))
@@ -0,0 +1,397 @@
+# ABOUTME: Engine and session setup beyond Flask-SQLAlchemy defaults: pools, SQLite production mode and read routing
+# ABOUTME: Sizes and instruments connection pools, gives MediaMTX its own pool and sends reads to replicas
+
+import itertools
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import partial, wraps
+from typing import Dict, Optional
+
+from flask import current_app, request, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, text
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.exc import InterfaceError, OperationalError, SQLAlchemyError, TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.sql import Select
+
+from app.metrics import metrics
+
+# Bind key of the primary database with its own pool for the MediaMTX endpoints
+AUTH_BIND = 'auth'
+
+# Bind key of the read-only engine on the SQLite file in production mode
+SQLITE_READ_BIND = 'sqlite_read'
+
+# Bind keys of read replicas are replica_0, replica_1, ... in DATABASE_REPLICA_URLS order
+REPLICA_BIND_PREFIX = 'replica_'
+
+# Flask session key: reads go to the primary until this time, after the user wrote
+PRIMARY_UNTIL_KEY = '_db_primary_until'
+
+# Replay lag of a PostgreSQL standby; 0 when it has replayed everything it received
+POSTGRES_LAG_SQL = text(
+    'SELECT CASE WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() '
+    'THEN 0 ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END'
+)
+
+
+class RoutingSession(Session):
+    """
+    Session that can send statements to other engines for the current request
+
+    While session.info['read_bind'] holds an engine, ORM and Core SELECTs
+    outside a flush run on it. While session.info['pool_bind'] holds an
+    engine, everything else runs on it instead of the default bind: the
+    same database through a different pool.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None:
+            read_bind = self.info.get('read_bind')
+            if read_bind is not None and not self._flushing and isinstance(clause, Select):
+                return read_bind
+            pool_bind = self.info.get('pool_bind')
+            if pool_bind is not None:
+                return pool_bind
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+class InstrumentedQueuePool(QueuePool):
+    """
+    QueuePool that records how long each checkout took
+
+    The time includes waiting for a free connection, the pre-ping and opening
+    a new connection. metrics_name (the bind key, or 'default') labels the
+    pool's metrics and is kept when engine.dispose() recreates the pool.
+    """
+
+    def __init__(self, creator, metrics_name='default', **kw):
+        super().__init__(creator, **kw)
+        self.metrics_name = metrics_name
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            return super().connect()
+        except PoolTimeoutError:
+            metrics.inc('mtxman_db_pool_checkout_timeouts_total', pool=self.metrics_name)
+            raise
+        finally:
+            metrics.observe('mtxman_db_pool_checkout_seconds', time.perf_counter() - started,
+                            pool=self.metrics_name)
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.metrics_name = self.metrics_name
+        return pool
+
+
+def instrument_pool(engine: Engine):
+    """Export pool usage, connection age and pre-ping failures of an engine using InstrumentedQueuePool"""
+    name = engine.pool.metrics_name
+    metrics.set('mtxman_db_pool_size', engine.pool.size(), pool=name)
+    metrics.set('mtxman_db_pool_checked_out', 0, pool=name)
+    metrics.set('mtxman_db_pool_overflow', 0, pool=name)
+
+    def usage(returning):
+        # engine.pool, not a captured pool: dispose() replaces it
+        pool = engine.pool
+        metrics.set('mtxman_db_pool_checked_out', pool.checkedout() - returning, pool=name)
+        # overflow() counts up from -pool_size until the pool is full
+        metrics.set('mtxman_db_pool_overflow', max(pool.overflow(), 0), pool=name)
+
+    def on_connect(dbapi_connection, connection_record):
+        connection_record.info['connected_at'] = time.monotonic()
+
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        connected_at = connection_record.info.get('connected_at')
+        if connected_at is not None:
+            metrics.observe('mtxman_db_pool_connection_age_seconds', time.monotonic() - connected_at, pool=name)
+        usage(returning=0)
+
+    def on_checkin(dbapi_connection, connection_record):
+        # Runs before the connection is back in the pool
+        usage(returning=1)
+
+    def on_error(context):
+        if context.is_pre_ping:
+            metrics.inc('mtxman_db_pool_pre_ping_failures_total', pool=name)
+
+    event.listen(engine, 'connect', on_connect)
+    event.listen(engine, 'checkout', on_checkout)
+    event.listen(engine, 'checkin', on_checkin)
+    event.listen(engine, 'handle_error', on_error)
+
+
+class ReplicaSet:
+    """
+    Chooses a read replica for each routed request
+
+    Replicas are used round-robin. One is skipped while it is marked down
+    (after a database error, for REPLICA_RETRY_SECONDS) or while its replay
+    lag exceeds REPLICA_MAX_LAG_SECONDS. Lag is checked at most every
+    REPLICA_CHECK_SECONDS, on PostgreSQL only. When no replica is usable,
+    reads fall back to the primary.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._engines: Dict[str, Engine] = {}
+        self._down_until: Dict[str, float] = {}
+        self._lag: Dict[str, float] = {}
+        self._checked_at: Dict[str, float] = {}
+        self._turn = itertools.count()
+
+        self.max_lag = 5.0
+        self.check_interval = 5.0
+        self.retry_interval = 30.0
+
+    def init_app(self, app):
+        """Load settings and pick up the replica binds added by configure()"""
+        from app import db
+
+        self.max_lag = app.config.get('REPLICA_MAX_LAG_SECONDS', 5.0)
+        self.check_interval = app.config.get('REPLICA_CHECK_SECONDS', 5.0)
+        self.retry_interval = app.config.get('REPLICA_RETRY_SECONDS', 30.0)
+        with app.app_context():
+            self.set_engines({key: engine for key, engine in db.engines.items()
+                              if key and key.startswith(REPLICA_BIND_PREFIX)})
+        app.extensions['replica_set'] = self
+
+    def set_engines(self, engines: Dict[str, Engine]):
+        """Use these replica engines, all initially up"""
+        with self._lock:
+            self._engines = dict(sorted(engines.items()))
+            self._down_until.clear()
+            self._lag.clear()
+            self._checked_at.clear()
+        for key, engine in self._engines.items():
+            event.listen(engine, 'handle_error', partial(self._on_error, key))
+            metrics.set('mtxman_db_replica_up', 1, replica=key)
+
+    @property
+    def configured(self) -> bool:
+        return bool(self._engines)
+
+    def choose(self) -> Optional[Engine]:
+        """The next usable replica, or None to read from the primary"""
+        keys = list(self._engines)
+        if not keys:
+            return None
+        start = next(self._turn)
+        for offset in range(len(keys)):
+            key = keys[(start + offset) % len(keys)]
+            if self._usable(key):
+                metrics.inc('mtxman_db_routed_reads_total', target=key)
+                return self._engines[key]
+        metrics.inc('mtxman_db_routed_reads_total', target='primary')
+        return None
+
+    def mark_down(self, key: str, reason: str):
+        """Skip a replica for retry_interval"""
+        with self._lock:
+            was_up = self._down_until.get(key, 0) <= time.monotonic()
+            self._down_until[key] = time.monotonic() + self.retry_interval
+        metrics.set('mtxman_db_replica_up', 0, replica=key)
+        if was_up:
+            current_app.logger.warning(f'Read replica {key} marked down ({reason})')
+
+    def _usable(self, key: str) -> bool:
+        now = time.monotonic()
+        if self._down_until.get(key, 0) > now:
+            return False
+        if now - self._checked_at.get(key, float('-inf')) >= self.check_interval:
+            self._checked_at[key] = now
+            try:
+                self._lag[key] = self.lag_seconds(self._engines[key])
+            except SQLAlchemyError as e:
+                self.mark_down(key, f'lag check failed: {e}')
+                return False
+            metrics.set('mtxman_db_replica_lag_seconds', self._lag[key], replica=key)
+            metrics.set('mtxman_db_replica_up', 1, replica=key)
+        return self._lag.get(key, 0) <= self.max_lag
+
+    @staticmethod
+    def lag_seconds(engine: Engine) -> float:
+        """Replication lag of a replica; databases without a lag query report 0"""
+        if engine.dialect.name != 'postgresql':
+            return 0.0
+        with engine.connect() as conn:
+            return float(conn.execute(POSTGRES_LAG_SQL).scalar() or 0)
+
+    def _on_error(self, key, context):
+        if context.is_disconnect or isinstance(context.sqlalchemy_exception, (OperationalError, InterfaceError)):
+            self.mark_down(key, type(context.original_exception).__name__)
+
+
+replica_set = ReplicaSet()
+
+
+def _sqlite_in_memory(url) -> bool:
+    url = make_url(url)
+    return url.drivername.startswith('sqlite') and url.database in (None, '', ':memory:')
+
+
+def sqlite_file_path(app):
+    """Absolute path of the SQLite database file, or None for other databases and :memory:"""
+    url = make_url(app.config['SQLALCHEMY_DATABASE_URI'])
+    if not url.drivername.startswith('sqlite') or _sqlite_in_memory(url):
+        return None
+    path = url.database[5:] if url.query.get('uri') else url.database
+    # Flask-SQLAlchemy resolves relative paths against the instance folder
+    return path if os.path.isabs(path) else os.path.join(app.instance_path, path)
+
+
+def sqlite_mode_enabled(app) -> bool:
+    return bool(app.config.get('SQLITE_PRODUCTION_MODE')) and sqlite_file_path(app) is not None
+
+
+def pool_options(app, url, name: str, size: int, max_overflow: int) -> dict:
+    """Engine options for a sized InstrumentedQueuePool; none for in-memory SQLite, which needs its StaticPool"""
+    if _sqlite_in_memory(url):
+        return {}
+    return {
+        'poolclass': InstrumentedQueuePool,
+        'metrics_name': name,
+        'pool_size': size,
+        'max_overflow': max_overflow,
+        'pool_timeout': app.config.get('DATABASE_POOL_TIMEOUT', 30),
+    }
+
+
+def configure(app):
+    """Size the pools and add the auth pool, read replica and read-only SQLite binds; call before db.init_app"""
+    primary_url = app.config['SQLALCHEMY_DATABASE_URI']
+    size = app.config.get('DATABASE_POOL_SIZE', 5)
+    max_overflow = app.config.get('DATABASE_MAX_OVERFLOW', 10)
+    # Flask-SQLAlchemy applies SQLALCHEMY_ENGINE_OPTIONS to the default bind only
+    options = dict(app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = dict(
+        options, **pool_options(app, primary_url, 'default', size, max_overflow))
+
+    binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+
+    def add_bind(key, url, size=size, max_overflow=max_overflow):
+        binds[key] = dict(options, url=url, **pool_options(app, url, key, size, max_overflow))
+
+    if app.config.get('DATABASE_AUTH_POOL_SIZE') and not _sqlite_in_memory(primary_url):
+        add_bind(AUTH_BIND, primary_url, app.config['DATABASE_AUTH_POOL_SIZE'],
+                 app.config.get('DATABASE_AUTH_MAX_OVERFLOW', 5))
+    for index, url in enumerate(app.config.get('DATABASE_REPLICA_URLS') or []):
+        add_bind(f'{REPLICA_BIND_PREFIX}{index}', url)
+    if sqlite_mode_enabled(app):
+        add_bind(SQLITE_READ_BIND, f'sqlite:///file:{sqlite_file_path(app)}?mode=ro&uri=true')
+    if binds:
+        app.config['SQLALCHEMY_BINDS'] = binds
+
+
+def init_engines(app):
+    """Install pool metrics, connect-time pragmas and replica selection; call after db.init_app"""
+    from app import db
+
+    with app.app_context():
+        for engine in db.engines.values():
+            if isinstance(engine.pool, InstrumentedQueuePool):
+                instrument_pool(engine)
+    replica_set.init_app(app)
+    if not sqlite_mode_enabled(app):
+        return
+    with app.app_context():
+        for key, engine in db.engines.items():
+            if engine.dialect.name != 'sqlite':
+                continue
+            read_only = key == SQLITE_READ_BIND or (key or '').startswith(REPLICA_BIND_PREFIX)
+            event.listen(engine, 'connect', partial(_sqlite_pragmas, app.config, read_only))
+
+
+def _sqlite_pragmas(config, read_only, dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    if not read_only:
+        # Persistent in the file; readers need no change
+        cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute(f"PRAGMA synchronous={config.get('SQLITE_SYNCHRONOUS', 'NORMAL')}")
+    cursor.execute(f"PRAGMA busy_timeout={int(config.get('SQLITE_BUSY_TIMEOUT_MS', 5000))}")
+    cursor.execute(f"PRAGMA mmap_size={int(config.get('SQLITE_MMAP_SIZE', 268435456))}")
+    cursor.execute(f"PRAGMA cache_size={int(config.get('SQLITE_CACHE_SIZE', -65536))}")
+    cursor.close()
+
+
+def read_engine():
+    """Engine for routed reads: a usable replica, the read-only SQLite engine, or None for the primary"""
+    from app import db
+
+    if replica_set.configured:
+        return replica_set.choose()
+    return db.engines.get(SQLITE_READ_BIND)
+
+
+def route_reads():
+    """before_request hook: run this request's SELECTs on the read engine"""
+    from app import db
+
+    engine = read_engine()
+    if engine is not None:
+        db.session.info['read_bind'] = engine
+
+
+def route_auth():
+    """before_request hook for the MediaMTX endpoints: use the auth pool, and route reads"""
+    from app import db
+
+    engine = db.engines.get(AUTH_BIND)
+    if engine is not None:
+        db.session.info['pool_bind'] = engine
+    route_reads()
+
+
+def end_read_routing(exc=None):
+    """teardown_request hook paired with route_reads and route_auth"""
+    from app import db
+
+    if db.session.registry.has():
+        db.session.info.pop('read_bind', None)
+        db.session.info.pop('pool_bind', None)
+
+
+@contextmanager
+def primary():
+    """Run the block's SELECTs on the primary, e.g. to reload data just reported as changed"""
+    from app import db
+
+    if not db.session.registry.has() or 'read_bind' not in db.session.info:
+        yield
+        return
+    read_bind = db.session.info.pop('read_bind')
+    try:
+        yield
+    finally:
+        db.session.info['read_bind'] = read_bind
+
+
+def replica_reads(view):
+    """
+    Decorator: run a GET view's SELECTs on a read replica
+
+    Skipped for REPLICA_STICKY_SECONDS after the same user wrote through the
+    admin UI or API (see remember_write), so they read their own writes.
+    """
+    @wraps(view)
+    def decorated_function(*args, **kwargs):
+        if session.get(PRIMARY_UNTIL_KEY, 0) > time.time():
+            return view(*args, **kwargs)
+        route_reads()
+        try:
+            return view(*args, **kwargs)
+        finally:
+            end_read_routing()
+    return decorated_function
+
+
+def remember_write(response):
+    """after_request hook: pin the user's reads to the primary after a successful write"""
+    if replica_set.configured and request.method not in ('GET', 'HEAD', 'OPTIONS') and response.status_code < 400:
+        session[PRIMARY_UNTIL_KEY] = time.time() + current_app.config.get('REPLICA_STICKY_SECONDS', 10)
+    return response
@@ -0,0 +1,260 @@
+# ABOUTME: Edge auth sidecar answering MediaMTX auth from a local replica of keys
+# ABOUTME: Keeps the replica current by polling the control plane change feed
+
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, Optional
+
+from flask import Flask, Response, jsonify, request
+
+from config import config_by_name
+from app.metrics import metrics
+from app.models.api_key import ApiKey
+from app.services.key_snapshot import SnapshotCustomer, SnapshotKey, find_key
+from app.services.stream_auth import verify_signature, extract_api_key, authorize
+
+
+class EdgeReplica:
+    """
+    In-memory replica of API keys and customers fed by the change feed
+
+    A full sync pages through all active keys, then the replica polls every
+    interval seconds for changes after the sequence number it last applied,
+    and again at once while more are waiting. When the control plane has
+    pruned changes the replica never saw, it starts over with a full sync.
+    Auth keeps being served from the last applied state while the control
+    plane is unreachable.
+    """
+
+    def __init__(self, fetch: Callable[[dict], dict], interval: float = 2, page_size: int = 5000,
+                 retry_seconds: float = 2):
+        self.fetch = fetch
+        self.interval = interval
+        self.page_size = page_size
+        self.retry_seconds = retry_seconds
+
+        self.seq = 0
+        self.synced_at: Optional[float] = None
+        self._keys: Dict[bytes, SnapshotKey] = {}
+        self._by_id: Dict[int, bytes] = {}
+        self._customers: Dict[int, SnapshotCustomer] = {}
+        self._lock = threading.Lock()
+        self._started_pid = None
+
+        metrics.gauge_callback(
+            'mtxman_edge_replica_seq', lambda: self.seq,
+            'Last change feed sequence number applied by this edge replica'
+        )
+        metrics.gauge_callback(
+            'mtxman_edge_replica_staleness_seconds',
+            lambda: time.time() - self.synced_at if self.synced_at else None,
+            'Seconds since this edge replica last heard from the control plane'
+        )
+        metrics.gauge_callback(
+            'mtxman_edge_replica_keys', lambda: len(self._keys),
+            'Number of API keys held by this edge replica'
+        )
+
+    @property
+    def ready(self) -> bool:
+        """Whether a full sync has completed"""
+        return self.synced_at is not None
+
+    def lookup(self, key_hash: bytes) -> Optional[SnapshotKey]:
+        return self._keys.get(key_hash)
+
+    def find(self, plaintext_key: str) -> Optional[SnapshotKey]:
+        return find_key(self._keys, self._by_id, plaintext_key)
+
+    # Applying feed payloads
+
+    def _customer(self, data: dict, customers: Dict[int, SnapshotCustomer]) -> SnapshotCustomer:
+        customer = customers.get(data['id'])
+        if customer is None:
+            customer = customers[data['id']] = SnapshotCustomer(**data)
+        else:
+            # Keys hold a reference to the customer, so update it in place
+            customer.name = data['name']
+            customer.email = data['email']
+            customer.is_active = data['is_active']
+        return customer
+
+    def _put_key(self, data: dict, keys, by_id, customers):
+        old_hash = by_id.pop(data['id'], None)
+        if old_hash is not None:
+            keys.pop(old_hash, None)
+        if not data['is_active']:
+            return
+
+        customer = customers.get(data['customer_id'])
+        if customer is None:
+            return
+        expires_at = data['expires_at']
+        data = dict(
+            data,
+            key_hash=bytes.fromhex(data['key_hash']),
+            expires_at=datetime.fromisoformat(expires_at) if expires_at else None,
+        )
+        keys[data['key_hash']] = SnapshotKey(customer=customer, **data)
+        by_id[data['id']] = data['key_hash']
+
+    def apply(self, payload: dict, keys=None, by_id=None, customers=None):
+        """Apply one change feed response to the replica (or to the given dicts)"""
+        keys = self._keys if keys is None else keys
+        by_id = self._by_id if by_id is None else by_id
+        customers = self._customers if customers is None else customers
+
+        with self._lock:
+            for data in payload['customers']:
+                self._customer(data, customers)
+            for data in payload['api_keys']:
+                self._put_key(data, keys, by_id, customers)
+            for key_id in payload['deleted_api_keys']:
+                key_hash = by_id.pop(key_id, None)
+                if key_hash is not None:
+                    keys.pop(key_hash, None)
+            deleted_customers = set(payload['deleted_customers'])
+            if deleted_customers:
+                for key in [k for k in keys.values() if k.customer_id in deleted_customers]:
+                    keys.pop(key.key_hash, None)
+                    by_id.pop(key.id, None)
+                for customer_id in deleted_customers:
+                    customers.pop(customer_id, None)
+
+    # Sync loop
+
+    def full_sync(self):
+        """Replace the replica with a full copy from the control plane"""
+        keys, by_id, customers = {}, {}, {}
+        after_id, seq = 0, None
+        while True:
+            payload = self.fetch({'since': 0, 'after_id': after_id, 'limit': self.page_size})
+            if seq is None:
+                seq = payload['seq']
+            self.apply(payload, keys, by_id, customers)
+            after_id = payload['next_after_id']
+            if not payload['more']:
+                break
+
+        with self._lock:
+            self._keys, self._by_id, self._customers = keys, by_id, customers
+            self.seq = seq
+            self.synced_at = time.time()
+        metrics.inc('mtxman_edge_full_syncs_total')
+
+    def sync_once(self) -> bool:
+        """Fetch and apply the next batch of changes; returns whether more are waiting"""
+        if not self.ready:
+            self.full_sync()
+            return True
+
+        payload = self.fetch({'since': self.seq, 'limit': self.page_size})
+        if payload.get('resync'):
+            metrics.inc('mtxman_edge_resyncs_total')
+            self.full_sync()
+            return True
+
+        self.apply(payload)
+        advanced = payload['seq'] > self.seq
+        self.seq = payload['seq']
+        self.synced_at = time.time()
+        metrics.inc('mtxman_edge_changes_applied_total', len(payload['api_keys']) + len(payload['customers']))
+        # Changes still settling on the control plane do not advance seq; wait for them
+        return advanced and payload['more']
+
+    def run(self, logger=None):
+        while True:
+            try:
+                more = self.sync_once()
+            except Exception as e:
+                metrics.inc('mtxman_edge_sync_errors_total')
+                if logger is not None:
+                    logger.warning(f'Edge replica sync failed: {e}')
+                time.sleep(self.retry_seconds)
+                continue
+            if not more:
+                time.sleep(self.interval)
+
+    def ensure_started(self, logger=None):
+        """Start the sync thread once per process"""
+        if self._started_pid == os.getpid():
+            return
+        self._started_pid = os.getpid()
+        threading.Thread(target=self.run, args=(logger,), name='edge-sync', daemon=True).start()
+
+
+def http_fetcher(base_url: str, token: str, timeout: float = 10) -> Callable[[dict], dict]:
+    """Build a fetch function that calls the control plane change feed over HTTP"""
+    import requests
+
+    session = requests.Session()
+    session.headers['Authorization'] = f'Bearer {token}'
+    url = base_url.rstrip('/') + '/api/mediamtx/changes'
+
+    def fetch(params: dict) -> dict:
+        response = session.get(url, params=params, timeout=timeout)
+        response.raise_for_status()
+        return response.json()
+
+    return fetch
+
+
+def create_edge_app(config_name='production', fetch: Callable[[dict], dict] = None):
+    """Create the edge sidecar app serving /api/mediamtx/auth from a local replica"""
+    app = Flask(__name__)
+    app.config.from_object(config_by_name[config_name])
+
+    if fetch is None:
+        fetch = http_fetcher(app.config['EDGE_CONTROL_PLANE_URL'], app.config['EDGE_SYNC_TOKEN'])
+    replica = EdgeReplica(
+        fetch,
+        interval=app.config['EDGE_SYNC_INTERVAL_SECONDS'],
+        page_size=app.config['EDGE_SYNC_PAGE_SIZE'],
+    )
+    app.extensions['edge_replica'] = replica
+
+    @app.before_request
+    def start_sync():
+        replica.ensure_started(app.logger)
+
+    @app.route('/api/mediamtx/auth', methods=['POST'])
+    def mediamtx_auth():
+        """MediaMTX external authentication answered from the edge replica"""
+        signature = request.headers.get('X-MediaMTX-Signature')
+        if signature and app.config.get('MEDIAMTX_WEBHOOK_SECRET'):
+            if not verify_signature(app.config['MEDIAMTX_WEBHOOK_SECRET'], request.data, signature):
+                app.logger.warning('MediaMTX webhook signature verification failed')
+                return jsonify({'error': 'Invalid signature'}), 401
+
+        data = request.get_json()
+
+        if not data:
+            return jsonify({'error': 'Invalid request'}), 400
+
+        action = data.get('action')
+        ip = data.get('ip')
+
+        if not replica.ready:
+            return jsonify({'error': 'Edge replica not synced yet'}), 503
+
+        api_key_value = extract_api_key(data)
+        if not api_key_value:
+            app.logger.warning(f'No API key provided for {action} request from {ip}')
+            return jsonify({'error': 'No API key provided'}), 401
+
+        if not ApiKey.is_well_formed(api_key_value):
+            metrics.inc('mtxman_auth_rejections_total', reason='malformed')
+            app.logger.warning(f'Malformed API key for {action} request from {ip}')
+            return jsonify({'error': 'Malformed API key'}), 401
+
+        api_key = replica.find(api_key_value)
+        body, status = authorize(api_key, action, data.get('path'), ip)
+        return jsonify(body), status
+
+    @app.route('/api/metrics', methods=['GET'])
+    def metrics_endpoint():
+        return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+    return app
@@ -0,0 +1,14 @@
+# ABOUTME: Blueprint for the endpoints MediaMTX and monitoring call: stream auth, change feed, metrics, readiness
+# ABOUTME: Kept apart from the admin UI so auth-only workers can register it on its own
+
+from flask import Blueprint
+from app.database import route_auth, end_read_routing
+
+mediamtx_bp = Blueprint('mediamtx', __name__)
+
+# These endpoints only read (usage timestamps go through the write queue in SQLite production mode),
+# and use their own pool so admin pages cannot take all the connections
+mediamtx_bp.before_request(route_auth)
+mediamtx_bp.teardown_request(end_read_routing)
+
+from app.mediamtx import routes, metrics, readiness
@@ -0,0 +1,12 @@
+# ABOUTME: Metrics endpoint exposing process-local counters and gauges
+# ABOUTME: Serves the Prometheus text format for scraping by monitoring
+
+from flask import Response
+from app.mediamtx import mediamtx_bp
+from app.metrics import metrics
+
+
+@mediamtx_bp.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Prometheus metrics for this worker process"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
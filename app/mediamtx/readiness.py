@@ -0,0 +1,19 @@
+# ABOUTME: Readiness endpoint for load balancers and container orchestrators
+# ABOUTME: Reports unready until start-up warm-up has loaded enough keys in this process
+
+from flask import current_app, jsonify
+from app.mediamtx import mediamtx_bp
+from app.services.warmup import warmup
+
+
+@mediamtx_bp.route('/ready', methods=['GET'])
+def readiness():
+    """200 once caches are warm, 503 before (a failed warm-up is retried in the background)"""
+    if warmup.required and warmup.state == warmup.FAILED:
+        warmup.retry(current_app._get_current_object())
+
+    body = {'ready': warmup.is_ready(), 'state': warmup.state, 'warmup': warmup.stats,
+            'progress': warmup.progress}
+    if warmup.error:
+        body['error'] = warmup.error
+    return jsonify(body), 200 if body['ready'] else 503
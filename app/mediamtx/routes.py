@@ -0,0 +1,220 @@
+# ABOUTME: MediaMTX external authentication webhook endpoint
+# ABOUTME: Validates API keys for stream publish/read access via MediaMTX callbacks
+
+import hmac
+from flask import request, jsonify, current_app
+from app.mediamtx import mediamtx_bp
+from app.models.api_key import ApiKey
+from app.services.api_key_service import ApiKeyService
+from app.services.change_feed import ChangeFeedService
+from app.services.key_snapshot import key_snapshot
+from app.services.stream_auth import verify_signature, extract_api_key, authorize, decide
+from app.metrics import metrics
+
+
+def verify_webhook_signature(payload, signature):
+    """Verify HMAC signature from MediaMTX"""
+    return verify_signature(current_app.config['MEDIAMTX_WEBHOOK_SECRET'], payload, signature)
+
+
+@mediamtx_bp.route('/mediamtx/auth', methods=['POST'])
+def mediamtx_auth():
+    """
+    MediaMTX external authentication webhook
+
+    Expected payload from MediaMTX:
+    {
+        "action": "publish" or "read",
+        "path": "stream/path",
+        "protocol": "rtsp/rtmp/hls/webrtc",
+        "query": "api_key=xxx",
+        "user": "username",
+        "password": "password",
+        "ip": "client_ip"
+    }
+
+    Response:
+    200 OK - Authentication successful
+    401 Unauthorized - Authentication failed
+    """
+    # Verify webhook signature if configured
+    signature = request.headers.get('X-MediaMTX-Signature')
+    if signature and current_app.config.get('MEDIAMTX_WEBHOOK_SECRET'):
+        if not verify_webhook_signature(request.data, signature):
+            current_app.logger.warning('MediaMTX webhook signature verification failed')
+            return jsonify({'error': 'Invalid signature'}), 401
+
+    data = request.get_json()
+
+    if not data:
+        return jsonify({'error': 'Invalid request'}), 400
+
+    action = data.get('action')  # 'publish' or 'read'
+    ip = data.get('ip')
+    path = data.get('path')
+
+    api_key_value = extract_api_key(data)
+
+    if not api_key_value:
+        current_app.logger.warning(f'No API key provided for {action} request from {ip}')
+        return jsonify({'error': 'No API key provided'}), 401
+
+    # Reject typos and truncated keys before hashing or touching the database
+    if not ApiKey.is_well_formed(api_key_value):
+        metrics.inc('mtxman_auth_rejections_total', reason='malformed')
+        current_app.logger.warning(f'Malformed API key for {action} request from {ip}')
+        return jsonify({'error': 'Malformed API key'}), 401
+
+    # Verify API key (falls back to the last-known-good snapshot if the DB is down)
+    api_key, degraded = ApiKeyService.resolve_api_key(api_key_value)
+
+    if degraded:
+        if not key_snapshot.allows(action):
+            metrics.inc('mtxman_auth_degraded_decisions_total', action=action, result='refused')
+            current_app.logger.warning(f'Refusing {action} from {ip}: auth backend degraded')
+            return jsonify({'error': 'Authentication backend unavailable'}), 503
+        metrics.inc('mtxman_auth_degraded_decisions_total', action=action, result='snapshot')
+
+    body, status = authorize(api_key, action, path, ip)
+    if status == 200:
+        body['degraded'] = degraded
+    return jsonify(body), status
+
+
+@mediamtx_bp.route('/mediamtx/auth/batch', methods=['POST'])
+def mediamtx_auth_batch():
+    """
+    Verify many API keys in one call (for gateways and sidecars)
+
+    Expected payload:
+    {
+        "items": [
+            {"key": "mtx_...", "action": "read", "path": "stream/path", "ip": "client_ip"},
+            ...
+        ]
+    }
+
+    Instead of "key", an item may carry the MediaMTX "query", "user" and
+    "password" fields. Results are returned in the same order, each with the
+    body and "status" that /mediamtx/auth would have answered.
+    """
+    signature = request.headers.get('X-MediaMTX-Signature')
+    if signature and current_app.config.get('MEDIAMTX_WEBHOOK_SECRET'):
+        if not verify_webhook_signature(request.data, signature):
+            current_app.logger.warning('MediaMTX batch auth signature verification failed')
+            return jsonify({'error': 'Invalid signature'}), 401
+
+    data = request.get_json(silent=True)
+    items = data.get('items') if isinstance(data, dict) else None
+
+    if not isinstance(items, list):
+        return jsonify({'error': 'Invalid request'}), 400
+
+    max_items = current_app.config['BATCH_AUTH_MAX_ITEMS']
+    if len(items) > max_items:
+        return jsonify({'error': f'At most {max_items} items per request'}), 413
+
+    keys = [
+        (item.get('key') or extract_api_key(item)) if isinstance(item, dict) else None
+        for item in items
+    ]
+    malformed = {k for k in keys if k and not ApiKey.is_well_formed(k)}
+    found, degraded = ApiKeyService.resolve_api_keys([k for k in keys if k and k not in malformed])
+
+    results = []
+    allowed = 0
+    rejected = {'malformed': 0, 'unknown_key': 0}
+    for item, key in zip(items, keys):
+        if not isinstance(item, dict):
+            body, status = {'error': 'Invalid item'}, 400
+        elif not key:
+            body, status = {'error': 'No API key provided'}, 401
+        elif key in malformed:
+            body, status = {'error': 'Malformed API key'}, 401
+            rejected['malformed'] += 1
+        elif degraded and not key_snapshot.allows(item.get('action')):
+            body, status = {'error': 'Authentication backend unavailable'}, 503
+        else:
+            body, status = decide(found.get(key), item.get('action'))
+            if key not in found:
+                rejected['unknown_key'] += 1
+        if status == 200:
+            allowed += 1
+        body['status'] = status
+        results.append(body)
+
+    if not degraded:
+        ApiKeyService.record_usage(api_key.id for api_key in found.values())
+
+    metrics.inc('mtxman_auth_batch_items_total', len(items))
+    metrics.inc('mtxman_auth_batch_allowed_total', allowed)
+    for reason, count in rejected.items():
+        if count:
+            metrics.inc('mtxman_auth_rejections_total', count, reason=reason)
+    current_app.logger.info(
+        f'Batch auth from {request.remote_addr}: {allowed}/{len(items)} allowed'
+        + (' (degraded)' if degraded else '')
+    )
+
+    return jsonify({'results': results, 'degraded': degraded}), 200
+
+
+@mediamtx_bp.route('/mediamtx/changes', methods=['GET'])
+def mediamtx_changes():
+    """
+    Change feed of API keys and customers for edge auth sidecars
+
+    Query parameters:
+        since: last sequence number applied by the caller (0 for a full sync)
+        after_id: key id cursor while paging through a full sync
+        limit: maximum changes or keys per response
+
+    Answers at once, also when nothing changed: callers poll on an interval,
+    so no worker is held waiting for changes.
+
+    Requires "Authorization: Bearer <EDGE_SYNC_TOKEN>". The feed is disabled
+    when no token is configured.
+    """
+    token = current_app.config.get('EDGE_SYNC_TOKEN')
+    if not token:
+        return jsonify({'error': 'Change feed disabled'}), 404
+
+    provided = request.headers.get('Authorization', '')
+    if not hmac.compare_digest(provided.encode(), f'Bearer {token}'.encode()):
+        return jsonify({'error': 'Invalid sync token'}), 401
+
+    since = request.args.get('since', 0, type=int)
+    after_id = request.args.get('after_id', 0, type=int)
+    limit = min(request.args.get('limit', 5000, type=int), current_app.config['CHANGE_FEED_MAX_LIMIT'])
+
+    if since <= 0:
+        return jsonify(ChangeFeedService.full_page(after_id, limit))
+
+    return jsonify(ChangeFeedService.changes_since(
+        since, limit, current_app.config['CHANGE_FEED_SETTLE_SECONDS']
+    ))
+
+
+@mediamtx_bp.route('/mediamtx/webhook', methods=['POST'])
+def mediamtx_webhook():
+    """
+    MediaMTX general webhook for events
+
+    Can be used to track stream events like:
+    - Stream started
+    - Stream stopped
+    - Reader connected
+    - Reader disconnected
+    """
+    data = request.get_json()
+
+    if not data:
+        return jsonify({'error': 'Invalid request'}), 400
+
+    event_type = data.get('event')
+    current_app.logger.info(f'MediaMTX webhook event: {event_type}')
+
+    # Here you could implement event tracking, analytics, etc.
+    # For now, just log and acknowledge
+
+    return jsonify({'received': True}), 200
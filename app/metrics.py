@@ -0,0 +1,130 @@
+# ABOUTME: Process-local metrics registry for counters, gauges and timing summaries
+# ABOUTME: Renders collected values in the Prometheus text exposition format
+
+import threading
+from typing import Callable, Dict, Optional, Tuple
+
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: dict) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key: LabelKey) -> str:
+    if not key:
+        return ''
+    inner = ','.join(f'{k}="{v}"' for k, v in key)
+    return '{' + inner + '}'
+
+
+class MetricsRegistry:
+    """
+    Thread-safe registry of metrics for the current process
+
+    Each gunicorn worker holds its own registry, so values are per worker.
+    Gauges can also be backed by callbacks that are evaluated at render time.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._gauges: Dict[str, Dict[LabelKey, float]] = {}
+        self._summaries: Dict[str, Dict[LabelKey, list]] = {}
+        self._callbacks: Dict[str, Callable[[], Optional[float]]] = {}
+        self._help: Dict[str, str] = {}
+
+    def describe(self, name: str, help_text: str):
+        """Attach a HELP line to a metric"""
+        self._help[name] = help_text
+
+    def inc(self, name: str, value: float = 1, **labels):
+        """Increment a counter"""
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def set(self, name: str, value: float, **labels):
+        """Set a gauge to an absolute value"""
+        key = _label_key(labels)
+        with self._lock:
+            self._gauges.setdefault(name, {})[key] = value
+
+    def observe(self, name: str, value: float, **labels):
+        """Record one observation (e.g. a duration in seconds) in a summary"""
+        key = _label_key(labels)
+        with self._lock:
+            entry = self._summaries.setdefault(name, {}).setdefault(key, [0, 0.0])
+            entry[0] += 1
+            entry[1] += value
+
+    def gauge_callback(self, name: str, fn: Callable[[], Optional[float]], help_text: str = None):
+        """Register a gauge whose value is computed when metrics are rendered"""
+        self._callbacks[name] = fn
+        if help_text:
+            self._help[name] = help_text
+
+    def value(self, name: str, **labels) -> Optional[float]:
+        """Return the current value of a counter or gauge (mainly for tests)"""
+        key = _label_key(labels)
+        with self._lock:
+            for store in (self._counters, self._gauges):
+                if name in store and key in store[name]:
+                    return store[name][key]
+            if name in self._summaries and key in self._summaries[name]:
+                return self._summaries[name][key][0]
+        if name in self._callbacks and not labels:
+            return self._callbacks[name]()
+        return None
+
+    def reset(self):
+        """Drop all recorded values (callbacks are kept)"""
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._summaries.clear()
+
+    def render(self) -> str:
+        """Render all metrics in Prometheus text format"""
+        lines = []
+
+        def header(name, kind):
+            if name in self._help:
+                lines.append(f'# HELP {name} {self._help[name]}')
+            lines.append(f'# TYPE {name} {kind}')
+
+        with self._lock:
+            counters = {n: dict(s) for n, s in self._counters.items()}
+            gauges = {n: dict(s) for n, s in self._gauges.items()}
+            summaries = {n: {k: list(v) for k, v in s.items()} for n, s in self._summaries.items()}
+
+        for name in sorted(counters):
+            header(name, 'counter')
+            for key, value in sorted(counters[name].items()):
+                lines.append(f'{name}{_format_labels(key)} {value}')
+
+        for name in sorted(gauges):
+            header(name, 'gauge')
+            for key, value in sorted(gauges[name].items()):
+                lines.append(f'{name}{_format_labels(key)} {value}')
+
+        for name in sorted(self._callbacks):
+            value = self._callbacks[name]()
+            if value is None:
+                continue
+            header(name, 'gauge')
+            lines.append(f'{name} {value}')
+
+        for name in sorted(summaries):
+            header(name, 'summary')
+            for key, (count, total) in sorted(summaries[name].items()):
+                labels = _format_labels(key)
+                lines.append(f'{name}_count{labels} {count}')
+                lines.append(f'{name}_sum{labels} {total}')
+
+        return '\n'.join(lines) + '\n'
+
+
+metrics = MetricsRegistry()
@@ -4,5 +4,8 @@
 from app.models.user import User
 from app.models.customer import Customer
 from app.models.api_key import ApiKey
+from app.models.auth_change import AuthChange
+from app.models.stat_counter import StatCounter
+from app.models import search_index  # noqa: F401 - creates the search indexes with their tables
 
-__all__ = ['User', 'Customer', 'ApiKey']
+__all__ = ['User', 'Customer', 'ApiKey', 'AuthChange', 'StatCounter']
@@ -4,9 +4,54 @@
 from datetime import datetime
 import secrets
 import hashlib
+import hmac
+import re
+import string
+import zlib
+from typing import Optional
 from app import db
 
 
+KEY_PREFIX = 'mtx_'
+SECRET_LENGTH = 32
+CHECKSUM_LENGTH = 6  # CRC32 fits in 6 base62 digits
+BASE62 = string.digits + string.ascii_letters
+
+# mtx_<key id>_<secret><checksum>; keys issued before checksums lack the last group
+KEY_PATTERN = re.compile(
+    r'^mtx_([1-9][0-9]{0,9})_([0-9A-Za-z]{%d})([0-9A-Za-z]{%d})?$' % (SECRET_LENGTH, CHECKSUM_LENGTH)
+)
+# Largest id the api_keys.id column holds (INTEGER is 32-bit on PostgreSQL); larger ids are malformed
+MAX_KEY_ID = 2 ** 31 - 1
+# Legacy keys: mtx_ plus secrets.token_urlsafe(8)
+LEGACY_KEY_PATTERN = re.compile(r'^mtx_[A-Za-z0-9_-]{11}$')
+
+# MediaMTX auth actions and their bits in ApiKey.permissions
+PERMISSION_BITS = {
+    'publish': 1 << 0,
+    'read': 1 << 1,
+    'playback': 1 << 2,
+    'api': 1 << 3,
+    'metrics': 1 << 4,
+    'pprof': 1 << 5,
+}
+ALL_ACTIONS = tuple(PERMISSION_BITS)
+DEFAULT_PERMISSIONS = PERMISSION_BITS['read']
+
+
+def permissions_for(actions) -> int:
+    """Build a permission bitmask from action names"""
+    mask = 0
+    for action in actions:
+        mask |= PERMISSION_BITS[action]
+    return mask
+
+
+def actions_for(permissions) -> list:
+    """List the action names set in a permission bitmask"""
+    return [action for action, bit in PERMISSION_BITS.items() if permissions & bit]
+
+
 class ApiKey(db.Model):
     """API key for customer authentication to MediaMTX"""
 
@@ -15,34 +60,87 @@ class ApiKey(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     customer_id = db.Column(db.Integer, db.ForeignKey('customers.id'), nullable=False, index=True)
     name = db.Column(db.String(255), nullable=False)  # Friendly name for the key
-    key_hash = db.Column(db.String(64), unique=True, nullable=False, index=True)  # SHA-256 hash
+    key_hash = db.Column(db.LargeBinary(32), unique=True, nullable=False)  # SHA-256 digest
     key_prefix = db.Column(db.String(10), nullable=False)  # First few chars for identification
     is_active = db.Column(db.Boolean, default=True, nullable=False)
     created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     last_used_at = db.Column(db.DateTime, nullable=True)
-    expires_at = db.Column(db.DateTime, nullable=True)
+    expires_at = db.Column(db.DateTime, nullable=True, index=True)
+
+    # Bitmask of PERMISSION_BITS (could be expanded to per-stream granular permissions)
+    permissions = db.Column(db.Integer, default=DEFAULT_PERMISSIONS, nullable=False)
 
-    # Stream permissions (could be expanded to per-stream granular permissions)
-    can_publish = db.Column(db.Boolean, default=False, nullable=False)
-    can_read = db.Column(db.Boolean, default=True, nullable=False)
+    def __init__(self, **kwargs):
+        # Accept can_<action>=bool for every action, applied on top of the defaults
+        flags = {action: kwargs.pop(f'can_{action}') for action in ALL_ACTIONS if f'can_{action}' in kwargs}
+        kwargs.setdefault('permissions', DEFAULT_PERMISSIONS)
+        super().__init__(**kwargs)
+        for action, allowed in flags.items():
+            self.set_permission(action, allowed)
 
     def __repr__(self):
         return f'<ApiKey {self.name} ({self.key_prefix}...)>'
 
     @staticmethod
     def generate_key(prefix='mtx_', length=8):
-        """Generate a new random API key"""
+        """Generate a new random API key in the legacy format (no embedded id)"""
         random_part = secrets.token_urlsafe(length)
         return f"{prefix}{random_part}"
 
+    @staticmethod
+    def generate_secret(length=SECRET_LENGTH):
+        """Generate the random base62 part of a self-identifying key"""
+        return ''.join(secrets.choice(BASE62) for _ in range(length))
+
+    @staticmethod
+    def checksum(body):
+        """CRC32 of a key body as 6 base62 digits"""
+        value = zlib.crc32(body.encode())
+        digits = []
+        for _ in range(CHECKSUM_LENGTH):
+            value, digit = divmod(value, 62)
+            digits.append(BASE62[digit])
+        return ''.join(reversed(digits))
+
+    @staticmethod
+    def format_key(key_id, secret):
+        """Build a self-identifying key: mtx_<key id>_<secret><checksum>"""
+        body = f"{KEY_PREFIX}{key_id}_{secret}"
+        return body + ApiKey.checksum(body)
+
+    @staticmethod
+    def is_well_formed(key) -> bool:
+        """Check length, charset and checksum of a key without hashing or DB access"""
+        match = KEY_PATTERN.match(key)
+        if match:
+            if int(match.group(1)) > MAX_KEY_ID:
+                return False
+            if match.group(3) is None:
+                return True
+            return ApiKey.checksum(key[:-CHECKSUM_LENGTH]) == match.group(3)
+        return LEGACY_KEY_PATTERN.match(key) is not None
+
+    @staticmethod
+    def parse_key_id(key) -> Optional[int]:
+        """
+        Return the key id embedded in a self-identifying key, or None for legacy keys
+
+        Also None for an id beyond MAX_KEY_ID: no key has one, so the key is
+        malformed and its key_hash lookup finds nothing.
+        """
+        match = KEY_PATTERN.match(key)
+        if not match or int(match.group(1)) > MAX_KEY_ID:
+            return None
+        return int(match.group(1))
+
     @staticmethod
     def hash_key(key):
-        """Hash an API key using SHA-256"""
-        return hashlib.sha256(key.encode()).hexdigest()
+        """Hash an API key using SHA-256 (32-byte binary digest)"""
+        return hashlib.sha256(key.encode()).digest()
 
     def verify_key(self, key):
         """Verify if the provided key matches this API key"""
-        return self.key_hash == self.hash_key(key)
+        return hmac.compare_digest(self.key_hash, self.hash_key(key))
 
     def update_last_used(self):
         """Update the last used timestamp"""
@@ -59,6 +157,39 @@ class ApiKey(db.Model):
 
         return True
 
+    def has_permission(self, action) -> bool:
+        """Check the permission bit for a MediaMTX action"""
+        return bool(self.permissions & PERMISSION_BITS.get(action, 0))
+
+    def set_permission(self, action, allowed):
+        """Set or clear the permission bit for a MediaMTX action"""
+        bit = PERMISSION_BITS[action]
+        if allowed:
+            self.permissions = (self.permissions or 0) | bit
+        else:
+            self.permissions = (self.permissions or 0) & ~bit
+
+    @property
+    def actions(self):
+        """Names of the actions this key is allowed to perform"""
+        return actions_for(self.permissions or 0)
+
+    @property
+    def can_publish(self):
+        return self.has_permission('publish')
+
+    @can_publish.setter
+    def can_publish(self, allowed):
+        self.set_permission('publish', allowed)
+
+    @property
+    def can_read(self):
+        return self.has_permission('read')
+
+    @can_read.setter
+    def can_read(self, allowed):
+        self.set_permission('read', allowed)
+
     def to_dict(self, include_secret=False):
         """Convert API key to dictionary representation"""
         data = {
@@ -69,6 +200,7 @@ class ApiKey(db.Model):
             'is_active': self.is_active,
             'can_publish': self.can_publish,
             'can_read': self.can_read,
+            'permissions': {action: self.has_permission(action) for action in ALL_ACTIONS},
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'last_used_at': self.last_used_at.isoformat() if self.last_used_at else None,
             'expires_at': self.expires_at.isoformat() if self.expires_at else None,
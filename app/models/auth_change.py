@@ -0,0 +1,20 @@
+# ABOUTME: Change log of API key and customer mutations for edge replica sync
+# ABOUTME: Each row's id is the feed sequence number served to edge sidecars
+
+from datetime import datetime
+from app import db
+
+
+class AuthChange(db.Model):
+    """One committed mutation of an API key or customer"""
+
+    __tablename__ = 'auth_changes'
+
+    id = db.Column(db.Integer, primary_key=True)  # Feed sequence number
+    entity = db.Column(db.String(20), nullable=False)  # 'api_key' or 'customer'
+    entity_id = db.Column(db.Integer, nullable=False)
+    op = db.Column(db.String(10), nullable=False)  # 'upsert' or 'delete'
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<AuthChange {self.id} {self.op} {self.entity} {self.entity_id}>'
@@ -15,8 +15,11 @@ class Customer(db.Model):
     email = db.Column(db.String(255), unique=True, nullable=False, index=True)
     organization = db.Column(db.String(255), nullable=True)
     is_active = db.Column(db.Boolean, default=True, nullable=False)
-    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
     updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Bumped on every change to the customer, and to any of its API keys (see CustomerService.bump_versions)
+    version = db.Column(db.Integer, nullable=False, default=1)
+    keys_version = db.Column(db.Integer, nullable=False, default=0)
 
     # Relationships
     api_keys = db.relationship('ApiKey', backref='customer', lazy='dynamic', cascade='all, delete-orphan')
@@ -0,0 +1,83 @@
+# ABOUTME: Full-text search indexes over customers (name, email, organization) and API keys (name, key_prefix)
+# ABOUTME: SQLite gets FTS5 tables kept current by triggers; PostgreSQL gets pg_trgm GIN indexes
+
+from sqlalchemy import DDL, event
+from app.models.api_key import ApiKey
+from app.models.customer import Customer
+
+# Indexed columns of each searchable table, with their ranking weights
+SEARCH_COLUMNS = {
+    'customers': {'name': 10.0, 'email': 5.0, 'organization': 2.0},
+    'api_keys': {'name': 5.0, 'key_prefix': 10.0},
+}
+
+
+def fts_table(table: str) -> str:
+    """Name of the FTS5 table indexing table"""
+    return f'{table}_fts'
+
+
+def trigram_index(table: str, column: str) -> str:
+    """Name of the trigram index on table.column"""
+    return f'ix_{table}_{column}_trgm'
+
+
+def sqlite_create_statements(table: str):
+    """
+    Create table's external-content FTS5 index, its ranking and its triggers
+
+    The index stores only the tokens; rows are read from table itself. Prefix
+    indexes make 2 and 3 character autocomplete queries as cheap as whole words.
+    The update trigger fires only for the indexed columns, so key use
+    (last_used_at) never touches the index.
+    """
+    fts = fts_table(table)
+    columns = ', '.join(SEARCH_COLUMNS[table])
+    new = ', '.join(f'new.{column}' for column in SEARCH_COLUMNS[table])
+    old = ', '.join(f'old.{column}' for column in SEARCH_COLUMNS[table])
+    weights = ', '.join(str(weight) for weight in SEARCH_COLUMNS[table].values())
+    delete_old = f"INSERT INTO {fts} ({fts}, rowid, {columns}) VALUES ('delete', old.id, {old});"
+    insert_new = f'INSERT INTO {fts} (rowid, {columns}) VALUES (new.id, {new});'
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+        f"{columns}, content='{table}', content_rowid='id', prefix='2 3')",
+        f"INSERT INTO {fts} ({fts}, rank) VALUES ('rank', 'bm25({weights})')",
+        f'CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN {insert_new} END',
+        f'CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN {delete_old} END',
+        f'CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {columns} ON {table} '
+        f'BEGIN {delete_old} {insert_new} END',
+    ]
+
+
+def sqlite_rebuild_statement(table: str) -> str:
+    """Reindex every row of table in its FTS5 index"""
+    fts = fts_table(table)
+    return f"INSERT INTO {fts} ({fts}) VALUES ('rebuild')"
+
+
+def sqlite_drop_statements(table: str):
+    fts = fts_table(table)
+    return [f'DROP TRIGGER IF EXISTS {fts}_{suffix}' for suffix in ('ai', 'ad', 'au')] + \
+        [f'DROP TABLE IF EXISTS {fts}']
+
+
+def postgresql_create_statements(table: str):
+    """Create a trigram GIN index per indexed column, serving ILIKE '%term%' matches"""
+    return ['CREATE EXTENSION IF NOT EXISTS pg_trgm'] + [
+        f'CREATE INDEX IF NOT EXISTS {trigram_index(table, column)} ON {table} USING gin ({column} gin_trgm_ops)'
+        for column in SEARCH_COLUMNS[table]
+    ]
+
+
+def postgresql_drop_statements(table: str):
+    return [f'DROP INDEX IF EXISTS {trigram_index(table, column)}' for column in SEARCH_COLUMNS[table]]
+
+
+for _model in (Customer, ApiKey):
+    _table = _model.__tablename__
+    for _statement in sqlite_create_statements(_table):
+        event.listen(_model.__table__, 'after_create', DDL(_statement).execute_if(dialect='sqlite'))
+    for _statement in sqlite_drop_statements(_table):
+        event.listen(_model.__table__, 'before_drop', DDL(_statement).execute_if(dialect='sqlite'))
+    for _statement in postgresql_create_statements(_table):
+        event.listen(_model.__table__, 'after_create', DDL(_statement).execute_if(dialect='postgresql'))
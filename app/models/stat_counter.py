@@ -0,0 +1,26 @@
+# ABOUTME: Running totals shown on the dashboard, kept current as customers and API keys change
+# ABOUTME: One row per counter, so summary statistics never need a scan of the counted tables
+
+from sqlalchemy import event
+from app import db
+
+# Counter names; every one has a row, created with the table
+COUNTERS = ('customers', 'active_customers', 'api_keys', 'active_api_keys')
+
+
+class StatCounter(db.Model):
+    """A named running total"""
+
+    __tablename__ = 'stat_counters'
+
+    name = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<StatCounter {self.name}={self.value}>'
+
+
+@event.listens_for(StatCounter.__table__, 'after_create')
+def _create_counters(table, connection, **kw):
+    # The counted tables are new as well (create_all), so every total starts at 0
+    connection.execute(table.insert(), [{'name': name, 'value': 0} for name in COUNTERS])
@@ -16,6 +16,8 @@ class User(UserMixin, db.Model):
     email = db.Column(db.String(255), nullable=True, index=True)
     display_name = db.Column(db.String(255), nullable=True)
     dn = db.Column(db.String(500), nullable=True)  # LDAP Distinguished Name
+    dn_resolved_at = db.Column(db.DateTime, nullable=True)  # When dn was last found by a directory search
+    ldap_hash = db.Column(db.String(64), nullable=True)  # Hash of directory attributes at the last sync
     is_active = db.Column(db.Boolean, default=True, nullable=False)
     is_admin = db.Column(db.Boolean, default=False, nullable=False)
     created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
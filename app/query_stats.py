@@ -0,0 +1,127 @@
+# ABOUTME: Per-request SQL statistics: statement count, SQL time and repeated statements (likely N+1 queries)
+# ABOUTME: Reported in a Server-Timing header, the log and metrics; tests use record() to check query budgets
+
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import List, Tuple
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.metrics import metrics
+
+
+class QueryLog:
+    """Statements run during one request or one record() block"""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.statements = Counter()
+
+    def add(self, statement: str, seconds: float):
+        self.count += 1
+        self.seconds += seconds
+        self.statements[statement] += 1
+
+    def repeated(self, threshold: int) -> List[Tuple[str, int]]:
+        """Statements run at least threshold times, most repeated first"""
+        return [(statement, n) for statement, n in self.statements.most_common() if n >= threshold]
+
+    def summary(self) -> str:
+        lines = [f'{self.count} queries, {self.seconds * 1000:.1f} ms']
+        lines += [f'  {n}x {statement}' for statement, n in self.statements.most_common()]
+        return '\n'.join(lines)
+
+
+class QueryStats:
+    """
+    Counts and times the SQL each request runs
+
+    The same statement text run QUERY_REPEAT_THRESHOLD or more times in one
+    request (only the bound parameters differ) is logged as a likely N+1
+    query and counted in mtxman_db_repeated_statements_total.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self.enabled = True
+        self.repeat_threshold = 5
+
+    def init_app(self, app):
+        """Hook every engine and wrap each request"""
+        from app import db
+
+        self.enabled = app.config.get('QUERY_STATS_ENABLED', True)
+        self.repeat_threshold = app.config.get('QUERY_REPEAT_THRESHOLD', 5)
+        app.extensions['query_stats'] = self
+        if not self.enabled:
+            return
+        with app.app_context():
+            for engine in db.engines.values():
+                self.instrument(engine)
+        app.before_request(self.start)
+        app.after_request(self.finish)
+
+    def instrument(self, engine: Engine):
+        if not event.contains(engine, 'before_cursor_execute', self._before_execute):
+            event.listen(engine, 'before_cursor_execute', self._before_execute)
+            event.listen(engine, 'after_cursor_execute', self._after_execute)
+
+    def start(self):
+        """before_request hook: start this request's log"""
+        g._query_log = QueryLog()
+
+    def finish(self, response):
+        """after_request hook: report this request's log"""
+        log = g.pop('_query_log', None)
+        if log is None:
+            return response
+        millis = log.seconds * 1000
+        response.headers.add('Server-Timing', f'db;dur={millis:.1f};desc="{log.count} queries"')
+
+        endpoint = request.endpoint or 'unmatched'
+        metrics.observe('mtxman_db_request_queries', log.count, endpoint=endpoint)
+        metrics.observe('mtxman_db_request_sql_seconds', log.seconds, endpoint=endpoint)
+        current_app.logger.debug(f'{request.method} {request.path}: {log.count} queries, {millis:.1f} ms SQL')
+        for statement, n in log.repeated(self.repeat_threshold):
+            metrics.inc('mtxman_db_repeated_statements_total', endpoint=endpoint)
+            current_app.logger.warning(
+                f'{request.method} {request.path} ran one statement {n} times (N+1 query?): {statement[:200]}'
+            )
+        return response
+
+    @contextmanager
+    def record(self):
+        """Collect the statements this thread runs in the block, e.g. to assert a query budget"""
+        log = QueryLog()
+        recorders = self._local.__dict__.setdefault('recorders', [])
+        recorders.append(log)
+        try:
+            yield log
+        finally:
+            recorders.remove(log)
+
+    def _logs(self) -> List[QueryLog]:
+        logs = list(getattr(self._local, 'recorders', ()))
+        if has_request_context() and g.get('_query_log') is not None:
+            logs.append(g._query_log)
+        return logs
+
+    def _before_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if self._logs():
+            conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+    def _after_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.get('query_started')
+        if not started:
+            return
+        elapsed = time.perf_counter() - started.pop()
+        for log in self._logs():
+            log.add(statement, elapsed)
+
+
+query_stats = QueryStats()
@@ -1,11 +1,22 @@
 # ABOUTME: Service layer for API key generation and management
 # ABOUTME: Handles key creation, validation, and permission checking
 
-from typing import Optional, List, Tuple
+import time
+from typing import Optional, List, Tuple, Union, Dict, Iterable
 from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import Select, select
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import joinedload
 from app import db
-from app.models.api_key import ApiKey
+from app.models.api_key import ApiKey, KEY_PREFIX, PERMISSION_BITS, permissions_for
 from app.models.customer import Customer
+from app.services.key_snapshot import key_snapshot, SnapshotKey
+from app.services.write_queue import write_queue
+
+
+# Keep IN lists below SQLite's default host parameter limit (32766)
+BATCH_IN_CHUNK = 10000
 
 
 class ApiKeyService:
@@ -17,47 +28,70 @@ class ApiKeyService:
         name: str,
         can_publish: bool = False,
         can_read: bool = True,
-        expires_in_days: Optional[int] = None
+        expires_in_days: Optional[int] = None,
+        actions: Optional[Iterable[str]] = None
     ) -> Tuple[ApiKey, str]:
         """
         Create a new API key for a customer
         Returns tuple of (ApiKey object, plaintext key)
+
+        When actions is given it replaces can_publish/can_read and may name any
+        MediaMTX action (publish, read, playback, api, metrics, pprof).
         """
         customer = Customer.query.get(customer_id)
         if not customer:
             raise ValueError(f"Customer {customer_id} not found")
 
-        # Generate key
-        plaintext_key = ApiKey.generate_key()
-        key_hash = ApiKey.hash_key(plaintext_key)
-        key_prefix = plaintext_key[:8]  # First 8 chars for identification
+        # Generate the secret; the full key embeds the row id, known after flush
+        secret = ApiKey.generate_secret()
 
         # Calculate expiration
         expires_at = None
         if expires_in_days:
             expires_at = datetime.utcnow() + timedelta(days=expires_in_days)
 
+        if actions is not None:
+            permissions = permissions_for(actions)
+        else:
+            permissions = permissions_for(
+                action for action, allowed in (('publish', can_publish), ('read', can_read)) if allowed
+            )
+
         # Create API key
         api_key = ApiKey(
             customer_id=customer_id,
             name=name,
-            key_hash=key_hash,
-            key_prefix=key_prefix,
-            can_publish=can_publish,
-            can_read=can_read,
+            key_hash=ApiKey.hash_key(secret),  # placeholder until the id is assigned
+            key_prefix=KEY_PREFIX,
+            permissions=permissions,
             expires_at=expires_at
         )
 
         db.session.add(api_key)
+        db.session.flush()
+
+        plaintext_key = ApiKey.format_key(api_key.id, secret)
+        api_key.key_hash = ApiKey.hash_key(plaintext_key)
+        api_key.key_prefix = plaintext_key[:8]  # First 8 chars for identification
         db.session.commit()
 
         return api_key, plaintext_key
 
     @staticmethod
     def verify_api_key(plaintext_key: str) -> Optional[ApiKey]:
-        """Verify an API key and return the ApiKey object if valid"""
-        key_hash = ApiKey.hash_key(plaintext_key)
-        api_key = ApiKey.query.filter_by(key_hash=key_hash).first()
+        """
+        Verify an API key and return the ApiKey object if valid
+
+        Self-identifying keys are fetched by primary key and checked with a
+        constant-time hash compare; legacy keys are looked up by key_hash.
+        """
+        key_id = ApiKey.parse_key_id(plaintext_key)
+        if key_id is not None:
+            api_key = db.session.get(ApiKey, key_id)
+            if api_key is not None and not api_key.verify_key(plaintext_key):
+                api_key = None
+        else:
+            api_key = ApiKey.query.filter_by(key_hash=ApiKey.hash_key(plaintext_key)).first()
 
         if not api_key:
             return None
@@ -65,11 +99,146 @@ class ApiKeyService:
         if not api_key.is_valid():
             return None
 
-        # Update last used timestamp
-        api_key.update_last_used()
+        # Update last used timestamp (queued for the writer thread in SQLite production mode)
+        if write_queue.enabled:
+            write_queue.touch([api_key.id])
+        else:
+            api_key.update_last_used()
 
         return api_key
 
+    @staticmethod
+    def resolve_api_key(plaintext_key: str) -> Tuple[Optional[Union[ApiKey, SnapshotKey]], bool]:
+        """
+        Verify an API key, falling back to the last-known-good snapshot
+
+        Returns tuple of (key or None, degraded). When degraded is True the key
+        came from the snapshot because the database failed or was too slow.
+        """
+        return ApiKeyService._resolve(
+            lambda: ApiKeyService.verify_api_key(plaintext_key),
+            lambda: key_snapshot.find(plaintext_key),
+            key_snapshot.latency_budget,
+            'API key verification',
+        )
+
+    @staticmethod
+    def verify_api_keys(plaintext_keys: Iterable[str]) -> Dict[str, ApiKey]:
+        """
+        Verify many API keys at once
+
+        Resolves the keys with one IN query (on id for self-identifying keys,
+        on key_hash for legacy keys) that also loads their customers. Returns
+        a dict of plaintext key -> ApiKey for valid keys. Does not record
+        usage; call record_usage once decisions are made.
+        """
+        by_id = {}
+        by_hash = {}
+        for key in set(plaintext_keys):
+            key_id = ApiKey.parse_key_id(key)
+            if key_id is not None:
+                by_id[key_id] = key
+            else:
+                by_hash[ApiKey.hash_key(key)] = key
+
+        ids = list(by_id)
+        hashes = list(by_hash)
+        found = {}
+        for start in range(0, max(len(ids), len(hashes)), BATCH_IN_CHUNK):
+            chunk_ids = ids[start:start + BATCH_IN_CHUNK]
+            chunk_hashes = hashes[start:start + BATCH_IN_CHUNK]
+            query = ApiKey.query.options(joinedload(ApiKey.customer)).filter(
+                db.or_(ApiKey.id.in_(chunk_ids), ApiKey.key_hash.in_(chunk_hashes))
+            )
+            for api_key in query:
+                if not api_key.is_valid():
+                    continue
+                key = by_id.get(api_key.id)
+                if key is not None and api_key.verify_key(key):
+                    found[key] = api_key
+                key = by_hash.get(api_key.key_hash)
+                if key is not None:
+                    found[key] = api_key
+
+        return found
+
+    @staticmethod
+    def resolve_api_keys(plaintext_keys: List[str]) -> Tuple[Dict[str, Union[ApiKey, SnapshotKey]], bool]:
+        """
+        Batch version of resolve_api_key, with the same snapshot fallback and latency budget
+
+        Returns tuple of (plaintext key -> valid key, degraded).
+        """
+        def from_snapshot():
+            found = {}
+            for key in set(plaintext_keys):
+                entry = key_snapshot.find(key)
+                if entry is not None and entry.is_valid():
+                    found[key] = entry
+            return found
+
+        # One budget per IN query, as each costs about one single-key lookup
+        queries = max(1, -(-len(set(plaintext_keys)) // BATCH_IN_CHUNK))
+        return ApiKeyService._resolve(
+            lambda: ApiKeyService.verify_api_keys(plaintext_keys),
+            from_snapshot,
+            key_snapshot.latency_budget * queries,
+            'batch API key verification',
+        )
+
+    @staticmethod
+    def _resolve(verify, from_snapshot, budget: float, what: str):
+        """
+        Degraded-mode path shared by resolve_api_key and resolve_api_keys
+
+        Answers from the snapshot while degraded or when verify fails with a
+        database error. A verify slower than budget seconds still answers, but
+        routes the following requests to the snapshot.
+        """
+        if key_snapshot.is_degraded():
+            return from_snapshot(), True
+
+        started = time.perf_counter()
+        try:
+            result = verify()
+        except SQLAlchemyError as e:
+            try:
+                db.session.rollback()
+            except SQLAlchemyError:
+                pass
+            current_app.logger.error(f'Database error during {what}: {e}')
+            key_snapshot.mark_degraded('error')
+            return from_snapshot(), True
+
+        if time.perf_counter() - started > budget:
+            key_snapshot.mark_degraded('latency')
+        else:
+            key_snapshot.mark_healthy()
+
+        return result, False
+
+    @staticmethod
+    def record_usage(key_ids: Iterable[int]):
+        """Set last_used_at for many keys with a single UPDATE"""
+        key_ids = set(key_ids)
+        if not key_ids:
+            return
+        if write_queue.enabled:
+            write_queue.touch(key_ids)
+            return
+        ApiKeyService.write_usage(key_ids)
+
+    @staticmethod
+    def write_usage(key_ids: Iterable[int]):
+        """Run and commit the last_used_at UPDATE for record_usage and the write queue"""
+        key_ids = list(key_ids)
+        now = datetime.utcnow()
+        for start in range(0, len(key_ids), BATCH_IN_CHUNK):
+            ApiKey.query.filter(ApiKey.id.in_(key_ids[start:start + BATCH_IN_CHUNK])).update(
+                {ApiKey.last_used_at: now}, synchronize_session=False
+            )
+        db.session.commit()
+
     @staticmethod
     def get_api_key_by_id(key_id: int) -> Optional[ApiKey]:
         """Get API key by ID"""
@@ -83,6 +252,11 @@ class ApiKeyService:
             query = query.filter_by(is_active=True)
         return query.order_by(ApiKey.created_at.desc()).all()
 
+    @staticmethod
+    def select_customer_keys(customer_id: int) -> Select:
+        """Statement selecting a customer's API keys, for paged or streamed listing"""
+        return select(ApiKey).where(ApiKey.customer_id == customer_id)
+
     @staticmethod
     def revoke_api_key(key_id: int) -> bool:
         """Revoke (deactivate) an API key"""
@@ -111,9 +285,4 @@ class ApiKeyService:
         if not api_key.is_valid():
             return False
 
-        if action == 'publish':
-            return api_key.can_publish
-        elif action == 'read':
-            return api_key.can_read
-
-        return False
+        return bool(api_key.permissions & PERMISSION_BITS.get(action, 0))
@@ -0,0 +1,189 @@
+# ABOUTME: Service layer for the API key and customer change feed used by edge sidecars
+# ABOUTME: Records mutations in the flushing transaction, serves them by sequence number and prunes old ones
+
+from datetime import datetime, timedelta
+from itertools import takewhile
+from typing import List, Optional, Set, Tuple
+
+from sqlalchemy import event, func
+from sqlalchemy.orm import Session
+
+from app import db
+from app.models.api_key import ApiKey
+from app.models.auth_change import AuthChange
+from app.models.customer import Customer
+from app.services.invalidation import flushed_changes
+
+
+def _key_dict(api_key: ApiKey) -> dict:
+    return {
+        'id': api_key.id,
+        'customer_id': api_key.customer_id,
+        'key_hash': api_key.key_hash.hex(),
+        'key_prefix': api_key.key_prefix,
+        'is_active': api_key.is_active,
+        'expires_at': api_key.expires_at.isoformat() if api_key.expires_at else None,
+        'permissions': api_key.permissions,
+    }
+
+
+def _customer_dict(customer: Customer) -> dict:
+    return {
+        'id': customer.id,
+        'name': customer.name,
+        'email': customer.email,
+        'is_active': customer.is_active,
+    }
+
+
+class ChangeFeedService:
+    """Service for reading the change feed"""
+
+    @staticmethod
+    def current_seq() -> int:
+        """Latest sequence number in the feed"""
+        return db.session.query(func.max(AuthChange.id)).scalar() or 0
+
+    @staticmethod
+    def pruned_past(since: int) -> bool:
+        """Whether changes after since were pruned, so a reader at since must resync in full"""
+        oldest: Optional[int] = db.session.query(func.min(AuthChange.id)).scalar()
+        return oldest is not None and since < oldest - 1
+
+    @staticmethod
+    def full_page(after_id: int, limit: int) -> dict:
+        """
+        One page of a full sync: active keys with id > after_id and their customers
+
+        The returned seq is taken before reading keys, so replaying the feed
+        from it afterwards covers anything that changed while paging.
+        """
+        seq = ChangeFeedService.current_seq()
+        keys = ApiKey.query.filter(
+            ApiKey.id > after_id, ApiKey.is_active.is_(True)
+        ).order_by(ApiKey.id).limit(limit).all()
+
+        return {
+            'full': True,
+            'seq': seq,
+            'more': len(keys) == limit,
+            'next_after_id': keys[-1].id if keys else after_id,
+            'api_keys': [_key_dict(k) for k in keys],
+            'customers': ChangeFeedService._customers_for(keys, set()),
+            'deleted_api_keys': [],
+            'deleted_customers': [],
+        }
+
+    @staticmethod
+    def changes_since(since: int, limit: int, settle_seconds: float = 0) -> dict:
+        """
+        Current state of every key and customer changed after sequence number since
+
+        Changes younger than settle_seconds are returned but the sequence
+        number does not advance past them: on PostgreSQL a lower id can still
+        commit after a higher one, so the caller will fetch the tail again.
+        When changes after since were pruned, only resync=True is meaningful:
+        the caller must start over with a full sync.
+        """
+        if ChangeFeedService.pruned_past(since):
+            return {
+                'full': False, 'resync': True, 'seq': since, 'more': False, 'api_keys': [],
+                'customers': [], 'deleted_api_keys': [], 'deleted_customers': [],
+            }
+
+        key_ids, customer_ids, seq, more = ChangeFeedService.changed_ids(since, limit, settle_seconds)
+
+        keys = ApiKey.query.filter(ApiKey.id.in_(key_ids)).all() if key_ids else []
+        customers = Customer.query.filter(Customer.id.in_(customer_ids)).all() if customer_ids else []
+
+        return {
+            'full': False,
+            'resync': False,
+            'seq': seq,
+            'more': more,
+            'api_keys': [_key_dict(k) for k in keys],
+            'customers': ChangeFeedService._customers_for(keys, {c.id for c in customers})
+            + [_customer_dict(c) for c in customers],
+            'deleted_api_keys': sorted(key_ids - {k.id for k in keys}),
+            'deleted_customers': sorted(customer_ids - {c.id for c in customers}),
+        }
+
+    @staticmethod
+    def changed_ids(since: int, limit: int, settle_seconds: float = 0) -> Tuple[Set[int], Set[int], int, bool]:
+        """
+        Ids of keys and customers changed after since, at most limit changes
+
+        Returns (key ids, customer ids, sequence number to continue from,
+        whether more changes follow). The sequence number stops before changes
+        younger than settle_seconds, as in changes_since.
+        """
+        changes: List[AuthChange] = AuthChange.query.filter(
+            AuthChange.id > since
+        ).order_by(AuthChange.id).limit(limit).all()
+
+        seq = since
+        cutoff = datetime.utcnow() - timedelta(seconds=settle_seconds)
+        for change in changes:
+            if settle_seconds and change.created_at > cutoff:
+                break
+            seq = change.id
+
+        key_ids = {c.entity_id for c in changes if c.entity == 'api_key'}
+        customer_ids = {c.entity_id for c in changes if c.entity == 'customer'}
+        return key_ids, customer_ids, seq, len(changes) == limit
+
+    @staticmethod
+    def prune(older_than: timedelta, batch_size: int = 10000) -> int:
+        """
+        Delete changes older than older_than, oldest first, batch_size per DELETE
+
+        The newest change is always kept, so the sequence never goes back and
+        current_seq stays meaningful. Returns the number of changes deleted.
+        """
+        cutoff = datetime.utcnow() - older_than
+        newest = ChangeFeedService.current_seq()
+        total = 0
+        while True:
+            rows = db.session.query(AuthChange.id, AuthChange.created_at).filter(
+                AuthChange.id < newest
+            ).order_by(AuthChange.id).limit(batch_size).all()
+            old = list(takewhile(lambda row: row.created_at < cutoff, rows))
+            if not old:
+                return total
+            AuthChange.query.filter(AuthChange.id <= old[-1].id).delete(synchronize_session=False)
+            db.session.commit()
+            total += len(old)
+            if len(old) < batch_size:
+                return total
+
+    @staticmethod
+    def _customers_for(keys, exclude: set) -> list:
+        customer_ids = {k.customer_id for k in keys} - exclude
+        if not customer_ids:
+            return []
+        return [
+            _customer_dict(c) for c in Customer.query.filter(Customer.id.in_(customer_ids)).all()
+        ]
+
+
+def record_changes(session, changes):
+    """Add (entity, id, op) rows to the feed in the session's transaction"""
+    if not changes:
+        return
+
+    now = datetime.utcnow()
+    session.connection().execute(AuthChange.__table__.insert(), [
+        {'entity': entity, 'entity_id': entity_id, 'op': op, 'created_at': now}
+        for entity, entity_id, op in sorted(changes)
+    ])
+
+
+def _record_changes(session, flush_context):
+    # Edges only mirror keys and customers; user changes are for local caches
+    record_changes(session, {c for c in flushed_changes(session) if c[0] in ('api_key', 'customer')})
+
+
+def init_change_feed():
+    """Record API key and customer mutations in the auth_changes table"""
+    if not event.contains(Session, 'after_flush', _record_changes):
+        event.listen(Session, 'after_flush', _record_changes)
@@ -1,9 +1,13 @@
 # ABOUTME: Service layer for customer management operations
 # ABOUTME: Handles customer CRUD operations and business logic
 
-from typing import Optional, List
+from typing import Iterable, Optional, List, Tuple
+from sqlalchemy import Select, event, inspect, select, update
+from sqlalchemy.orm import Session
 from app import db
+from app.models.api_key import ApiKey
 from app.models.customer import Customer
+from app.services.invalidation import has_relevant_changes
 
 
 class CustomerService:
@@ -26,6 +30,32 @@ class CustomerService:
         """Get customer by ID"""
         return Customer.query.get(customer_id)
 
+    @staticmethod
+    def get_versions(customer_id: int) -> Optional[Tuple[int, int]]:
+        """(version, keys_version) of a customer without loading it, or None if it does not exist"""
+        row = db.session.execute(
+            select(Customer.version, Customer.keys_version).where(Customer.id == customer_id)
+        ).first()
+        return tuple(row) if row else None
+
+    @staticmethod
+    def bump_versions(session, customer_ids: Iterable[int] = (), key_customer_ids: Iterable[int] = ()):
+        """
+        Increment version for customer_ids and keys_version for key_customer_ids
+
+        Runs in the session's transaction. Flushes call this automatically;
+        bulk statements that change customers or keys must call it themselves.
+        """
+        table = Customer.__table__
+        for ids, column in ((customer_ids, table.c.version), (key_customer_ids, table.c.keys_version)):
+            ids = sorted(set(ids) - {None})
+            if ids:
+                session.connection().execute(
+                    update(table).where(table.c.id.in_(ids))
+                    # Keep updated_at: its onupdate would otherwise mark the customer itself as edited
+                    .values({column: column + 1, table.c.updated_at: table.c.updated_at})
+                )
+
     @staticmethod
     def get_customer_by_email(email: str) -> Optional[Customer]:
         """Get customer by email"""
@@ -39,6 +69,11 @@ class CustomerService:
             query = query.filter_by(is_active=True)
         return query.order_by(Customer.created_at.desc()).all()
 
+    @staticmethod
+    def select_customers() -> Select:
+        """Statement selecting all customers, for paged or streamed listing"""
+        return select(Customer)
+
     @staticmethod
     def update_customer(customer_id: int, **kwargs) -> Optional[Customer]:
         """Update customer attributes"""
@@ -79,3 +114,23 @@ class CustomerService:
         db.session.delete(customer)
         db.session.commit()
         return True
+
+
+def _bump_versions(session, flush_context):
+    customer_ids, key_customer_ids = set(), set()
+    for obj in session.new | session.dirty | session.deleted:
+        if obj in session.dirty and obj not in session.deleted and not has_relevant_changes(obj):
+            continue
+        if isinstance(obj, Customer) and obj not in session.new:
+            customer_ids.add(obj.id)
+        elif isinstance(obj, ApiKey):
+            key_customer_ids.add(obj.customer_id)
+            # A key moved to another customer changes both collections
+            key_customer_ids.update(inspect(obj).attrs.customer_id.history.deleted)
+    CustomerService.bump_versions(session, customer_ids, key_customer_ids)
+
+
+def init_customer_versions():
+    """Bump customer versions as customers and API keys are flushed"""
+    if not event.contains(Session, 'after_flush', _bump_versions):
+        event.listen(Session, 'after_flush', _bump_versions)
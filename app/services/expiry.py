@@ -0,0 +1,225 @@
+# ABOUTME: Deactivates API keys when they reach expires_at and evicts them from auth caches
+# ABOUTME: Schedules upcoming expirations on a min-heap; also runnable from cron via manage.py
+
+import heapq
+import os
+import threading
+from datetime import datetime, timedelta
+from typing import Iterable, List, Optional, Tuple
+
+from sqlalchemy import select, update
+from app import db
+from app.metrics import metrics
+from app.models.api_key import ApiKey
+from app.services.change_feed import ChangeFeedService, record_changes
+from app.services.customer_service import CustomerService
+from app.services.invalidation import invalidation_bus, note_changes
+from app.services.stats_service import StatsService
+
+
+class ExpiryService:
+    """Service for deactivating expired API keys"""
+
+    @staticmethod
+    def expire_keys(key_ids: Iterable[int], now: Optional[datetime] = None) -> int:
+        """
+        Deactivate the given keys if they are active and past expires_at
+
+        Runs one UPDATE for the batch and publishes the change to auth caches
+        and the change feed, since bulk updates bypass session flush tracking.
+        The UPDATE re-checks is_active, and only the keys it actually changed
+        (from RETURNING, or rows locked with SELECT ... FOR UPDATE where the
+        database lacks it) are counted and published, so concurrent sweepers
+        never expire a key twice. Returns the number of keys deactivated.
+        """
+        now = now or datetime.utcnow()
+        due = (ApiKey.id.in_(list(key_ids)), ApiKey.is_active.is_(True), ApiKey.expires_at <= now)
+        deactivate = update(ApiKey).where(*due).values(is_active=False)
+        options = {'synchronize_session': False}
+
+        if db.session.get_bind().dialect.update_returning:
+            expired = db.session.execute(deactivate.returning(ApiKey.id, ApiKey.customer_id),
+                                         execution_options=options).all()
+        else:
+            expired = db.session.execute(
+                select(ApiKey.id, ApiKey.customer_id).where(*due).with_for_update()
+            ).all()
+            if expired:
+                db.session.execute(deactivate.where(ApiKey.id.in_([row.id for row in expired])),
+                                   execution_options=options)
+        if not expired:
+            db.session.commit()
+            return 0
+
+        ids = [row.id for row in expired]
+        changes = {('api_key', key_id, 'upsert') for key_id in ids}
+        record_changes(db.session, changes)
+        note_changes(db.session, changes)
+        StatsService.adjust(db.session, {'active_api_keys': -len(ids)})
+        CustomerService.bump_versions(db.session, key_customer_ids={row.customer_id for row in expired})
+        db.session.commit()
+
+        metrics.inc('mtxman_api_keys_expired_total', len(ids))
+        return len(ids)
+
+    @staticmethod
+    def expire_due(now: Optional[datetime] = None, batch_size: int = 1000) -> int:
+        """Deactivate every active key past expires_at, batch_size keys per UPDATE"""
+        now = now or datetime.utcnow()
+        total = 0
+        while True:
+            ids = [row.id for row in ApiKey.query.with_entities(ApiKey.id).filter(
+                ApiKey.is_active.is_(True),
+                ApiKey.expires_at <= now,
+            ).order_by(ApiKey.id).limit(batch_size)]
+            if not ids:
+                return total
+            total += ExpiryService.expire_keys(ids, now)
+
+
+class ExpiryScheduler:
+    """
+    Deactivates API keys at the moment they expire
+
+    Keeps a min-heap of (expires_at, key id) for active keys expiring within
+    the horizon. A background thread sleeps until the earliest entry is due,
+    then expires every due key in one batch. Keys created or changed later are
+    picked up from invalidation bus messages. Heap entries can be stale (a
+    key revoked or extended since); expire_keys re-checks in the database.
+    The same thread prunes the change feed once per prune_interval.
+    """
+
+    def __init__(self):
+        self._heap: List[Tuple[datetime, int]] = []
+        self._pending = set()
+        self._reload = True
+        self._loaded_at: Optional[datetime] = None
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._started_pid = None
+        self._app = None
+        self._pruned_at: Optional[datetime] = None
+
+        self.horizon = timedelta(hours=1)
+        self.batch_size = 1000
+        self.change_retention = timedelta(days=7)
+        self.prune_interval = timedelta(hours=1)
+
+    def init_app(self, app):
+        """Load settings and start the sweeper with the first request if enabled"""
+        self._app = app
+        self.horizon = timedelta(seconds=app.config.get('EXPIRY_HORIZON_SECONDS', 3600))
+        self.batch_size = app.config.get('EXPIRY_BATCH_SIZE', 1000)
+        self.change_retention = timedelta(hours=app.config.get('CHANGE_FEED_RETENTION_HOURS', 168))
+
+        invalidation_bus.subscribe(self.on_changes)
+        invalidation_bus.on_full_refresh(self.reload)
+
+        if app.config.get('EXPIRY_SWEEPER_ENABLED', True):
+            app.before_request(self.ensure_started)
+        app.extensions['expiry_scheduler'] = self
+
+    def on_changes(self, changes):
+        """Schedule keys created or changed elsewhere"""
+        key_ids = {key_id for entity, key_id, op in changes if entity == 'api_key' and op == 'upsert'}
+        if key_ids:
+            with self._lock:
+                self._pending.update(key_ids)
+            self._wake.set()
+
+    def reload(self):
+        """Rebuild the heap from the database on the next run"""
+        self._reload = True
+        self._wake.set()
+
+    def _load(self, now: datetime):
+        with self._lock:
+            reload, self._reload = self._reload, False
+            pending, self._pending = self._pending, set()
+
+        query = ApiKey.query.with_entities(ApiKey.expires_at, ApiKey.id).filter(
+            ApiKey.is_active.is_(True),
+            ApiKey.expires_at.isnot(None),
+            ApiKey.expires_at <= now + self.horizon,
+        )
+        if reload:
+            entries = query.all()
+        elif pending:
+            entries = query.filter(ApiKey.id.in_(pending)).all()
+        else:
+            return
+
+        with self._lock:
+            if reload:
+                self._heap = [tuple(entry) for entry in entries]
+                heapq.heapify(self._heap)
+                self._loaded_at = now
+            else:
+                for entry in entries:
+                    heapq.heappush(self._heap, tuple(entry))
+
+    def run_pending(self, now: Optional[datetime] = None) -> Optional[float]:
+        """
+        Expire due keys and return seconds until the next entry is due
+
+        Returns None when nothing is scheduled within the horizon.
+        """
+        now = now or datetime.utcnow()
+        if self._loaded_at is not None and now - self._loaded_at >= self.horizon / 2:
+            # The heap only covers one horizon from when it was loaded
+            self._reload = True
+        self._load(now)
+
+        due = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                due.append(heapq.heappop(self._heap)[1])
+
+        for start in range(0, len(due), self.batch_size):
+            ExpiryService.expire_keys(due[start:start + self.batch_size], now)
+
+        with self._lock:
+            if not self._heap:
+                return None
+            return max((self._heap[0][0] - now).total_seconds(), 0)
+
+    def prune_changes(self, now: Optional[datetime] = None) -> int:
+        """Prune the change feed if prune_interval has passed since the last prune"""
+        now = now or datetime.utcnow()
+        if self._pruned_at is not None and now - self._pruned_at < self.prune_interval:
+            return 0
+        self._pruned_at = now
+        count = ChangeFeedService.prune(self.change_retention)
+        metrics.inc('mtxman_change_feed_pruned_total', count)
+        return count
+
+    def run(self):
+        while True:
+            self._wake.clear()
+            with self._app.app_context():
+                try:
+                    self.prune_changes()
+                except Exception as e:
+                    db.session.rollback()
+                    self._app.logger.error(f'Change feed prune failed: {e}')
+                try:
+                    delay = self.run_pending()
+                except Exception as e:
+                    db.session.rollback()
+                    self._reload = True
+                    self._app.logger.error(f'API key expiry sweep failed: {e}')
+                    delay = 5
+            # Wake at the next expiry, when new keys arrive, or to extend the horizon
+            horizon = self.horizon.total_seconds() / 2
+            self._wake.wait(horizon if delay is None else min(delay, horizon))
+
+    def ensure_started(self):
+        """Start the sweeper thread once per process"""
+        if self._started_pid == os.getpid():
+            return
+        self._started_pid = os.getpid()
+        self._reload = True
+        threading.Thread(target=self.run, name='key-expiry', daemon=True).start()
+
+
+expiry_scheduler = ExpiryScheduler()
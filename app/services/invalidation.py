@@ -0,0 +1,377 @@
+# ABOUTME: Cache invalidation bus fed by SQLAlchemy commits on API keys and customers
+# ABOUTME: Fans out change notices to other workers and nodes over pluggable transports
+
+import glob
+import json
+import logging
+import os
+import select
+import socket
+import threading
+import uuid
+from typing import Callable, Iterable, List, Optional, Tuple
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from app.metrics import metrics
+
+
+Change = Tuple[str, int, str]  # (entity, id, op)
+
+# Stay well below the 8000 byte NOTIFY payload limit and typical datagram sizes
+MAX_CHANGES_PER_MESSAGE = 200
+
+# Bookkeeping columns that do not affect auth decisions
+IGNORED_ATTRIBUTES = {'last_used_at', 'updated_at', 'last_login', 'dn_resolved_at'}
+
+# Child of the Flask app's logger, for receiver threads running outside an app context
+logger = logging.getLogger(__name__)
+
+
+def _deliver_safely(deliver: Callable[[str], None], payload: str):
+    """Hand a payload to the bus without letting an exception end the receiver thread"""
+    try:
+        deliver(payload)
+    except Exception:
+        logger.exception('Failed to handle cache invalidation message')
+
+
+class InProcessTransport:
+    """
+    Delivers messages to every bus attached to the same hub in this process
+
+    Used for tests and single-process deployments. Several buses sharing a hub
+    behave like separate workers.
+    """
+
+    def __init__(self, hub: Optional[list] = None):
+        self.hub = hub if hub is not None else []
+        self._deliver = None
+
+    def start(self, deliver: Callable[[str], None], resync: Callable[[], None]):
+        self._deliver = deliver
+        self.hub.append(deliver)
+
+    def publish(self, payload: str):
+        for deliver in list(self.hub):
+            if deliver is not self._deliver:
+                deliver(payload)
+
+    def close(self):
+        if self._deliver in self.hub:
+            self.hub.remove(self._deliver)
+
+
+class UnixDatagramTransport:
+    """
+    Fans messages out to the local gunicorn workers over Unix datagram sockets
+
+    Every worker binds its own socket in a shared directory; publishing sends
+    one datagram to each other socket found there.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.path = None
+        self._sock = None
+
+    def start(self, deliver: Callable[[str], None], resync: Callable[[], None]):
+        os.makedirs(self.directory, exist_ok=True)
+        self.path = os.path.join(self.directory, f'{os.getpid()}-{uuid.uuid4().hex[:8]}.sock')
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._sock.bind(self.path)
+
+        def loop():
+            while True:
+                try:
+                    data = self._sock.recv(65536)
+                except OSError:
+                    return
+                _deliver_safely(deliver, data.decode('utf-8', 'replace'))
+
+        threading.Thread(target=loop, name='invalidation-unix', daemon=True).start()
+
+    def publish(self, payload: str):
+        data = payload.encode()
+        with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as sender:
+            # A worker that stops reading must not block commits in every other worker
+            sender.setblocking(False)
+            for path in glob.glob(os.path.join(self.directory, '*.sock')):
+                if path == self.path:
+                    continue
+                try:
+                    sender.sendto(data, path)
+                except (ConnectionRefusedError, FileNotFoundError):
+                    # Socket left behind by a dead worker
+                    try:
+                        os.unlink(path)
+                    except OSError:
+                        pass
+                except BlockingIOError:
+                    # Receiver's buffer is full; it will detect the gap by sequence number
+                    metrics.inc('mtxman_invalidation_dropped_total')
+
+    def close(self):
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+        if self.path and os.path.exists(self.path):
+            os.unlink(self.path)
+
+
+class PostgresNotifyTransport:
+    """
+    Fans messages out to every control-plane node with LISTEN/NOTIFY
+
+    Requires psycopg2 (see requirements-postgres.txt). The listener reconnects
+    on failure and requests a full refresh, since notifications sent while it
+    was disconnected are lost.
+    """
+
+    def __init__(self, dsn: str, channel: str = 'mtxman_invalidation'):
+        self.dsn = dsn
+        self.channel = channel
+        self._publish_conn = None
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def _connect(self):
+        import psycopg2
+        conn = psycopg2.connect(self.dsn)
+        conn.autocommit = True
+        return conn
+
+    def start(self, deliver: Callable[[str], None], resync: Callable[[], None]):
+        def loop():
+            first = True
+            while not self._closed:
+                try:
+                    conn = self._connect()
+                    with conn.cursor() as cur:
+                        cur.execute(f'LISTEN "{self.channel}"')
+                    if not first:
+                        resync()
+                    first = False
+                    while not self._closed:
+                        if select.select([conn], [], [], 5) == ([], [], []):
+                            continue
+                        conn.poll()
+                        while conn.notifies:
+                            _deliver_safely(deliver, conn.notifies.pop(0).payload)
+                except Exception:
+                    first = False
+                    threading.Event().wait(1)
+
+        threading.Thread(target=loop, name='invalidation-pg', daemon=True).start()
+
+    def publish(self, payload: str):
+        with self._lock:
+            for attempt in range(2):
+                try:
+                    if self._publish_conn is None or self._publish_conn.closed:
+                        self._publish_conn = self._connect()
+                    with self._publish_conn.cursor() as cur:
+                        cur.execute('SELECT pg_notify(%s, %s)', (self.channel, payload))
+                    return
+                except Exception:
+                    self._publish_conn = None
+                    if attempt:
+                        raise
+
+    def close(self):
+        self._closed = True
+        if self._publish_conn is not None:
+            self._publish_conn.close()
+
+
+class InvalidationBus:
+    """
+    Publishes API key and customer changes to every process holding auth caches
+
+    Changes are collected from flushed sessions and published once the
+    transaction commits. Each process numbers its messages; a receiver that
+    sees a gap in a sender's sequence asks its subscribers for a full refresh.
+    """
+
+    tracked = {}  # model class -> entity name
+
+    def __init__(self):
+        self.origin = None
+        self.transport = None
+        self._seq = 0
+        self._seq_lock = threading.Lock()
+        self._last_seen = {}
+        self._handlers: List[Callable[[List[Change]], None]] = []
+        self._refresh_handlers: List[Callable[[], None]] = []
+        self._started_pid = None
+        self._app = None
+
+    def init_app(self, app):
+        """Create the configured transport and hook into SQLAlchemy sessions"""
+        from app.models.api_key import ApiKey
+        from app.models.customer import Customer
+
+        self.tracked = {ApiKey: 'api_key', Customer: 'customer'}
+        self._app = app
+
+        kind = app.config.get('INVALIDATION_TRANSPORT', 'inprocess')
+        if kind == 'unix':
+            self.transport = UnixDatagramTransport(app.config['INVALIDATION_SOCKET_DIR'])
+        elif kind == 'postgres':
+            dsn = app.config.get('INVALIDATION_PG_DSN') or app.config['SQLALCHEMY_DATABASE_URI']
+            self.transport = PostgresNotifyTransport(
+                dsn.replace('+psycopg2', ''), app.config.get('INVALIDATION_CHANNEL', 'mtxman_invalidation')
+            )
+        elif kind == 'inprocess':
+            self.transport = InProcessTransport()
+        elif kind == 'none':
+            self.transport = None
+        else:
+            raise ValueError(f'Unknown INVALIDATION_TRANSPORT: {kind}')
+
+        if not event.contains(Session, 'after_flush', _collect_changes):
+            event.listen(Session, 'after_flush', _collect_changes)
+            event.listen(Session, 'after_commit', _publish_changes)
+            event.listen(Session, 'after_rollback', _discard_changes)
+
+        # Receivers must run in the worker, not in a pre-fork master
+        app.before_request(self.ensure_started)
+        app.extensions['invalidation_bus'] = self
+
+    def subscribe(self, handler: Callable[[List[Change]], None]):
+        """Call handler with a list of (entity, id, op) for every change"""
+        if handler not in self._handlers:
+            self._handlers.append(handler)
+
+    def on_full_refresh(self, handler: Callable[[], None]):
+        """Call handler when messages may have been missed"""
+        if handler not in self._refresh_handlers:
+            self._refresh_handlers.append(handler)
+
+    def ensure_started(self):
+        """Start the transport receiver once per process"""
+        pid = os.getpid()
+        if self._started_pid == pid or self.transport is None:
+            return
+        self._started_pid = pid
+        self.origin = f'{socket.gethostname()}:{pid}:{uuid.uuid4().hex[:8]}'
+        self._seq = 0
+        self._last_seen = {}
+        self.transport.start(self._receive, self._request_refresh)
+
+    def publish(self, changes: Iterable[Change]):
+        """Apply changes locally and send them to all other processes"""
+        changes = list(changes)
+        if not changes:
+            return
+
+        self._dispatch(changes)
+
+        if self.transport is None:
+            return
+        self.ensure_started()
+
+        for start in range(0, len(changes), MAX_CHANGES_PER_MESSAGE):
+            with self._seq_lock:
+                self._seq += 1
+                seq = self._seq
+            payload = json.dumps({
+                'origin': self.origin,
+                'seq': seq,
+                'changes': changes[start:start + MAX_CHANGES_PER_MESSAGE],
+            })
+            try:
+                self.transport.publish(payload)
+                metrics.inc('mtxman_invalidation_published_total')
+            except Exception as e:
+                metrics.inc('mtxman_invalidation_publish_errors_total')
+                if self._app is not None:
+                    self._app.logger.error(f'Failed to publish cache invalidation: {e}')
+
+    def _receive(self, payload: str):
+        try:
+            message = json.loads(payload)
+            origin, seq = message['origin'], message['seq']
+        except (ValueError, KeyError, TypeError):
+            return
+
+        if origin == self.origin:
+            return
+
+        metrics.inc('mtxman_invalidation_received_total')
+        last = self._last_seen.get(origin)
+        self._last_seen[origin] = seq
+        if last is not None and seq != last + 1:
+            metrics.inc('mtxman_invalidation_gaps_total')
+            self._request_refresh()
+            return
+
+        self._dispatch([tuple(change) for change in message['changes']])
+
+    def _dispatch(self, changes: List[Change]):
+        for handler in list(self._handlers):
+            try:
+                handler(changes)
+            except Exception:
+                # One failing subscriber must not stop the others or the receiver
+                metrics.inc('mtxman_invalidation_handler_errors_total')
+                logger.exception(f'Cache invalidation handler {handler!r} failed')
+
+    def _request_refresh(self):
+        for handler in list(self._refresh_handlers):
+            try:
+                handler()
+            except Exception:
+                metrics.inc('mtxman_invalidation_handler_errors_total')
+                logger.exception(f'Cache refresh handler {handler!r} failed')
+
+    def close(self):
+        if self.transport is not None:
+            self.transport.close()
+        self._started_pid = None
+
+
+invalidation_bus = InvalidationBus()
+
+
+def flushed_changes(session) -> set:
+    """Return (entity, id, op) for tracked objects written by the current flush"""
+    changes = set()
+    for op, objects in (('upsert', session.new), ('upsert', session.dirty), ('delete', session.deleted)):
+        for obj in objects:
+            entity = invalidation_bus.tracked.get(type(obj))
+            if entity is None or obj.id is None:
+                continue
+            if op == 'upsert' and obj in session.dirty and not has_relevant_changes(obj):
+                continue
+            changes.add((entity, obj.id, op))
+    return changes
+
+
+def has_relevant_changes(obj) -> bool:
+    """Whether a dirty object changed anything besides bookkeeping columns"""
+    return any(
+        attr.history.has_changes()
+        for attr in inspect(obj).attrs
+        if attr.key not in IGNORED_ATTRIBUTES
+    )
+
+
+def note_changes(session, changes):
+    """Publish changes made by bulk statements, which flushes do not see, on commit"""
+    session.info.setdefault('invalidations', set()).update(changes)
+
+
+def _collect_changes(session, flush_context):
+    session.info.setdefault('invalidations', set()).update(flushed_changes(session))
+
+
+def _publish_changes(session):
+    pending = session.info.pop('invalidations', None)
+    if pending:
+        invalidation_bus.publish(sorted(pending))
+
+
+def _discard_changes(session):
+    session.info.pop('invalidations', None)
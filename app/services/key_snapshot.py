@@ -0,0 +1,541 @@
+# ABOUTME: Last-known-good snapshot of API keys and customers for degraded-mode auth
+# ABOUTME: Answers MediaMTX auth lookups when the database is unreachable or too slow
+
+import hmac
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Optional
+
+from flask import current_app
+from sqlalchemy.exc import SQLAlchemyError
+
+from app import db
+from app.database import primary
+from app.metrics import metrics
+from app.models.api_key import ApiKey, PERMISSION_BITS
+from app.models.customer import Customer
+from app.services.change_feed import ChangeFeedService
+
+
+class SnapshotCustomer:
+    """Read-only copy of the customer fields used by the auth path"""
+
+    __slots__ = ('id', 'name', 'email', 'is_active')
+
+    def __init__(self, id, name, email, is_active):
+        self.id = id
+        self.name = name
+        self.email = email
+        self.is_active = is_active
+
+    def to_dict(self):
+        return {'id': self.id, 'name': self.name, 'email': self.email, 'is_active': self.is_active}
+
+
+class SnapshotKey:
+    """
+    Read-only copy of an API key as seen at snapshot time
+
+    Exposes the same attributes and is_valid() as ApiKey, so mediamtx_auth and
+    ApiKeyService.check_permission work on it unchanged.
+    """
+
+    __slots__ = (
+        'id', 'customer_id', 'key_hash', 'key_prefix', 'is_active',
+        'expires_at', 'permissions', 'customer',
+    )
+
+    def __init__(self, id, customer_id, key_hash, key_prefix, is_active,
+                 expires_at, permissions, customer):
+        self.id = id
+        self.customer_id = customer_id
+        self.key_hash = key_hash
+        self.key_prefix = key_prefix
+        self.is_active = is_active
+        self.expires_at = expires_at
+        self.permissions = permissions
+        self.customer = customer
+
+    @property
+    def can_publish(self):
+        return bool(self.permissions & PERMISSION_BITS['publish'])
+
+    @property
+    def can_read(self):
+        return bool(self.permissions & PERMISSION_BITS['read'])
+
+    def is_valid(self):
+        """Check if the key was active and is not expired"""
+        if not self.is_active:
+            return False
+
+        if self.expires_at and self.expires_at < datetime.utcnow():
+            return False
+
+        return True
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'customer_id': self.customer_id,
+            'key_hash': self.key_hash.hex(),
+            'key_prefix': self.key_prefix,
+            'is_active': self.is_active,
+            'expires_at': self.expires_at.isoformat() if self.expires_at else None,
+            'permissions': self.permissions,
+        }
+
+
+def parse_policy(value) -> Dict[str, str]:
+    """
+    Parse a degraded-mode policy
+
+    Accepts a dict or a string like "publish=closed,read=open".
+    """
+    if isinstance(value, dict):
+        items = value.items()
+    else:
+        items = (part.split('=', 1) for part in (value or '').split(',') if '=' in part)
+
+    policy = {}
+    for action, mode in items:
+        mode = mode.strip().lower()
+        if mode not in ('open', 'closed'):
+            raise ValueError(f'Invalid degraded auth policy {mode!r} for action {action!r}')
+        policy[action.strip()] = mode
+    return policy
+
+
+def find_key(keys: Dict[bytes, SnapshotKey], by_id: Dict[int, bytes], plaintext_key: str) -> Optional[SnapshotKey]:
+    """Look up a plaintext key in hash- and id-indexed dicts of snapshot keys"""
+    key_hash = ApiKey.hash_key(plaintext_key)
+    key_id = ApiKey.parse_key_id(plaintext_key)
+    if key_id is None:
+        return keys.get(key_hash)
+
+    stored = by_id.get(key_id)
+    if stored is None or not hmac.compare_digest(stored, key_hash):
+        return None
+    return keys.get(stored)
+
+
+class KeySnapshot:
+    """
+    Last-known-good view of API keys used when the database cannot answer
+
+    The snapshot is refreshed from the database while it is healthy and can be
+    persisted to disk so a restarted worker still has data during an outage.
+    Degraded mode is entered on database errors or when a lookup exceeds the
+    latency budget, and is left automatically once the retry interval passes
+    and the next database lookup succeeds.
+
+    Refreshes run in a background thread per worker, woken by invalidations
+    and every refresh interval, so no auth request waits for one. After the
+    first load, a refresh catches up on the change feed and reloads only the
+    keys and customers changed since, in the existing dicts: workers forked
+    from a warmed master keep sharing the untouched entries. The snapshot is
+    rebuilt in full only when the feed was pruned past its sequence number.
+    """
+
+    def __init__(self):
+        self._keys: Dict[bytes, SnapshotKey] = {}
+        self._by_id: Dict[int, bytes] = {}
+        self._loaded_at: Optional[float] = None
+        self._seq: Optional[int] = None  # change feed sequence number the contents reflect
+        self._complete = False  # False while only a warm-up's preloaded keys are held
+        self._stale = False
+        self._dirty_keys = set()
+        self._dirty_customers = set()
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._degraded_until = 0.0
+        self._degraded = False
+        self._wake = threading.Event()
+        self._started_pid = None
+        self._app = None
+
+        self.refresh_interval = 60
+        self.settle_seconds = 2
+        self.latency_budget = 0.25
+        self.retry_interval = 5
+        self.policy = {'publish': 'closed', 'read': 'open'}
+        self.path = None
+
+    def init_app(self, app):
+        """Load degraded-mode settings from app config"""
+        self.refresh_interval = app.config.get('AUTH_SNAPSHOT_REFRESH_SECONDS', 60)
+        self.settle_seconds = app.config.get('CHANGE_FEED_SETTLE_SECONDS', 2)
+        self.latency_budget = app.config.get('AUTH_DB_LATENCY_BUDGET_MS', 250) / 1000.0
+        self.retry_interval = app.config.get('AUTH_DEGRADED_RETRY_SECONDS', 5)
+        self.policy = parse_policy(app.config.get('AUTH_DEGRADED_POLICY', 'publish=closed,read=open'))
+        self.path = app.config.get('AUTH_SNAPSHOT_PATH')
+        self._app = app
+
+        metrics.gauge_callback(
+            'mtxman_auth_snapshot_age_seconds', self.age_seconds,
+            'Seconds since the last-known-good key snapshot was taken'
+        )
+        metrics.gauge_callback(
+            'mtxman_auth_snapshot_keys', lambda: len(self._keys),
+            'Number of API keys held in the last-known-good snapshot'
+        )
+        metrics.gauge_callback(
+            'mtxman_auth_degraded', lambda: 1 if self.is_degraded() else 0,
+            'Whether MediaMTX auth is currently served from the snapshot'
+        )
+
+        from app.services.invalidation import invalidation_bus
+        invalidation_bus.subscribe(self.invalidate)
+        invalidation_bus.on_full_refresh(self.mark_stale)
+
+        if app.config.get('AUTH_SNAPSHOT_REFRESHER_ENABLED', True):
+            # The refresher must run in the worker, not in a pre-fork master
+            app.before_request(self.ensure_started)
+        app.extensions['key_snapshot'] = self
+
+    # Snapshot contents
+
+    @staticmethod
+    def _query_keys():
+        return db.session.query(
+            ApiKey.id, ApiKey.customer_id, ApiKey.key_hash, ApiKey.key_prefix,
+            ApiKey.is_active, ApiKey.expires_at, ApiKey.permissions,
+            Customer.name, Customer.email, Customer.is_active,
+        ).join(Customer, ApiKey.customer_id == Customer.id).filter(
+            ApiKey.is_active.is_(True)
+        )
+
+    @staticmethod
+    def _build(rows, customers):
+        keys = {}
+        for row in rows:
+            customer = customers.get(row[1])
+            if customer is None:
+                customer = customers[row[1]] = SnapshotCustomer(row[1], row[7], row[8], row[9])
+            keys[row[2]] = SnapshotKey(*row[:7], customer)
+        return keys
+
+    def refresh(self):
+        """Rebuild the snapshot from the database, replacing its dicts"""
+        with self._lock:
+            self._stale = False
+            self._dirty_keys.clear()
+            self._dirty_customers.clear()
+
+        seq = ChangeFeedService.current_seq()
+        keys = self._build(self._query_keys().all(), {})
+
+        with self._lock:
+            self._keys = keys
+            self._by_id = {key.id: key_hash for key_hash, key in keys.items()}
+            self._loaded_at = time.time()
+            self._seq, self._complete = seq, True
+            # Changes committed while the query ran may not be in its results
+            self._evict_locked(self._dirty_keys, self._dirty_customers)
+
+        if self.path:
+            self._save_file()
+
+    def catch_up(self, page_size: int = 10000):
+        """
+        Bring the snapshot up to date from the change feed, in place
+
+        Adds keys a partial warm-up left out, then reloads the keys and
+        customers changed since the snapshot's sequence number. Falls back to
+        a full refresh before the first load or when the feed was pruned past it.
+        """
+        if self._seq is None or ChangeFeedService.pruned_past(self._seq):
+            self.refresh()
+            return
+
+        with self._lock:
+            self._stale = False
+            # Pending invalidations are reloaded with the first page of changes
+            key_ids, self._dirty_keys = self._dirty_keys, set()
+            customer_ids, self._dirty_customers = self._dirty_customers, set()
+
+        changed = self._fill(page_size) if not self._complete else 0
+        while True:
+            feed_keys, feed_customers, seq, more = ChangeFeedService.changed_ids(
+                self._seq, page_size, self.settle_seconds
+            )
+            key_ids, customer_ids = key_ids | feed_keys, customer_ids | feed_customers
+            if key_ids or customer_ids:
+                self._reload(key_ids, customer_ids)
+                changed += len(key_ids) + len(customer_ids)
+            # Unsettled changes do not advance seq; they are reloaded again next time
+            advanced, self._seq = seq > self._seq, seq
+            if not (more and advanced):
+                break
+            key_ids, customer_ids = set(), set()
+
+        with self._lock:
+            self._loaded_at = time.time()
+        if changed and self.path:
+            self._save_file()
+
+    def _fill(self, page_size: int) -> int:
+        """Add active keys missing from a snapshot that only holds preloaded keys"""
+        added, after_id = 0, 0
+        while True:
+            rows = self._query_keys().filter(ApiKey.id > after_id).order_by(ApiKey.id).limit(page_size).all()
+            if not rows:
+                break
+            after_id = rows[-1][0]
+            fresh = self._build([row for row in rows if row[0] not in self._by_id], {})
+            with self._lock:
+                for key in fresh.values():
+                    if key.id not in self._by_id:
+                        self._put_locked(key)
+                        added += 1
+                self._evict_locked(self._dirty_keys, self._dirty_customers)
+        self._complete = True
+        return added
+
+    def _reload(self, key_ids, customer_ids):
+        """Reload the given keys and the keys of the given customers in place"""
+        query = self._query_keys().filter(
+            db.or_(ApiKey.id.in_(key_ids), ApiKey.customer_id.in_(customer_ids))
+        )
+        # The primary has the change these ids announce; a replica may not yet
+        with primary():
+            fresh = self._build(query.all(), {})
+
+        fresh_ids = {key.id for key in fresh.values()}
+        with self._lock:
+            for key in fresh.values():
+                self._put_locked(key)
+            # Keys revoked or deleted since, directly or with their customer
+            gone = set(key_ids) - fresh_ids
+            gone.update(k.id for k in self._keys.values()
+                        if k.customer_id in customer_ids and k.id not in fresh_ids)
+            self._evict_locked(gone, ())
+            self._evict_locked(self._dirty_keys, self._dirty_customers)
+
+    def _reload_dirty(self):
+        """Reload only the keys and customers named in invalidation messages"""
+        with self._lock:
+            key_ids, self._dirty_keys = self._dirty_keys, set()
+            customer_ids, self._dirty_customers = self._dirty_customers, set()
+        self._reload(key_ids, customer_ids)
+
+    def preload(self, key_ids) -> int:
+        """
+        Add the given keys to the snapshot without replacing it
+
+        Used by start-up warm-up to load the hottest keys first. The first
+        preload counts as a load, so keys outside the warmed set are added by
+        the next scheduled refresh. Returns the number of keys added.
+        """
+        if self._loaded_at is None:
+            seq = ChangeFeedService.current_seq()
+            with self._lock:
+                if self._loaded_at is None:
+                    # From here on, invalidations are tracked as dirty keys
+                    self._loaded_at = time.time()
+                    self._seq, self._complete = seq, False
+
+        fresh = self._build(self._query_keys().filter(ApiKey.id.in_(key_ids)).all(), {})
+
+        with self._lock:
+            for key in fresh.values():
+                self._put_locked(key)
+            self._evict_locked(self._dirty_keys, self._dirty_customers)
+        return len(fresh)
+
+    def _put_locked(self, key: SnapshotKey):
+        old_hash = self._by_id.get(key.id)
+        if old_hash is not None and old_hash != key.key_hash:
+            self._keys.pop(old_hash, None)
+        self._keys[key.key_hash] = key
+        self._by_id[key.id] = key.key_hash
+
+    def _evict_locked(self, key_ids, customer_ids):
+        if customer_ids:
+            key_ids = set(key_ids)
+            key_ids.update(k.id for k in self._keys.values() if k.customer_id in customer_ids)
+
+        for key_id in key_ids:
+            key_hash = self._by_id.pop(key_id, None)
+            if key_hash is not None:
+                self._keys.pop(key_hash, None)
+
+    def invalidate(self, changes):
+        """Evict changed keys and customers; they are reloaded on the next refresh"""
+        customer_ids = {cid for entity, cid, op in changes if entity == 'customer'}
+        key_ids = {kid for entity, kid, op in changes if entity == 'api_key'}
+
+        with self._lock:
+            self._evict_locked(key_ids, customer_ids)
+            if self._loaded_at is not None:
+                self._dirty_keys.update(key_ids)
+                self._dirty_customers.update(customer_ids)
+                self._wake.set()
+
+    def mark_stale(self):
+        """Catch up on the change feed at once (invalidations may have been missed)"""
+        self._stale = True
+        self._wake.set()
+
+    def refresh_if_stale(self):
+        """Apply pending invalidations, and catch up on the change feed once the snapshot is too old"""
+        age = self.age_seconds()
+        due = self._stale or (
+            self.refresh_interval and (age is None or age >= self.refresh_interval)
+        )
+        if not due and not (self._dirty_keys or self._dirty_customers):
+            return
+
+        # Only one thread per worker refreshes; others keep using the current copy
+        if not self._refresh_lock.acquire(blocking=False):
+            return
+        try:
+            if due:
+                self.catch_up()
+            else:
+                self._reload_dirty()
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            current_app.logger.error(f'Failed to refresh auth key snapshot: {e}')
+        finally:
+            self._refresh_lock.release()
+
+    def run(self):
+        while True:
+            self._wake.clear()
+            if not self.is_degraded():
+                with self._app.app_context():
+                    try:
+                        self.refresh_if_stale()
+                    except Exception as e:
+                        db.session.rollback()
+                        self._app.logger.error(f'Auth key snapshot refresher failed: {e}')
+            self._wake.wait(self.refresh_interval or None)
+
+    def ensure_started(self):
+        """Start the refresher thread once per process"""
+        if self._started_pid == os.getpid():
+            return
+        self._started_pid = os.getpid()
+        threading.Thread(target=self.run, name='key-snapshot', daemon=True).start()
+
+    def lookup(self, key_hash: bytes) -> Optional[SnapshotKey]:
+        """Find a key in the snapshot by its hash"""
+        if self._loaded_at is None and self.path:
+            self._load_file()
+        return self._keys.get(key_hash)
+
+    def find(self, plaintext_key: str) -> Optional[SnapshotKey]:
+        """Find a key in the snapshot by its plaintext value"""
+        if self._loaded_at is None and self.path:
+            self._load_file()
+        return find_key(self._keys, self._by_id, plaintext_key)
+
+    def age_seconds(self) -> Optional[float]:
+        """Seconds since the snapshot was taken, or None if never loaded"""
+        if self._loaded_at is None:
+            return None
+        return time.time() - self._loaded_at
+
+    def clear(self):
+        """Forget all snapshot data and degraded state"""
+        with self._lock:
+            self._keys = {}
+            self._by_id = {}
+            self._loaded_at = None
+            self._seq, self._complete = None, False
+            self._stale = False
+            self._dirty_keys.clear()
+            self._dirty_customers.clear()
+        self._degraded_until = 0.0
+        self._degraded = False
+
+    def _save_file(self):
+        # Copy under the lock: invalidations and catch-ups change the dicts from other threads
+        with self._lock:
+            keys = list(self._keys.values())
+            taken_at = self._loaded_at
+
+        payload = {
+            'taken_at': taken_at,
+            'customers': {},
+            'keys': [],
+        }
+        for key in keys:
+            payload['customers'][str(key.customer_id)] = key.customer.to_dict()
+            payload['keys'].append(key.to_dict())
+
+        # A temp file per writer, so workers saving at once never mix their output
+        tmp_path = None
+        try:
+            fd, tmp_path = tempfile.mkstemp(
+                dir=os.path.dirname(self.path) or '.', prefix=f'{os.path.basename(self.path)}.', suffix='.tmp'
+            )
+            with os.fdopen(fd, 'w') as fh:
+                json.dump(payload, fh)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            current_app.logger.error(f'Failed to persist auth key snapshot to {self.path}: {e}')
+            if tmp_path and os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+
+    def _load_file(self):
+        try:
+            with open(self.path) as fh:
+                payload = json.load(fh)
+            customers = {
+                int(cid): SnapshotCustomer(**data) for cid, data in payload['customers'].items()
+            }
+            keys = {}
+            for data in payload['keys']:
+                expires_at = data['expires_at']
+                data = dict(
+                    data,
+                    key_hash=bytes.fromhex(data['key_hash']),
+                    expires_at=datetime.fromisoformat(expires_at) if expires_at else None,
+                )
+                keys[data['key_hash']] = SnapshotKey(customer=customers[data['customer_id']], **data)
+        except (OSError, ValueError, KeyError, TypeError):
+            # Missing, corrupt or written by an older version
+            return
+
+        with self._lock:
+            if self._loaded_at is None:
+                self._keys = keys
+                self._by_id = {key.id: key_hash for key_hash, key in keys.items()}
+                # No feed position is saved, so the next refresh rebuilds in full
+                self._loaded_at = payload['taken_at']
+
+    # Degraded state
+
+    def is_degraded(self) -> bool:
+        """Whether lookups should skip the database and use the snapshot"""
+        return time.monotonic() < self._degraded_until
+
+    def mark_degraded(self, reason: str):
+        """Serve from the snapshot until the retry interval has passed"""
+        self._degraded_until = time.monotonic() + self.retry_interval
+        if not self._degraded:
+            self._degraded = True
+            metrics.inc('mtxman_auth_degraded_transitions_total', reason=reason)
+            current_app.logger.warning(
+                f'MediaMTX auth entering degraded mode ({reason}); '
+                f'snapshot age: {self.age_seconds()}s'
+            )
+
+    def mark_healthy(self):
+        """Record a successful, fast database lookup"""
+        if self._degraded:
+            self._degraded = False
+            current_app.logger.info('MediaMTX auth recovered from degraded mode')
+
+    def allows(self, action: str) -> bool:
+        """Whether the degraded-mode policy lets this action use the snapshot"""
+        return self.policy.get(action, 'closed') == 'open'
+
+
+key_snapshot = KeySnapshot()
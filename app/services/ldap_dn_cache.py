@@ -0,0 +1,108 @@
+# ABOUTME: TTL cache mapping LDAP login names to DNs and display attributes
+# ABOUTME: Backed by process memory and the users table so repeat logins skip the directory search
+
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from app import db
+from app.metrics import metrics
+from app.models.user import User
+
+
+class DNCache:
+    """
+    Resolves a username to the DN and attributes found by an earlier search
+
+    Lookups check process memory first, then the users table, where a row
+    counts only if its DN was resolved within the TTL. A cached DN is a hint:
+    the password bind still goes to the directory, and authenticate falls
+    back to a search if that bind fails.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: Dict[str, tuple] = {}  # username -> (expires monotonic time, user info)
+
+        self.ttl = 3600
+        self.max_entries = 10000
+
+    def configure(self, ttl: int):
+        """Set the TTL in seconds (0 disables the cache)"""
+        self.ttl = ttl
+
+    def get(self, username: str) -> Optional[dict]:
+        """Return cached user info for username, or None"""
+        if self.ttl <= 0:
+            return None
+
+        with self._lock:
+            entry = self._entries.get(username)
+        if entry is not None and entry[0] > time.monotonic():
+            metrics.inc('mtxman_ldap_dn_cache_total', result='memory')
+            return dict(entry[1])
+
+        user = User.query.filter(
+            User.username == username,
+            User.dn.isnot(None),
+            User.dn_resolved_at >= datetime.utcnow() - timedelta(seconds=self.ttl),
+        ).first()
+        if user is None:
+            metrics.inc('mtxman_ldap_dn_cache_total', result='miss')
+            return None
+
+        info = {
+            'username': username,
+            'dn': user.dn,
+            'email': user.email,
+            'display_name': user.display_name,
+        }
+        # Only keep it in memory for what is left of the row's TTL
+        remaining = self.ttl - (datetime.utcnow() - user.dn_resolved_at).total_seconds()
+        self._remember(username, info, remaining)
+        metrics.inc('mtxman_ldap_dn_cache_total', result='database')
+        return dict(info)
+
+    def put(self, username: str, info: dict):
+        """Cache user info from a directory search and record it on the user's row"""
+        if self.ttl <= 0:
+            return
+
+        self._remember(username, info, self.ttl)
+        try:
+            User.query.filter_by(username=username).update({
+                User.dn: info['dn'],
+                User.email: info['email'],
+                User.display_name: info['display_name'],
+                User.dn_resolved_at: datetime.utcnow(),
+            }, synchronize_session='fetch')
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+    def invalidate(self, username: str):
+        """Forget a username, e.g. after a failed bind to its cached DN"""
+        with self._lock:
+            self._entries.pop(username, None)
+        User.query.filter_by(username=username).update(
+            {User.dn_resolved_at: None}, synchronize_session='fetch'
+        )
+        db.session.commit()
+
+    def clear(self):
+        """Drop every in-memory entry"""
+        with self._lock:
+            self._entries.clear()
+
+    def _remember(self, username: str, info: dict, ttl: float):
+        with self._lock:
+            if len(self._entries) >= self.max_entries and username not in self._entries:
+                # Evict the entry closest to expiry
+                oldest = min(self._entries, key=lambda name: self._entries[name][0])
+                del self._entries[oldest]
+            self._entries[username] = (time.monotonic() + ttl, dict(info))
+
+
+dn_cache = DNCache()
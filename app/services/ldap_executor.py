@@ -0,0 +1,213 @@
+# ABOUTME: Runs LDAP logins on a bounded thread pool behind a circuit breaker
+# ABOUTME: Keeps a slow or failing directory from tying up the web workers that serve stream auth
+
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Callable, Optional
+
+from flask import current_app
+from ldap3.core.exceptions import LDAPException
+
+from app.metrics import metrics
+
+
+class LDAPUnavailable(Exception):
+    """The directory could not answer, so the login was refused without a verdict"""
+
+
+class CircuitBreaker:
+    """
+    Fails LDAP calls fast after repeated directory errors
+
+    After `threshold` consecutive errors the breaker opens and calls are
+    refused. A background timer probes the directory every `reset_seconds`
+    (half-open); the breaker closes when a probe succeeds, so no login has
+    to be the guinea pig.
+    """
+
+    CLOSED, HALF_OPEN, OPEN = 'closed', 'half_open', 'open'
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._timer: Optional[threading.Timer] = None
+        self.state = self.CLOSED
+        self.probe: Optional[Callable[[], bool]] = None
+
+        self.threshold = 5
+        self.reset_seconds = 30.0
+
+    def allow(self) -> bool:
+        """Whether a call may go to the directory"""
+        return self.state == self.CLOSED
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            if self.state == self.CLOSED:
+                return
+            self._cancel_probe_locked()
+            self._transition(self.CLOSED)
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state != self.CLOSED or self._failures < self.threshold:
+                return
+            self._transition(self.OPEN)
+            self._schedule_probe_locked()
+
+    def _transition(self, state: str):
+        self.state = state
+        metrics.inc('mtxman_ldap_breaker_transitions_total', state=state)
+
+    def _schedule_probe_locked(self):
+        # One pending probe at most, so probe chains never multiply
+        self._cancel_probe_locked()
+        self._timer = threading.Timer(self.reset_seconds, self._run_probe)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _cancel_probe_locked(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def _run_probe(self):
+        with self._lock:
+            if self.state != self.OPEN:
+                return  # closed or reset since this probe was scheduled
+            self._timer = None
+            self._transition(self.HALF_OPEN)
+        try:
+            healthy = bool(self.probe and self.probe())
+        except Exception:
+            healthy = False
+
+        if healthy:
+            self.record_success()
+            return
+        with self._lock:
+            if self.state != self.HALF_OPEN:
+                return
+            self._transition(self.OPEN)
+            self._schedule_probe_locked()
+
+    def reset(self):
+        """Close the breaker, forget recorded failures and cancel a pending probe"""
+        with self._lock:
+            self._failures = 0
+            self._cancel_probe_locked()
+            self.state = self.CLOSED
+
+
+class LDAPExecutor:
+    """
+    Bounded thread pool for LDAP calls made while serving a request
+
+    The request thread waits at most `timeout` seconds for the result. At
+    most `workers` calls run at once and `queue_limit` more may wait; beyond
+    that calls are refused immediately. With `workers` set to 0 calls run
+    inline on the request thread, still behind the breaker.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._in_flight = 0
+        self._app = None
+        self.breaker = CircuitBreaker()
+
+        self.workers = 4
+        self.queue_limit = 16
+        self.timeout = 15.0
+
+    def init_app(self, app):
+        """Load settings from app config and register metrics"""
+        self._app = app
+        self.workers = app.config.get('LDAP_LOGIN_WORKERS', 4)
+        self.queue_limit = app.config.get('LDAP_LOGIN_QUEUE_LIMIT', 16)
+        self.timeout = app.config.get('LDAP_LOGIN_TIMEOUT', 15)
+        self.breaker.threshold = app.config.get('LDAP_BREAKER_THRESHOLD', 5)
+        self.breaker.reset_seconds = app.config.get('LDAP_BREAKER_RESET_SECONDS', 30)
+        self.breaker.probe = self._probe
+
+        metrics.gauge_callback(
+            'mtxman_ldap_login_queue_depth', self.queue_depth,
+            'LDAP logins waiting for a free worker thread'
+        )
+        metrics.gauge_callback(
+            'mtxman_ldap_login_in_flight', lambda: self._in_flight,
+            'LDAP logins running or queued'
+        )
+        metrics.gauge_callback(
+            'mtxman_ldap_breaker_state', self.breaker_state,
+            'LDAP circuit breaker state: 0 closed, 1 half-open, 2 open'
+        )
+        app.extensions['ldap_executor'] = self
+
+    def queue_depth(self) -> int:
+        return max(self._in_flight - max(self.workers, 0), 0)
+
+    def breaker_state(self) -> int:
+        return {CircuitBreaker.CLOSED: 0, CircuitBreaker.HALF_OPEN: 1, CircuitBreaker.OPEN: 2}[self.breaker.state]
+
+    def call(self, fn: Callable, *args):
+        """
+        Run fn(*args) against the directory
+
+        Raises LDAPUnavailable if the breaker is open, the queue is full, the
+        call times out or fn raises an LDAPException.
+        """
+        if not self.breaker.allow():
+            self._reject('breaker_open')
+
+        if self.workers <= 0:
+            return self._run(fn, args)
+
+        with self._lock:
+            if self._in_flight >= self.workers + self.queue_limit:
+                self._reject('queue_full')
+            self._in_flight += 1
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='ldap')
+
+        future = self._pool.submit(self._run_in_context, current_app._get_current_object(), fn, args)
+        future.add_done_callback(self._done)
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            # The worker thread finishes on its own once the socket times out
+            self.breaker.record_failure()
+            self._reject('timeout')
+
+    def _run_in_context(self, app, fn, args):
+        with app.app_context():
+            return self._run(fn, args)
+
+    def _run(self, fn, args):
+        try:
+            result = fn(*args)
+        except LDAPException as e:
+            self.breaker.record_failure()
+            metrics.inc('mtxman_ldap_errors_total')
+            raise LDAPUnavailable(f'LDAP error: {e}') from e
+        self.breaker.record_success()
+        return result
+
+    def _done(self, future):
+        with self._lock:
+            self._in_flight -= 1
+
+    def _reject(self, reason: str):
+        metrics.inc('mtxman_ldap_rejections_total', reason=reason)
+        raise LDAPUnavailable(f'LDAP unavailable ({reason.replace("_", " ")})')
+
+    def _probe(self) -> bool:
+        from app.services.ldap_service import LDAPService
+
+        with self._app.app_context():
+            return LDAPService.test_connection()
+
+
+ldap_executor = LDAPExecutor()
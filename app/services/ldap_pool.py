@@ -0,0 +1,154 @@
+# ABOUTME: Process-wide pool of LDAP service-account connections with a cached server object
+# ABOUTME: Fetches directory info and schema once and health-checks connections on checkout
+
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Optional
+
+from ldap3 import Server, Connection, ALL, BASE
+from ldap3.core.exceptions import LDAPException
+
+
+class LDAPPool:
+    """
+    Pool of bound service-account connections sharing one Server object
+
+    The Server (and its DSA info and schema) is created on first use and
+    reused for every connection, so the schema is read once per process
+    rather than on every login. Connections idle for longer than the health
+    check interval are probed before reuse and rebound if the probe fails.
+    A connection that raises while checked out is discarded.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._idle = deque()  # (connection, last used monotonic time)
+        self._slots: Optional[threading.BoundedSemaphore] = None
+        self._server: Optional[Server] = None
+        self._info_loaded = False
+        self._settings = None
+
+        self.size = 4
+        self.health_check_interval = 30
+        self.strategy = 'SYNC'
+        self.connect_timeout = None
+        self.receive_timeout = None
+
+    def configure(self, config: dict):
+        """Apply LDAP settings; the pool is rebuilt if they changed"""
+        settings = (
+            config['host'], config['port'], config['use_ssl'],
+            config['bind_user_dn'], config['bind_password'],
+            config.get('pool_size', 4), config.get('strategy', 'SYNC'),
+            config.get('connect_timeout'), config.get('receive_timeout'),
+        )
+        if settings == self._settings:
+            return
+
+        with self._lock:
+            self._close_idle_locked()
+            self._settings = settings
+            self._server = None
+            self._info_loaded = False
+            self.size = config.get('pool_size', 4)
+            self.health_check_interval = config.get('pool_health_check_seconds', 30)
+            self.strategy = config.get('strategy', 'SYNC')
+            self.connect_timeout = config.get('connect_timeout')
+            self.receive_timeout = config.get('receive_timeout')
+            self._slots = threading.BoundedSemaphore(self.size)
+
+    @property
+    def server(self) -> Server:
+        """The shared Server object (created on first use)"""
+        if self._server is None:
+            host, port, use_ssl = self._settings[:3]
+            self._server = Server(host, port=port, use_ssl=use_ssl, get_info=ALL,
+                                  connect_timeout=self.connect_timeout)
+        return self._server
+
+    def _connect(self, user=None, password=None) -> Connection:
+        conn = Connection(self.server, user=user, password=password, client_strategy=self.strategy,
+                          receive_timeout=self.receive_timeout)
+        # Read DSA info and schema only the first time a bind succeeds
+        conn.open(read_server_info=False)
+        conn.bind(read_server_info=not self._info_loaded)
+        if conn.bound:
+            self._info_loaded = True
+        return conn
+
+    def _service_connect(self) -> Connection:
+        bind_dn, bind_password = self._settings[3:5]
+        if bind_dn and bind_password:
+            conn = self._connect(bind_dn, bind_password)
+        else:
+            conn = self._connect()  # anonymous bind
+        if not conn.bound:
+            raise LDAPException(f'LDAP service account bind failed: {conn.result}')
+        return conn
+
+    def _healthy(self, conn: Connection, idle_since: float) -> bool:
+        if conn.closed or not conn.bound:
+            return False
+        if time.monotonic() - idle_since < self.health_check_interval:
+            return True
+        try:
+            return conn.search('', '(objectClass=*)', search_scope=BASE, attributes=['1.1'])
+        except LDAPException:
+            return False
+
+    @contextmanager
+    def connection(self):
+        """Check out a bound service-account connection"""
+        self._slots.acquire()
+        try:
+            with self._lock:
+                entry = self._idle.popleft() if self._idle else None
+            if entry is not None and self._healthy(*entry):
+                conn = entry[0]
+            else:
+                if entry is not None:
+                    self._discard(entry[0])
+                conn = self._service_connect()
+
+            try:
+                yield conn
+            except BaseException:
+                # The connection may be mid-operation; don't hand it out again
+                self._discard(conn)
+                raise
+
+            with self._lock:
+                self._idle.append((conn, time.monotonic()))
+        finally:
+            self._slots.release()
+
+    def verify_password(self, user_dn: str, password: str) -> bool:
+        """Bind as a user on a short-lived connection to check the password"""
+        conn = self._connect(user_dn, password)
+        try:
+            return bool(conn.bound)
+        finally:
+            self._discard(conn)
+
+    def _discard(self, conn: Connection):
+        try:
+            conn.unbind()
+        except LDAPException:
+            pass
+
+    def _close_idle_locked(self):
+        while self._idle:
+            self._discard(self._idle.popleft()[0])
+
+    def reset(self):
+        """Close all idle connections and forget the server object"""
+        with self._lock:
+            self._close_idle_locked()
+            self._settings = None
+            self._server = None
+            self._info_loaded = False
+
+
+ldap_pool = LDAPPool()
@@ -2,10 +2,14 @@
 # ABOUTME: Handles LDAP connection, user authentication, and user info retrieval
 
 from typing import Optional, Dict
-from ldap3 import Server, Connection, ALL, SUBTREE
+from ldap3 import SUBTREE
 from ldap3.core.exceptions import LDAPException
 from flask import current_app
 
+from app.services.ldap_dn_cache import dn_cache
+from app.services.ldap_executor import ldap_executor, LDAPUnavailable
+from app.services.ldap_pool import ldap_pool
+
 
 class LDAPService:
     """Service for LDAP/AD authentication"""
@@ -24,6 +28,51 @@ class LDAPService:
             'user_search_scope': current_app.config.get('LDAP_USER_SEARCH_SCOPE', 'SUBTREE'),
             'user_object_filter': current_app.config.get('LDAP_USER_OBJECT_FILTER', '(objectClass=person)'),
             'user_login_attr': current_app.config.get('LDAP_USER_LOGIN_ATTR', 'sAMAccountName'),
+            'pool_size': current_app.config.get('LDAP_POOL_SIZE', 4),
+            'pool_health_check_seconds': current_app.config.get('LDAP_POOL_HEALTH_CHECK_SECONDS', 30),
+            'strategy': current_app.config.get('LDAP_CLIENT_STRATEGY', 'SYNC'),
+            'connect_timeout': current_app.config.get('LDAP_CONNECT_TIMEOUT', 5),
+            'receive_timeout': current_app.config.get('LDAP_RECEIVE_TIMEOUT', 10),
+            'dn_cache_ttl': current_app.config.get('LDAP_DN_CACHE_TTL', 3600),
+        }
+
+    @staticmethod
+    def _pool():
+        """The process-wide connection pool, configured from app config"""
+        ldap_pool.configure(LDAPService._get_ldap_config())
+        return ldap_pool
+
+    @staticmethod
+    def _find_user(pool, config: dict, username: str) -> Optional[Dict]:
+        """Search the directory for username and return its DN and attributes"""
+        search_filter = f"(&{config['user_object_filter']}({config['user_login_attr']}={username}))"
+        search_base = config['user_dn'] or config['base_dn']
+
+        with pool.connection() as conn:
+            conn.search(
+                search_base=search_base,
+                search_filter=search_filter,
+                search_scope=SUBTREE,
+                attributes=['cn', 'mail', 'displayName', 'distinguishedName']
+            )
+            entries = list(conn.entries)
+
+        if not entries:
+            return None
+
+        user_entry = entries[0]
+        email = None
+        if hasattr(user_entry, 'mail'):
+            email_value = str(user_entry.mail)
+            # Handle empty arrays or empty strings from LDAP
+            if email_value and email_value not in ('[]', '', '[ ]'):
+                email = email_value
+
+        return {
+            'username': username,
+            'dn': user_entry.entry_dn,
+            'email': email,
+            'display_name': str(user_entry.displayName) if hasattr(user_entry, 'displayName') else str(user_entry.cn),
         }
 
     @staticmethod
@@ -31,91 +80,64 @@ class LDAPService:
         """
         Authenticate user against LDAP/AD server
 
+        The directory calls run on the LDAP executor's worker threads, so a
+        slow directory costs the caller at most LDAP_LOGIN_TIMEOUT seconds.
+
         Returns:
             Dictionary with user info if successful, None if failed
+
+        Raises:
+            LDAPUnavailable: the directory could not be asked (breaker open,
+            queue full, timeout or LDAP error)
         """
         if not username or not password:
             return None
 
-        config = LDAPService._get_ldap_config()
-
         try:
-            # Create LDAP server object
-            server = Server(
-                config['host'],
-                port=config['port'],
-                use_ssl=config['use_ssl'],
-                get_info=ALL
-            )
+            return ldap_executor.call(LDAPService._authenticate, username, password)
+        except LDAPUnavailable as e:
+            current_app.logger.error(f"LDAP unavailable during authentication of {username}: {e}")
+            raise
 
-            # First, bind with service account to search for user
-            if config['bind_user_dn'] and config['bind_password']:
-                conn = Connection(
-                    server,
-                    user=config['bind_user_dn'],
-                    password=config['bind_password'],
-                    auto_bind=True
-                )
-            else:
-                # Try anonymous bind
-                conn = Connection(server, auto_bind=True)
-
-            # Search for user
-            search_filter = f"(&{config['user_object_filter']}({config['user_login_attr']}={username}))"
-            search_base = config['user_dn'] or config['base_dn']
+    @staticmethod
+    def _authenticate(username: str, password: str) -> Optional[Dict]:
+        """
+        Check username and password against the directory
 
-            conn.search(
-                search_base=search_base,
-                search_filter=search_filter,
-                search_scope=SUBTREE,
-                attributes=['cn', 'mail', 'displayName', 'distinguishedName']
-            )
+        Binds straight to the DN cached from an earlier login when there is
+        one, and searches the directory only on a cache miss or when that
+        bind fails. LDAP errors propagate so the breaker can count them.
+        """
+        config = LDAPService._get_ldap_config()
 
-            if not conn.entries:
+        try:
+            pool = LDAPService._pool()
+            dn_cache.configure(config['dn_cache_ttl'])
+
+            cached = dn_cache.get(username)
+            if cached and pool.verify_password(cached['dn'], password):
+                current_app.logger.info(f"LDAP authentication successful for: {username}")
+                return cached
+
+            # Cache miss, or the cached DN may have moved: search with the service account
+            user_info = LDAPService._find_user(pool, config, username)
+            if not user_info:
+                if cached:
+                    dn_cache.invalidate(username)
                 current_app.logger.warning(f"LDAP user not found: {username}")
                 return None
 
-            user_entry = conn.entries[0]
-            user_dn = user_entry.entry_dn
-
-            # Close the service account connection
-            conn.unbind()
-
-            # Now try to bind as the user to verify password
-            user_conn = Connection(
-                server,
-                user=user_dn,
-                password=password,
-                auto_bind=True
-            )
-
-            if not user_conn.bound:
+            # The same DN already refused this password; don't bind again
+            if (cached and user_info['dn'] == cached['dn']) or not pool.verify_password(user_info['dn'], password):
                 current_app.logger.warning(f"LDAP authentication failed for: {username}")
                 return None
 
-            # Authentication successful, extract user info
-            email = None
-            if hasattr(user_entry, 'mail'):
-                email_value = str(user_entry.mail)
-                # Handle empty arrays or empty strings from LDAP
-                if email_value and email_value not in ('[]', '', '[ ]'):
-                    email = email_value
-
-            user_info = {
-                'username': username,
-                'dn': user_dn,
-                'email': email,
-                'display_name': str(user_entry.displayName) if hasattr(user_entry, 'displayName') else str(user_entry.cn),
-            }
-
-            user_conn.unbind()
-
+            dn_cache.put(username, user_info)
             current_app.logger.info(f"LDAP authentication successful for: {username}")
             return user_info
 
-        except LDAPException as e:
-            current_app.logger.error(f"LDAP error during authentication: {e}")
-            return None
+        except LDAPException:
+            raise
         except Exception as e:
             current_app.logger.error(f"Unexpected error during LDAP authentication: {e}")
             return None
@@ -123,29 +145,9 @@ class LDAPService:
     @staticmethod
     def test_connection() -> bool:
         """Test LDAP connection with current configuration"""
-        config = LDAPService._get_ldap_config()
-
         try:
-            server = Server(
-                config['host'],
-                port=config['port'],
-                use_ssl=config['use_ssl'],
-                get_info=ALL
-            )
-
-            if config['bind_user_dn'] and config['bind_password']:
-                conn = Connection(
-                    server,
-                    user=config['bind_user_dn'],
-                    password=config['bind_password'],
-                    auto_bind=True
-                )
-            else:
-                conn = Connection(server, auto_bind=True)
-
-            result = conn.bound
-            conn.unbind()
-            return result
+            with LDAPService._pool().connection() as conn:
+                return conn.bound
 
         except Exception as e:
             current_app.logger.error(f"LDAP connection test failed: {e}")
@@ -0,0 +1,219 @@
+# ABOUTME: Synchronises the users table with the LDAP/AD directory using paged searches
+# ABOUTME: Diffs users by attribute hash and applies changes in bulk; runnable from manage.py or a thread
+
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Optional, Set
+
+from flask import current_app
+from sqlalchemy import insert, select, update
+from ldap3 import SUBTREE
+from ldap3.core.exceptions import LDAPException
+
+from app import db
+from app.metrics import metrics
+from app.models.user import User
+from app.services.invalidation import note_changes
+from app.services.ldap_service import LDAPService
+
+
+def _first(value):
+    """Single value of an LDAP attribute that may come back as a list"""
+    if isinstance(value, (list, tuple)):
+        return str(value[0]) if value else None
+    return str(value) if value not in (None, '') else None
+
+
+def attribute_hash(dn: str, email: Optional[str], display_name: Optional[str],
+                   is_admin: Optional[bool]) -> str:
+    """Hash of the directory-managed attributes of a user"""
+    payload = json.dumps([dn.lower(), email, display_name, is_admin])
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class LDAPSyncService:
+    """Service for synchronising users with the directory"""
+
+    @staticmethod
+    def fetch_users(page_size: int = 500) -> Dict[str, dict]:
+        """Page through every directory user, keyed by lower-cased login name"""
+        config = LDAPService._get_ldap_config()
+        login_attr = config['user_login_attr']
+        users = {}
+
+        with LDAPService._pool().connection() as conn:
+            for entry in conn.extend.standard.paged_search(
+                search_base=config['user_dn'] or config['base_dn'],
+                search_filter=f"(&{config['user_object_filter']}({login_attr}=*))",
+                search_scope=SUBTREE,
+                attributes=[login_attr, 'cn', 'mail', 'displayName'],
+                paged_size=page_size,
+                generator=True,
+            ):
+                if entry.get('type') != 'searchResEntry':
+                    continue  # referrals
+                attributes = entry['attributes']
+                username = _first(attributes.get(login_attr))
+                if not username:
+                    continue
+                users[username.lower()] = {
+                    'username': username,
+                    'dn': entry['dn'],
+                    'email': _first(attributes.get('mail')),
+                    'display_name': _first(attributes.get('displayName')) or _first(attributes.get('cn')),
+                }
+
+        return users
+
+    @staticmethod
+    def fetch_admin_dns(page_size: int = 500) -> Optional[Set[str]]:
+        """
+        Lower-cased member DNs of the admin group under LDAP_GROUP_DN
+
+        Returns None when LDAP_ADMIN_GROUP is not configured, in which case
+        admin flags are managed locally only.
+        """
+        group = current_app.config.get('LDAP_ADMIN_GROUP')
+        if not group:
+            return None
+
+        config = LDAPService._get_ldap_config()
+        members = set()
+        with LDAPService._pool().connection() as conn:
+            for entry in conn.extend.standard.paged_search(
+                search_base=current_app.config.get('LDAP_GROUP_DN') or config['base_dn'],
+                search_filter=f"(&{current_app.config.get('LDAP_GROUP_OBJECT_FILTER', '(objectClass=group)')}(cn={group}))",
+                search_scope=SUBTREE,
+                attributes=['member'],
+                paged_size=page_size,
+                generator=True,
+            ):
+                if entry.get('type') == 'searchResEntry':
+                    members.update(dn.lower() for dn in entry['attributes'].get('member', []))
+        return members
+
+    @staticmethod
+    def sync(page_size: int = 500, dry_run: bool = False) -> Dict[str, int]:
+        """
+        Bring the users table in line with the directory
+
+        Existing users whose attribute hash changed are updated, users no
+        longer in the directory are deactivated, and admin group members
+        without a row are created. Sync never reactivates a user. The
+        database sees one SELECT, one bulk UPDATE, one bulk deactivation and
+        one bulk INSERT however large the directory is.
+        Returns counts of each change.
+        """
+        started = time.monotonic()
+        directory = LDAPSyncService.fetch_users(page_size)
+        if not directory:
+            # An empty result is far more likely a bad filter or base DN than an empty directory
+            raise LDAPException('LDAP sync found no users; refusing to deactivate every account')
+        admin_dns = LDAPSyncService.fetch_admin_dns(page_size)
+
+        now = datetime.utcnow()
+        updates, deactivations, inserts = [], [], []
+        seen = set()
+
+        rows = db.session.execute(select(User.id, User.username, User.ldap_hash, User.is_active)).all()
+        for row in rows:
+            key = row.username.lower()
+            entry = directory.get(key)
+            if entry is None:
+                if row.is_active:
+                    deactivations.append({'id': row.id, 'is_active': False, 'ldap_hash': None})
+                continue
+            seen.add(key)
+
+            values = LDAPSyncService._values(entry, admin_dns)
+            if values['ldap_hash'] != row.ldap_hash:
+                updates.append(dict(values, id=row.id, dn_resolved_at=now))
+
+        if admin_dns:
+            for key, entry in directory.items():
+                if key not in seen and entry['dn'].lower() in admin_dns:
+                    inserts.append(dict(LDAPSyncService._values(entry, admin_dns),
+                                        username=entry['username'], dn_resolved_at=now,
+                                        is_active=True, created_at=now))
+
+        if not dry_run:
+            if updates:
+                db.session.execute(update(User), updates)
+            if deactivations:
+                db.session.execute(update(User), deactivations)
+            if inserts:
+                db.session.execute(insert(User), inserts)
+            # Bulk statements skip flush tracking; evict cached principals explicitly
+            note_changes(db.session, {('user', row['id'], 'upsert') for row in updates + deactivations})
+            db.session.commit()
+
+        counts = {'updated': len(updates), 'deactivated': len(deactivations), 'created': len(inserts)}
+        if not dry_run:
+            for change, count in counts.items():
+                metrics.inc('mtxman_ldap_sync_changes_total', count, change=change)
+            metrics.observe('mtxman_ldap_sync_seconds', time.monotonic() - started)
+        return counts
+
+    @staticmethod
+    def _values(entry: dict, admin_dns: Optional[Set[str]]) -> dict:
+        is_admin = entry['dn'].lower() in admin_dns if admin_dns is not None else None
+        values = {
+            'dn': entry['dn'],
+            'email': entry['email'],
+            'display_name': entry['display_name'],
+            'ldap_hash': attribute_hash(entry['dn'], entry['email'], entry['display_name'], is_admin),
+        }
+        if is_admin is not None:
+            values['is_admin'] = is_admin
+        return values
+
+
+class LDAPSyncScheduler:
+    """
+    Runs LDAPSyncService.sync every LDAP_SYNC_INTERVAL_SECONDS in a thread
+
+    Disabled when the interval is 0. Every worker process that serves a
+    request starts its own thread; as sync is idempotent this is safe, but
+    with many workers prefer running manage.py ldap-sync from cron instead.
+    """
+
+    def __init__(self):
+        self._started_pid = None
+        self._app = None
+        self.interval = 0
+        self.page_size = 500
+
+    def init_app(self, app):
+        """Load settings and start the job with the first request if enabled"""
+        self._app = app
+        self.interval = app.config.get('LDAP_SYNC_INTERVAL_SECONDS', 0)
+        self.page_size = app.config.get('LDAP_SYNC_PAGE_SIZE', 500)
+        if self.interval > 0:
+            app.before_request(self.ensure_started)
+        app.extensions['ldap_sync_scheduler'] = self
+
+    def run(self):
+        while True:
+            time.sleep(self.interval)
+            with self._app.app_context():
+                try:
+                    counts = LDAPSyncService.sync(self.page_size)
+                    self._app.logger.info(f'LDAP sync complete: {counts}')
+                except Exception as e:
+                    db.session.rollback()
+                    metrics.inc('mtxman_ldap_sync_errors_total')
+                    self._app.logger.error(f'LDAP sync failed: {e}')
+
+    def ensure_started(self):
+        """Start the sync thread once per process"""
+        if self._started_pid == os.getpid():
+            return
+        self._started_pid = os.getpid()
+        threading.Thread(target=self.run, name='ldap-sync', daemon=True).start()
+
+
+ldap_sync_scheduler = LDAPSyncScheduler()
@@ -0,0 +1,100 @@
+# ABOUTME: TTL cache of slim logged-in user principals for the Flask-Login user loader
+# ABOUTME: Evicted through the invalidation bus when a user row changes in any process
+
+import threading
+import time
+from typing import Dict, Optional
+
+from app.database import primary
+from app.models.user import User
+
+
+class UserPrincipal:
+    """
+    The fields of a User needed to authorise a request
+
+    Stands in for User as Flask-Login's current_user; pages that show more
+    of the user (e.g. the profile) load the full row themselves.
+    """
+
+    __slots__ = ('id', 'username', 'display_name', 'is_active', 'is_admin')
+
+    is_authenticated = True
+    is_anonymous = False
+
+    def __init__(self, id, username, display_name, is_active, is_admin):
+        self.id = id
+        self.username = username
+        self.display_name = display_name
+        self.is_active = is_active
+        self.is_admin = is_admin
+
+    def get_id(self) -> str:
+        return str(self.id)
+
+    def __eq__(self, other):
+        return isinstance(other, (UserPrincipal, User)) and self.id == other.id
+
+    def __hash__(self):
+        return hash(self.id)
+
+
+class PrincipalCache:
+    """
+    Maps user id to a UserPrincipal for PRINCIPAL_CACHE_SECONDS
+
+    Entries are dropped when the invalidation bus reports a change to the
+    user (UserService edits, LDAP sync), so admin and active flags take
+    effect on the next request; the TTL bounds staleness if a message is lost.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: Dict[int, tuple] = {}  # user id -> (expires monotonic time, principal)
+        self.ttl = 60
+
+    def init_app(self, app):
+        """Load settings and subscribe to user invalidations"""
+        from app.services.invalidation import invalidation_bus
+
+        self.ttl = app.config.get('PRINCIPAL_CACHE_SECONDS', 60)
+        invalidation_bus.tracked[User] = 'user'
+        invalidation_bus.subscribe(self.invalidate)
+        invalidation_bus.on_full_refresh(self.clear)
+        app.extensions['principal_cache'] = self
+
+    def get(self, user_id: int) -> Optional[UserPrincipal]:
+        """Return the principal for user_id, loading it from the database on a miss"""
+        with self._lock:
+            entry = self._entries.get(user_id)
+        if entry is not None and entry[0] > time.monotonic():
+            return entry[1]
+
+        # Never from a lagging replica: it could cache a revoked admin flag
+        with primary():
+            row = User.query.with_entities(
+                User.id, User.username, User.display_name, User.is_active, User.is_admin
+            ).filter(User.id == user_id).first()
+        if row is None:
+            return None
+
+        principal = UserPrincipal(*row)
+        if self.ttl > 0:
+            with self._lock:
+                self._entries[user_id] = (time.monotonic() + self.ttl, principal)
+        return principal
+
+    def invalidate(self, changes):
+        """Drop principals of users named in invalidation messages"""
+        user_ids = {user_id for entity, user_id, op in changes if entity == 'user'}
+        if user_ids:
+            with self._lock:
+                for user_id in user_ids:
+                    self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+principal_cache = PrincipalCache()
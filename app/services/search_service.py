@@ -0,0 +1,108 @@
+# ABOUTME: Service for ranked, prefix-matching search over customers and API keys
+# ABOUTME: Uses the FTS5 indexes on SQLite and trigram indexes on PostgreSQL (see app.models.search_index)
+
+import re
+from typing import List, Optional
+
+from flask import current_app
+from sqlalchemy import Select, and_, column, desc, func, literal, literal_column, or_, select, table, text
+from app import db
+from app.models.api_key import ApiKey
+from app.models.customer import Customer
+from app.models.search_index import SEARCH_COLUMNS, fts_table, sqlite_create_statements, sqlite_rebuild_statement
+
+# Words beyond this are ignored, keeping pasted text from building huge queries
+MAX_TERMS = 8
+
+
+class SearchService:
+    """
+    Service for customer and API key search
+
+    Every word of the query must match, as a prefix of a word (SQLite) or a
+    substring (PostgreSQL) of any indexed column. Matches are ranked by column
+    weight (SEARCH_COLUMNS) inside the index query, which keeps only the page
+    asked for. SEARCH_RANK_CANDIDATES, when set, caps the cost of a short
+    prefix matching a large share of the table: only that many of the newest
+    matches are ranked, so an older, better match can be missed.
+    """
+
+    @staticmethod
+    def terms(query: Optional[str]) -> List[str]:
+        """The query's words, lowercased, split as the FTS5 tokenizer splits them"""
+        min_length = current_app.config.get('SEARCH_MIN_TERM_LENGTH', 2)
+        words = re.findall(r'[^\W_]+', (query or '').lower())
+        return [word for word in words if len(word) >= min_length][:MAX_TERMS]
+
+    @staticmethod
+    def select_matches(model, query: Optional[str], limit: int, offset: int = 0) -> Optional[Select]:
+        """Statement selecting one page of ranked matches of model, or None when the query has no usable words"""
+        terms = SearchService.terms(query)
+        if not terms:
+            return None
+        cap = current_app.config.get('SEARCH_RANK_CANDIDATES', 0)
+        columns = SEARCH_COLUMNS[model.__tablename__]
+        dialect = db.engine.dialect.name
+
+        if dialect == 'sqlite':
+            fts = table(fts_table(model.__tablename__), column('rowid'), column('rank'))
+            match = ' '.join(f'"{term}"*' for term in terms)
+            matches = (
+                select(fts.c.rowid.label('id'), fts.c.rank.label('rank'))
+                .where(literal_column(fts.name).op('MATCH')(match))
+            )
+            newest, best = (fts.c.rowid.desc(),), (fts.c.rank, fts.c.rowid.desc())  # bm25: lower is better
+        else:
+            filters = and_(*(
+                or_(*(getattr(model, name).ilike(f'%{term}%') for name in columns)) for term in terms
+            ))
+            if dialect == 'postgresql':
+                phrase = literal(' '.join(terms))
+                score = sum(
+                    func.word_similarity(phrase, func.coalesce(getattr(model, name), '')) * weight
+                    for name, weight in columns.items()
+                )
+            else:
+                score = literal(0)
+            matches = select(model.id.label('id'), (-score).label('rank')).where(filters)
+            newest, best = (model.id.desc(),), (-score, model.id.desc())
+
+        # Keep the best page of every match, or rank only the newest cap matches
+        matches = matches.order_by(*(newest if cap else best)).limit(max(cap, offset + limit)).subquery()
+        rank = matches.c.rank
+        return (
+            select(model)
+            .join(matches, matches.c.id == model.id)
+            .order_by(rank, desc(model.id))
+            .limit(limit)
+            .offset(offset)
+        )
+
+    @staticmethod
+    def search_customers(query: Optional[str], limit: int = 20, offset: int = 0) -> List[Customer]:
+        """Best matching customers first"""
+        statement = SearchService.select_matches(Customer, query, limit, offset)
+        return db.session.execute(statement).scalars().all() if statement is not None else []
+
+    @staticmethod
+    def search_keys(query: Optional[str], limit: int = 20, offset: int = 0) -> List[ApiKey]:
+        """Best matching API keys first"""
+        statement = SearchService.select_matches(ApiKey, query, limit, offset)
+        return db.session.execute(statement).scalars().all() if statement is not None else []
+
+    @staticmethod
+    def rebuild_index() -> List[str]:
+        """
+        Recreate any missing SQLite search tables and triggers and reindex every row
+
+        Needed after a batch migration recreates customers or api_keys, which
+        drops their triggers. PostgreSQL's trigram indexes need no rebuild.
+        Returns the reindexed tables.
+        """
+        if db.engine.dialect.name != 'sqlite':
+            return []
+        for name in SEARCH_COLUMNS:
+            for statement in sqlite_create_statements(name) + [sqlite_rebuild_statement(name)]:
+                db.session.execute(text(statement))
+        db.session.commit()
+        return list(SEARCH_COLUMNS)
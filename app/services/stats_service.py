@@ -0,0 +1,136 @@
+# ABOUTME: Service for the dashboard's summary statistics and per-customer key counts
+# ABOUTME: Maintains the stat_counters totals on every flush and lists customers with counts in one query
+
+from typing import Dict, List, Optional
+from sqlalchemy import and_, case, event, func, inspect, or_, select, update
+from sqlalchemy.orm import Session
+from app import db
+from app.models.api_key import ApiKey
+from app.models.customer import Customer
+from app.models.stat_counter import COUNTERS, StatCounter
+
+# Counted models: (total counter, active counter)
+COUNTED = {
+    Customer: ('customers', 'active_customers'),
+    ApiKey: ('api_keys', 'active_api_keys'),
+}
+
+
+class StatsService:
+    """Service for summary statistics"""
+
+    @staticmethod
+    def get_counters() -> Dict[str, int]:
+        """Current value of every counter"""
+        values = dict.fromkeys(COUNTERS, 0)
+        values.update(db.session.execute(select(StatCounter.name, StatCounter.value)).all())
+        return values
+
+    @staticmethod
+    def adjust(session, deltas: Dict[str, int]):
+        """Add deltas to counters in the session's transaction"""
+        connection = session.connection()
+        for name, delta in sorted(deltas.items()):
+            if delta:
+                connection.execute(
+                    update(StatCounter.__table__)
+                    .where(StatCounter.__table__.c.name == name)
+                    .values(value=StatCounter.__table__.c.value + delta)
+                )
+
+    @staticmethod
+    def rebuild() -> Dict[str, int]:
+        """Recount every counter from the counted tables, e.g. after rows were changed outside the app"""
+        values = {}
+        for model, (total, active) in COUNTED.items():
+            row = db.session.execute(select(
+                func.count(model.id), func.count(case((model.is_active.is_(True), model.id)))
+            )).one()
+            values[total], values[active] = row
+        db.session.execute(StatCounter.__table__.delete())
+        db.session.execute(StatCounter.__table__.insert(), [
+            {'name': name, 'value': value} for name, value in values.items()
+        ])
+        db.session.commit()
+        return values
+
+    @staticmethod
+    def customers_with_key_counts(limit: Optional[int] = None, after_id: Optional[int] = None) -> List:
+        """
+        Newest customers first, as (customer, total keys, active keys) rows
+
+        The counts come from one grouped join. With a limit, only that many
+        customers are read and only their keys are counted. With after_id, the
+        rows continue after that customer in this order (keyset paging, so a
+        deep page costs the same as the first).
+        """
+        newest_first = (Customer.created_at.desc(), Customer.id.desc())
+        customers = select(Customer.id).order_by(*newest_first)
+        if after_id is not None:
+            created_at = select(Customer.created_at).where(Customer.id == after_id).scalar_subquery()
+            customers = customers.where(or_(
+                Customer.created_at < created_at,
+                and_(Customer.created_at == created_at, Customer.id < after_id),
+            ))
+        if limit is not None:
+            customers = customers.limit(limit)
+        page = customers.subquery()
+        return db.session.execute(
+            select(
+                Customer,
+                func.count(ApiKey.id).label('total_keys'),
+                func.count(case((ApiKey.is_active.is_(True), ApiKey.id))).label('active_keys'),
+            )
+            .join(page, page.c.id == Customer.id)
+            .outerjoin(ApiKey, ApiKey.customer_id == Customer.id)
+            .group_by(Customer.id)
+            .order_by(*newest_first)
+        ).all()
+
+    @staticmethod
+    def with_key_counts(customers: List[Customer]) -> List:
+        """The given customers, in order, as (customer, total keys, active keys) rows from one grouped query"""
+        if not customers:
+            return []
+        counts = dict.fromkeys((c.id for c in customers), (0, 0))
+        counts.update(
+            (customer_id, (total, active)) for customer_id, total, active in db.session.execute(
+                select(
+                    ApiKey.customer_id,
+                    func.count(ApiKey.id),
+                    func.count(case((ApiKey.is_active.is_(True), ApiKey.id))),
+                )
+                .where(ApiKey.customer_id.in_(counts))
+                .group_by(ApiKey.customer_id)
+            )
+        )
+        return [(customer, *counts[customer.id]) for customer in customers]
+
+
+def _was_active(obj) -> bool:
+    history = inspect(obj).attrs.is_active.history
+    return bool(history.deleted[0] if history.deleted else obj.is_active)
+
+
+def _count_changes(session, flush_context):
+    deltas = dict.fromkeys(COUNTERS, 0)
+    for obj in session.new:
+        if type(obj) in COUNTED:
+            total, active = COUNTED[type(obj)]
+            deltas[total] += 1
+            deltas[active] += bool(obj.is_active)
+    for obj in session.deleted:
+        if type(obj) in COUNTED:
+            total, active = COUNTED[type(obj)]
+            deltas[total] -= 1
+            deltas[active] -= _was_active(obj)
+    for obj in session.dirty:
+        if type(obj) in COUNTED and obj not in session.deleted:
+            deltas[COUNTED[type(obj)][1]] += bool(obj.is_active) - _was_active(obj)
+    StatsService.adjust(session, deltas)
+
+
+def init_stats_counters():
+    """Keep the stat_counters totals current as customers and API keys are flushed"""
+    if not event.contains(Session, 'after_flush', _count_changes):
+        event.listen(Session, 'after_flush', _count_changes)
@@ -0,0 +1,84 @@
+# ABOUTME: MediaMTX stream authorization rules shared by the control plane and edge sidecar
+# ABOUTME: Extracts API keys from auth payloads and decides access for a resolved key
+
+import hmac
+import hashlib
+from typing import Optional, Tuple
+from flask import current_app
+from app.metrics import metrics
+from app.services.api_key_service import ApiKeyService
+
+
+def verify_signature(secret: str, payload: bytes, signature: str) -> bool:
+    """Verify an HMAC-SHA256 signature of a webhook payload"""
+    expected_signature = hmac.new(
+        secret.encode(),
+        payload,
+        hashlib.sha256
+    ).hexdigest()
+    return hmac.compare_digest(signature, expected_signature)
+
+
+def extract_api_key(data: dict) -> Optional[str]:
+    """Find the API key in a MediaMTX auth payload (query, username or password)"""
+    query = data.get('query') or ''
+    user = data.get('user')
+    password = data.get('password')
+
+    # 1. Check query string
+    if 'api_key=' in query:
+        return query.split('api_key=')[1].split('&')[0]
+
+    # 2. Check username (API key as username)
+    if user and user.startswith('mtx_'):
+        return user
+
+    # 3. Check password (API key as password)
+    if password and password.startswith('mtx_'):
+        return password
+
+    return None
+
+
+def decide(api_key, action: str) -> Tuple[dict, int]:
+    """
+    Decide access for a resolved key (ApiKey or a snapshot/replica copy)
+
+    Returns tuple of (response body, HTTP status). Does not log.
+    """
+    if not api_key:
+        return {'error': 'Invalid API key'}, 401
+
+    if not api_key.customer.is_active:
+        return {'error': 'Customer account is inactive'}, 401
+
+    if not ApiKeyService.check_permission(api_key, action):
+        return {'error': f'No permission to {action}'}, 403
+
+    return {
+        'authenticated': True,
+        'customer_id': api_key.customer.id,
+        'customer_name': api_key.customer.name,
+    }, 200
+
+
+def authorize(api_key, action: str, path: str, ip: str) -> Tuple[dict, int]:
+    """Decide access for a resolved key and log the outcome"""
+    body, status = decide(api_key, action)
+
+    if not api_key:
+        metrics.inc('mtxman_auth_rejections_total', reason='unknown_key')
+        current_app.logger.warning(f'Invalid API key for {action} request from {ip}')
+    elif status == 401:
+        current_app.logger.warning(f'Inactive customer {api_key.customer.email} attempted {action} from {ip}')
+    elif status == 403:
+        current_app.logger.warning(
+            f'API key {api_key.key_prefix}... lacks {action} permission (customer: {api_key.customer.email})'
+        )
+    else:
+        current_app.logger.info(
+            f'Authenticated {action} for customer {api_key.customer.email} '
+            f'(key: {api_key.key_prefix}..., path: {path}, ip: {ip})'
+        )
+
+    return body, status
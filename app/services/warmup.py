@@ -0,0 +1,150 @@
+# ABOUTME: Start-up warm-up that fills caches before a process serves traffic
+# ABOUTME: Run from wsgi.py, so under gunicorn preload it happens once in the master before fork
+
+import math
+import threading
+import time
+
+from sqlalchemy import select
+
+from app import db
+from app.metrics import metrics
+
+# Keys loaded per snapshot query during warm-up
+WARMUP_BATCH_SIZE = 1000
+
+
+class Warmup:
+    """
+    Warms the auth path and reports readiness
+
+    Loads API keys into the key snapshot hottest first (by last_used_at)
+    until WARMUP_KEY_BUDGET keys or WARMUP_SECONDS_BUDGET seconds are spent,
+    which also pulls those rows into the database's cache. It then runs each
+    auth query once so mappers are configured and SQL is compiled and cached,
+    and compiles the admin templates. Database connections are closed
+    afterwards so none are inherited by forked workers.
+
+    The process is ready once WARMUP_READY_FRACTION of the planned keys were
+    loaded. Until then, and after a failed run, it reports itself unready and
+    the next readiness check retries warm-up in the background.
+    """
+
+    PENDING, RUNNING, DONE, FAILED = 'pending', 'running', 'done', 'failed'
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread = None
+        self.state = self.PENDING
+        self.required = True
+        self.stats = {}
+        self.error = None
+        self.progress = {'target': 0, 'warmed': 0}
+
+        self.key_budget = 50000
+        self.seconds_budget = 30.0
+        self.ready_fraction = 0.9
+
+    def init_app(self, app):
+        """Load settings and register readiness and progress metrics"""
+        self.required = app.config.get('WARMUP_ON_START', True)
+        self.key_budget = app.config.get('WARMUP_KEY_BUDGET', 50000)
+        self.seconds_budget = app.config.get('WARMUP_SECONDS_BUDGET', 30.0)
+        self.ready_fraction = app.config.get('WARMUP_READY_FRACTION', 0.9)
+
+        metrics.gauge_callback(
+            'mtxman_ready', lambda: 1 if self.is_ready() else 0,
+            'Whether start-up warm-up has completed in this process'
+        )
+        metrics.gauge_callback(
+            'mtxman_warmup_keys_target', lambda: self.progress['target'],
+            'API keys start-up warm-up plans to load, hottest first'
+        )
+        metrics.gauge_callback(
+            'mtxman_warmup_keys_warmed', lambda: self.progress['warmed'],
+            'API keys loaded so far by start-up warm-up'
+        )
+        app.extensions['warmup'] = self
+
+    def is_ready(self) -> bool:
+        return not self.required or self.state == self.DONE
+
+    def run(self, app) -> bool:
+        """Warm caches for app; returns whether the process became ready"""
+        if not self._lock.acquire(blocking=False):
+            return False  # already running in another thread
+        try:
+            self.state = self.RUNNING
+            started = time.monotonic()
+            with app.app_context():
+                try:
+                    self.stats = self._warm(app, started + self.seconds_budget)
+                except Exception as e:
+                    db.session.rollback()
+                    self.state, self.error = self.FAILED, str(e)
+                    app.logger.error(f'Start-up warm-up failed: {e}')
+                    return False
+                finally:
+                    # Forked workers must open their own connections
+                    db.session.remove()
+                    for engine in db.engines.values():
+                        engine.dispose()
+
+            self.stats['seconds'] = round(time.monotonic() - started, 3)
+            metrics.set('mtxman_warmup_seconds', self.stats['seconds'])
+
+            needed = math.ceil(self.progress['target'] * self.ready_fraction)
+            if self.progress['warmed'] < needed:
+                self.state = self.FAILED
+                self.error = (f"warmed {self.progress['warmed']} of {self.progress['target']} keys "
+                              f"within {self.seconds_budget}s; {needed} needed")
+                app.logger.warning(f'Start-up warm-up incomplete: {self.error}')
+                return False
+
+            self.state, self.error = self.DONE, None
+            app.logger.info(f'Start-up warm-up complete: {self.stats}')
+            return True
+        finally:
+            self._lock.release()
+
+    def retry(self, app) -> threading.Thread:
+        """Run warm-up again in a background thread unless one is running"""
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self.run, args=(app,), name='warmup', daemon=True)
+            self._thread.start()
+        return self._thread
+
+    def _warm(self, app, deadline: float) -> dict:
+        from app.models.api_key import MAX_KEY_ID, ApiKey
+        from app.services.api_key_service import ApiKeyService
+        from app.services.key_snapshot import key_snapshot
+
+        query = select(ApiKey.id).where(ApiKey.is_active.is_(True)).order_by(
+            ApiKey.last_used_at.desc().nulls_last(), ApiKey.id.desc()
+        )
+        if self.key_budget:
+            query = query.limit(self.key_budget)
+        key_ids = db.session.execute(query).scalars().all()
+
+        self.progress = {'target': len(key_ids), 'warmed': 0}
+        for start in range(0, len(key_ids), WARMUP_BATCH_SIZE):
+            if time.monotonic() >= deadline:
+                break
+            self.progress['warmed'] += key_snapshot.preload(key_ids[start:start + WARMUP_BATCH_SIZE])
+
+        # A well-formed id with a random secret: exercises the id (not the legacy key_hash) single and
+        # batch lookups; even if the row exists, the secret never matches, so no row is touched
+        probe = ApiKey.format_key(MAX_KEY_ID, ApiKey.generate_secret())
+        ApiKeyService.verify_api_key(probe)
+        ApiKeyService.verify_api_keys([probe])
+
+        templates = 0
+        if app.config.get('APP_PROFILE') == 'full':
+            for name in app.jinja_env.list_templates(filter_func=lambda name: name.endswith('.html')):
+                app.jinja_env.get_template(name)
+                templates += 1
+
+        return {'keys': self.progress['warmed'], 'target': self.progress['target'], 'templates': templates}
+
+
+warmup = Warmup()
@@ -0,0 +1,95 @@
+# ABOUTME: Single writer thread per process for auth-path writes in SQLite production mode
+# ABOUTME: Coalesces last_used_at updates so auth requests never wait on the SQLite write lock
+
+import os
+import threading
+import time
+from typing import Iterable
+
+from app import db
+from app.metrics import metrics
+
+
+class WriteQueue:
+    """
+    Serialises this process's last_used_at updates onto one writer thread
+
+    SQLite allows one writer at a time, so a commit per auth request makes
+    workers queue on the database lock and, past busy_timeout, fail with
+    "database is locked". With the queue, requests only add key ids to a
+    set; the writer applies everything queued since its last write in one
+    UPDATE and commit. Only enabled in SQLite production mode; up to one
+    batch of usage timestamps is lost if the process exits.
+    """
+
+    def __init__(self):
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._started_pid = None
+        self._app = None
+        self.enabled = False
+
+    def init_app(self, app):
+        """Enable the queue when the app runs SQLite production mode"""
+        from app.database import sqlite_mode_enabled
+
+        self._app = app
+        self.enabled = sqlite_mode_enabled(app)
+        metrics.gauge_callback(
+            'mtxman_write_queue_depth', lambda: len(self._pending),
+            'API keys with a last_used_at update waiting for the writer'
+        )
+        app.extensions['write_queue'] = self
+
+    def touch(self, key_ids: Iterable[int]):
+        """Queue a last_used_at update for the given keys"""
+        with self._lock:
+            self._pending.update(key_ids)
+        self.ensure_started()
+        self._wake.set()
+
+    def flush(self) -> int:
+        """Write every queued update now; returns the number of keys written"""
+        from app.services.api_key_service import ApiKeyService
+
+        with self._lock:
+            key_ids, self._pending = self._pending, set()
+        if not key_ids:
+            return 0
+
+        try:
+            ApiKeyService.write_usage(key_ids)
+        except Exception:
+            db.session.rollback()
+            with self._lock:
+                self._pending.update(key_ids)  # retried with the next batch
+            raise
+        metrics.inc('mtxman_write_queue_batches_total')
+        return len(key_ids)
+
+    def run(self):
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            with self._app.app_context():
+                try:
+                    self.flush()
+                except Exception as e:
+                    metrics.inc('mtxman_write_queue_errors_total')
+                    self._app.logger.error(f'Queued last_used_at update failed: {e}')
+                    self._wake.set()
+                    time.sleep(1)
+
+    def ensure_started(self):
+        """Start the writer thread once per process"""
+        if self._started_pid == os.getpid():
+            return
+        with self._lock:
+            if self._started_pid == os.getpid():
+                return
+            self._started_pid = os.getpid()
+        threading.Thread(target=self.run, name='write-queue', daemon=True).start()
+
+
+write_queue = WriteQueue()
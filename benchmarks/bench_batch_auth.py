@@ -0,0 +1,77 @@
+# ABOUTME: Benchmark of per-key MediaMTX auth calls versus the batch verification endpoint
+# ABOUTME: Seeds a temporary SQLite database and reports keys verified per second
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import config_by_name, TestingConfig
+from app import create_app, db
+from app.models.api_key import ApiKey, PERMISSION_BITS
+from app.models.customer import Customer
+
+
+def seed(num_keys):
+    customer = Customer(name='Bench', email='bench@example.com')
+    db.session.add(customer)
+    db.session.flush()
+
+    plaintexts = []
+    rows = []
+    for i in range(num_keys):
+        key = ApiKey.generate_key()
+        plaintexts.append(key)
+        rows.append({
+            'customer_id': customer.id, 'name': f'Key {i}', 'key_hash': ApiKey.hash_key(key),
+            'key_prefix': key[:8], 'is_active': True, 'permissions': PERMISSION_BITS['read'],
+        })
+    db.session.execute(ApiKey.__table__.insert(), rows)
+    db.session.commit()
+    return plaintexts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--keys', type=int, default=20000, help='keys in the database')
+    parser.add_argument('--items', type=int, default=5000, help='keys to verify')
+    parser.add_argument('--batch-size', type=int, default=1000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        class BenchConfig(TestingConfig):
+            SQLALCHEMY_DATABASE_URI = f'sqlite:///{tmp}/bench.db'
+            DEBUG = False
+
+        config_by_name['bench'] = BenchConfig
+        app = create_app('bench')
+        app.logger.disabled = True
+
+        with app.app_context():
+            db.create_all()
+            keys = seed(args.keys)[:args.items]
+            client = app.test_client()
+
+            started = time.perf_counter()
+            for key in keys:
+                client.post('/api/mediamtx/auth', json={'action': 'read', 'query': f'api_key={key}'})
+            single = time.perf_counter() - started
+
+            started = time.perf_counter()
+            for start in range(0, len(keys), args.batch_size):
+                client.post('/api/mediamtx/auth/batch', json={'items': [
+                    {'key': key, 'action': 'read'} for key in keys[start:start + args.batch_size]
+                ]})
+            batch = time.perf_counter() - started
+
+    print(f'{args.items} keys verified against {args.keys} stored keys (SQLite file)')
+    print(f'  /api/mediamtx/auth        {args.items / single:10.0f} keys/s')
+    print(f'  /api/mediamtx/auth/batch  {args.items / batch:10.0f} keys/s (batch size {args.batch_size})')
+    print(f'  speedup                   {single / batch:10.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+# ABOUTME: Benchmark of api_keys.key_hash stored as 64-char hex text versus a 32-byte digest
+# ABOUTME: Reports unique index size and point lookup latency on SQLite and optionally PostgreSQL
+
+import argparse
+import hashlib
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+LAYOUTS = {
+    'hex': ('VARCHAR(64)', lambda digest: digest.hex()),
+    'binary': ('BLOB', lambda digest: digest),
+}
+PG_TYPES = {'hex': 'VARCHAR(64)', 'binary': 'BYTEA'}
+
+
+def digests(count):
+    for i in range(count):
+        yield hashlib.sha256(f'mtx_bench_{i}'.encode()).digest()
+
+
+def bench_sqlite(directory, layout, num_keys, lookups):
+    column_type, encode = LAYOUTS[layout]
+    conn = sqlite3.connect(os.path.join(directory, f'{layout}.db'))
+    conn.execute(f'CREATE TABLE api_keys (id INTEGER PRIMARY KEY, key_hash {column_type} NOT NULL)')
+    conn.execute('CREATE UNIQUE INDEX ix_key_hash ON api_keys (key_hash)')
+    conn.executemany(
+        'INSERT INTO api_keys (key_hash) VALUES (?)', ((encode(d),) for d in digests(num_keys))
+    )
+    conn.commit()
+
+    page_size = conn.execute('PRAGMA page_size').fetchone()[0]
+    try:
+        pages = conn.execute("SELECT COUNT(*) FROM dbstat WHERE name = 'ix_key_hash'").fetchone()[0]
+    except sqlite3.OperationalError:
+        pages = None  # SQLite built without SQLITE_ENABLE_DBSTAT_VTAB
+
+    probes = [encode(d) for d in _sample(num_keys, lookups)]
+    started = time.perf_counter()
+    for probe in probes:
+        conn.execute('SELECT id FROM api_keys WHERE key_hash = ?', (probe,)).fetchone()
+    elapsed = time.perf_counter() - started
+    conn.close()
+
+    return pages * page_size if pages is not None else None, elapsed / len(probes)
+
+
+def bench_postgres(dsn, layout, num_keys, lookups):
+    import psycopg2
+    from psycopg2.extras import execute_values
+
+    encode = LAYOUTS[layout][1]
+    table = f'bench_api_keys_{layout}'
+    conn = psycopg2.connect(dsn)
+    with conn.cursor() as cur:
+        cur.execute(f'DROP TABLE IF EXISTS {table}')
+        cur.execute(f'CREATE TABLE {table} (id SERIAL PRIMARY KEY, key_hash {PG_TYPES[layout]} NOT NULL)')
+        batch = []
+        for digest in digests(num_keys):
+            batch.append((encode(digest),))
+            if len(batch) == 10000:
+                execute_values(cur, f'INSERT INTO {table} (key_hash) VALUES %s', batch)
+                batch = []
+        if batch:
+            execute_values(cur, f'INSERT INTO {table} (key_hash) VALUES %s', batch)
+        cur.execute(f'CREATE UNIQUE INDEX ix_{table} ON {table} (key_hash)')
+        cur.execute(f'ANALYZE {table}')
+        cur.execute('SELECT pg_relation_size(%s)', (f'ix_{table}',))
+        size = cur.fetchone()[0]
+        conn.commit()
+
+        probes = [encode(d) for d in _sample(num_keys, lookups)]
+        started = time.perf_counter()
+        for probe in probes:
+            cur.execute(f'SELECT id FROM {table} WHERE key_hash = %s', (probe,))
+            cur.fetchone()
+        elapsed = time.perf_counter() - started
+
+        cur.execute(f'DROP TABLE {table}')
+        conn.commit()
+    conn.close()
+    return size, elapsed / len(probes)
+
+
+def _sample(num_keys, lookups):
+    rng = random.Random(42)
+    indexes = {rng.randrange(num_keys) for _ in range(lookups)}
+    return [hashlib.sha256(f'mtx_bench_{i}'.encode()).digest() for i in indexes]
+
+
+def report(engine, results):
+    print(f'{engine}:')
+    for layout, (size, latency) in results.items():
+        size_text = f'{size / 1024 / 1024:.1f} MiB' if size is not None else 'n/a'
+        print(f'  {layout:<7} index {size_text:>10}   lookup {latency * 1e6:.1f} us')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--keys', type=int, default=1000000, help='rows in the table')
+    parser.add_argument('--lookups', type=int, default=20000, help='point lookups to time')
+    parser.add_argument('--pg-dsn', help='also run against this PostgreSQL database')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        report('SQLite', {
+            layout: bench_sqlite(tmp, layout, args.keys, args.lookups) for layout in LAYOUTS
+        })
+
+    if args.pg_dsn:
+        report('PostgreSQL', {
+            layout: bench_postgres(args.pg_dsn, layout, args.keys, args.lookups) for layout in LAYOUTS
+        })
+
+
+if __name__ == '__main__':
+    main()
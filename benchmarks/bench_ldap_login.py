@@ -0,0 +1,129 @@
+# ABOUTME: Benchmark of LDAP login latency with per-login connections versus the connection pool
+# ABOUTME: Runs against ldap3's MOCK_SYNC strategy with a simulated network round-trip time
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ldap3 import Server, Connection, ALL, SUBTREE, MOCK_SYNC
+from ldap3.core.connection import Connection as BaseConnection
+from ldap3.strategy.mockSync import MockSyncStrategy
+
+from config import config_by_name, TestingConfig
+from app import create_app, db
+from app.services.ldap_dn_cache import dn_cache
+from app.services.ldap_pool import ldap_pool
+from app.services.ldap_service import LDAPService
+
+BIND_DN = 'cn=service,dc=example,dc=com'
+USERS_DN = 'ou=users,dc=example,dc=com'
+
+
+def delayed(method, seconds):
+    def wrapper(*args, **kwargs):
+        time.sleep(seconds)
+        return method(*args, **kwargs)
+    return wrapper
+
+
+def simulate_latency(rtt, schema_seconds):
+    """
+    Make every mock socket open and LDAP operation cost one round trip
+
+    MOCK_SYNC has no real DSA, so reading server info and schema is free;
+    charge schema_seconds for it to stand in for the real directory.
+    """
+    for name in ('open', 'post_send_single_response', 'post_send_search'):
+        setattr(MockSyncStrategy, name, delayed(getattr(MockSyncStrategy, name), rtt))
+    BaseConnection.refresh_server_info = delayed(BaseConnection.refresh_server_info, schema_seconds)
+
+
+def seed(server, num_users):
+    conn = Connection(server, client_strategy=MOCK_SYNC)
+    conn.strategy.add_entry(BIND_DN, {'objectClass': 'person', 'cn': 'service', 'userPassword': 'service-pw'})
+    for i in range(num_users):
+        conn.strategy.add_entry(f'cn=user{i},{USERS_DN}', {
+            'objectClass': 'person', 'cn': f'user{i}', 'sAMAccountName': f'user{i}',
+            'userPassword': f'pw{i}', 'mail': f'user{i}@example.com', 'displayName': f'User {i}',
+        })
+
+
+def per_login_connections(dit, username, password):
+    """The previous login flow: new Server(get_info=ALL) and new connections every time"""
+    server = Server('mock-ad', get_info=ALL)
+    server.dit = dit  # MOCK_SYNC keeps entries on the Server object
+    # MOCK_SYNC ignores auto_bind, so open and bind explicitly as auto_bind=True would
+    conn = Connection(server, user=BIND_DN, password='service-pw', client_strategy=MOCK_SYNC)
+    conn.open(read_server_info=False)
+    conn.bind(read_server_info=True)
+    conn.search(USERS_DN, f'(&(objectClass=person)(sAMAccountName={username}))', SUBTREE,
+                attributes=['cn', 'mail', 'displayName', 'distinguishedName'])
+    user_dn = conn.entries[0].entry_dn
+    conn.unbind()
+    user_conn = Connection(server, user=user_dn, password=password, client_strategy=MOCK_SYNC)
+    user_conn.open(read_server_info=False)
+    assert user_conn.bind(read_server_info=True)
+    user_conn.unbind()
+    return True
+
+
+def timed(fn, logins, num_users):
+    samples = []
+    for i in range(logins):
+        n = i % num_users
+        started = time.perf_counter()
+        assert fn(f'user{n}', f'pw{n}'), 'login failed'
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def report(name, samples):
+    samples = sorted(samples)
+    p95 = samples[int(len(samples) * 0.95) - 1]
+    print(f'{name:<24} mean {statistics.mean(samples) * 1000:7.2f} ms   p95 {p95 * 1000:7.2f} ms')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--users', type=int, default=1000, help='entries in the mock directory')
+    parser.add_argument('--logins', type=int, default=200)
+    parser.add_argument('--rtt-ms', type=float, default=2.0, help='simulated round trip per LDAP operation')
+    parser.add_argument('--schema-ms', type=float, default=150.0,
+                        help='simulated cost of reading server info and schema')
+    args = parser.parse_args()
+
+    class BenchConfig(TestingConfig):
+        LDAP_HOST = 'mock-ad'
+        LDAP_USER_DN = USERS_DN
+        LDAP_BIND_USER_DN = BIND_DN
+        LDAP_BIND_USER_PASSWORD = 'service-pw'
+        LDAP_CLIENT_STRATEGY = MOCK_SYNC
+
+    config_by_name['bench'] = BenchConfig
+    app = create_app('bench')
+    app.logger.disabled = True
+
+    with app.app_context():
+        db.create_all()
+        LDAPService._pool()
+        seed(ldap_pool.server, args.users)
+        dit = ldap_pool.server.dit
+        simulate_latency(args.rtt_ms / 1000, args.schema_ms / 1000)
+
+        report('per-login connections', timed(lambda u, p: per_login_connections(dit, u, p), args.logins, args.users))
+        app.config['LDAP_DN_CACHE_TTL'] = 0
+        report('pooled connections', timed(LDAPService.authenticate, args.logins, args.users))
+
+        # Warm the DN cache, then time repeat logins
+        app.config['LDAP_DN_CACHE_TTL'] = 3600
+        timed(LDAPService.authenticate, min(args.logins, args.users), args.users)
+        report('pooled, cached DN', timed(LDAPService.authenticate, args.logins, args.users))
+        dn_cache.clear()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+# ABOUTME: Benchmark of customer search latency on the FTS5 index at a million customers
+# ABOUTME: Seeds a temporary SQLite database and reports p50/p95 per kind of query and rank candidate limit
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import config_by_name, TestingConfig
+from app import create_app, db
+from app.models.customer import Customer
+from app.services.search_service import SearchService
+
+SYLLABLES = ['ka', 'lo', 'mi', 'ne', 'ro', 'sa', 'ti', 'vu', 'ze', 'an', 'or', 'el', 'is', 'us', 'et', 'ar', 'in',
+             'on', 'al', 'em']
+SUFFIXES = ['Ltd', 'Inc', 'GmbH', 'Media', 'Broadcast']
+
+
+def word(rng, syllables):
+    return ''.join(rng.choice(SYLLABLES) for _ in range(syllables)).capitalize()
+
+
+def seed(rng, count):
+    """Customers named from 400 first and 3000 last names, in 20000 organizations"""
+    firsts = [word(rng, 2) for _ in range(400)]
+    lasts = [word(rng, 3) for _ in range(3000)]
+    orgs = [word(rng, rng.choice([2, 3, 4])) for _ in range(20000)]
+    names = []
+    for start in range(0, count, 10000):
+        rows = []
+        for i in range(start, min(start + 10000, count)):
+            first, last, org = rng.choice(firsts), rng.choice(lasts), rng.choice(orgs)
+            names.append((first, last, org))
+            rows.append({'name': f'{first} {last}', 'email': f'{first.lower()}.{last.lower()}{i}@{org.lower()}.test',
+                         'organization': f'{org} {rng.choice(SUFFIXES)}'})
+        db.session.execute(Customer.__table__.insert(), rows)
+    db.session.commit()
+    return names
+
+
+QUERIES = {
+    '2-char prefix': lambda first, last, org: first[:2],
+    '3-char prefix': lambda first, last, org: last[:3],
+    'whole word': lambda first, last, org: last,
+    'two words': lambda first, last, org: f'{first} {last[:4]}',
+    'organization': lambda first, last, org: org[:5],
+    'no match': lambda first, last, org: 'qqqzz',
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--customers', type=int, default=1_000_000)
+    parser.add_argument('--queries', type=int, default=200, help='queries per kind')
+    parser.add_argument('--candidates', type=int, nargs='+', default=[0, 1000],
+                        help='SEARCH_RANK_CANDIDATES values to compare (0 ranks every match)')
+    args = parser.parse_args()
+    rng = random.Random(1)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        class BenchConfig(TestingConfig):
+            SQLALCHEMY_DATABASE_URI = f'sqlite:///{tmp}/bench.db'
+            DEBUG = False
+
+        config_by_name['bench'] = BenchConfig
+        app = create_app('bench')
+        app.logger.disabled = True
+
+        with app.app_context():
+            db.create_all()
+            started = time.perf_counter()
+            names = seed(rng, args.customers)
+            print(f'Seeded and indexed {args.customers} customers in {time.perf_counter() - started:.1f} s')
+
+            print(f"{'Query':<16} {'candidates':>10} {'matches':>8} {'p50':>9} {'p95':>9}")
+            for kind, make in QUERIES.items():
+                queries = [make(*rng.choice(names)) for _ in range(args.queries)]
+                for candidates in args.candidates:
+                    app.config['SEARCH_RANK_CANDIDATES'] = candidates
+                    timings, found = [], 0
+                    for query in queries:
+                        started = time.perf_counter()
+                        found += len(SearchService.search_customers(query, limit=20))
+                        timings.append((time.perf_counter() - started) * 1000)
+                    timings.sort()
+                    print(f'{kind:<16} {candidates:>10} {found / len(queries):>8.1f} '
+                          f'{statistics.median(timings):>6.2f} ms {timings[int(len(timings) * 0.95)]:>6.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
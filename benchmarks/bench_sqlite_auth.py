@@ -0,0 +1,120 @@
+# ABOUTME: Benchmark of MediaMTX auth throughput on SQLite with several worker processes
+# ABOUTME: Compares the plain SQLite setup against SQLite production mode (WAL, read-only reads, write queue)
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# One worker process: once told to start, answer auth requests for random keys for BENCH_SECONDS
+CHILD = '''
+import json, os, random, sys, time
+from app import create_app
+keys = json.load(open(os.environ['BENCH_KEYS']))
+app = create_app('production')
+app.logger.disabled = True
+client = app.test_client()
+counts = {'ok': 0, 'degraded': 0, 'failed': 0}
+latencies = []
+print('ready', flush=True)
+sys.stdin.readline()
+deadline = time.time() + float(os.environ['BENCH_SECONDS'])
+while time.time() < deadline:
+    started = time.perf_counter()
+    response = client.post('/api/mediamtx/auth', json={
+        'action': 'read', 'query': 'api_key=' + random.choice(keys),
+    })
+    latencies.append(time.perf_counter() - started)
+    if response.status_code != 200:
+        counts['failed'] += 1
+    elif response.json.get('degraded'):
+        counts['degraded'] += 1
+    else:
+        counts['ok'] += 1
+print(json.dumps(dict(counts, latencies=latencies)))
+'''
+
+
+def seed(db_path, num_keys):
+    """Create the schema and num_keys read keys; return the plaintext keys"""
+    from config import config_by_name, TestingConfig
+    from app import create_app, db
+    from app.models.api_key import ApiKey, PERMISSION_BITS
+    from app.models.customer import Customer
+
+    class BenchConfig(TestingConfig):
+        SQLALCHEMY_DATABASE_URI = f'sqlite:///{db_path}'
+
+    config_by_name['bench'] = BenchConfig
+    app = create_app('bench')
+    with app.app_context():
+        db.create_all()
+        customer = Customer(name='Bench', email='bench@example.com')
+        db.session.add(customer)
+        db.session.flush()
+        plaintexts, rows = [], []
+        for i in range(num_keys):
+            secret = ApiKey.generate_secret()
+            key = ApiKey.format_key(i + 1, secret)
+            plaintexts.append(key)
+            rows.append({
+                'id': i + 1, 'customer_id': customer.id, 'name': f'Key {i}', 'key_hash': ApiKey.hash_key(key),
+                'key_prefix': key[:8], 'is_active': True, 'permissions': PERMISSION_BITS['read'],
+            })
+        db.session.execute(ApiKey.__table__.insert(), rows)
+        db.session.commit()
+        return plaintexts
+
+
+def run(workers, seconds, env):
+    """Start worker processes, release them together once all are ready; return summed counts"""
+    env = dict(env, BENCH_SECONDS=str(seconds))
+    children = [subprocess.Popen([sys.executable, '-c', CHILD], cwd=ROOT, env=env, text=True,
+                                 stdin=subprocess.PIPE, stdout=subprocess.PIPE) for _ in range(workers)]
+    for child in children:
+        child.stdout.readline()
+    for child in children:
+        child.stdin.write('go\n')
+        child.stdin.flush()
+    totals = {'ok': 0, 'degraded': 0, 'failed': 0, 'latencies': []}
+    for child in children:
+        out, _ = child.communicate()
+        for name, value in json.loads(out.strip().splitlines()[-1]).items():
+            totals[name] += value
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--keys', type=int, default=10000, help='keys in the database')
+    parser.add_argument('--workers', type=int, nargs='+', default=[4, 8, 16])
+    parser.add_argument('--seconds', type=float, default=10, help='measured time per run')
+    args = parser.parse_args()
+
+    print(f'{"mode":<12} {"workers":>7} {"auth/s":>9} {"p50 ms":>8} {"p99 ms":>8} {"degraded":>9} {"failed":>7}')
+    for mode in ('plain', 'production'):
+        for workers in args.workers:
+            with tempfile.TemporaryDirectory() as tmp:
+                db_path = os.path.join(tmp, 'bench.db')
+                keys_path = os.path.join(tmp, 'keys.json')
+                with open(keys_path, 'w') as fh:
+                    json.dump(seed(db_path, args.keys), fh)
+                env = dict(os.environ, DATABASE_URL=f'sqlite:///{db_path}', BENCH_KEYS=keys_path,
+                           SQLITE_PRODUCTION_MODE=str(mode == 'production'), WARMUP_ON_START='false',
+                           EXPIRY_SWEEPER_ENABLED='false',
+                           # Only database errors, not CPU-starved latency, should switch to degraded mode
+                           AUTH_DB_LATENCY_BUDGET_MS='60000')
+                totals = run(workers, args.seconds, env)
+            latencies = sorted(totals['latencies'])
+            p50, p99 = (latencies[int(len(latencies) * q)] * 1000 for q in (0.5, 0.99))
+            print(f'{mode:<12} {workers:>7} {len(latencies) / args.seconds:>9.0f} {p50:>8.1f} {p99:>8.1f} '
+                  f'{totals["degraded"]:>9} {totals["failed"]:>7}')
+
+
+if __name__ == '__main__':
+    main()
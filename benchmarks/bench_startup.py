@@ -0,0 +1,105 @@
+# ABOUTME: Benchmark of worker startup time for the full and auth-only app profiles
+# ABOUTME: Reports an -X importtime breakdown by package and the time to the first auth response
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Runs in a fresh interpreter: import, create the app, answer one auth request
+CHILD = '''
+import json, os, time
+started = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+app = create_app('production', os.environ['APP_PROFILE'])
+app.logger.disabled = True
+created = time.perf_counter()
+response = app.test_client().post('/api/mediamtx/auth', json={
+    'action': 'read', 'query': 'api_key=' + os.environ['BENCH_API_KEY'],
+})
+assert response.status_code == 200, response.get_data(as_text=True)
+answered = time.perf_counter()
+print(json.dumps({'import': imported - started, 'create_app': created - imported,
+                  'first_request': answered - created}))
+'''
+
+
+def seed(db_path):
+    """Create the schema and one read key; return the plaintext key"""
+    from config import config_by_name, TestingConfig
+    from app import create_app, db
+    from app.models.customer import Customer
+    from app.services.api_key_service import ApiKeyService
+
+    class BenchConfig(TestingConfig):
+        SQLALCHEMY_DATABASE_URI = f'sqlite:///{db_path}'
+
+    config_by_name['bench'] = BenchConfig
+    app = create_app('bench')
+    with app.app_context():
+        db.create_all()
+        customer = Customer(name='Bench', email='bench@example.com')
+        db.session.add(customer)
+        db.session.commit()
+        _, plaintext = ApiKeyService.create_api_key(customer_id=customer.id, name='Bench', actions=['read'])
+        return plaintext
+
+
+def run_child(env, importtime=False):
+    command = [sys.executable] + (['-X', 'importtime'] if importtime else []) + ['-c', CHILD]
+    result = subprocess.run(command, cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1]), result.stderr
+
+
+def import_breakdown(stderr):
+    """Self import time in milliseconds per top-level package"""
+    totals = defaultdict(float)
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, _, name = line[len('import time:'):].split('|')
+        totals[name.strip().split('.')[0]] += int(self_us) / 1000
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--runs', type=int, default=10, help='interpreter starts per profile')
+    parser.add_argument('--top', type=int, default=10, help='packages shown in the import breakdown')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'bench.db')
+        env = dict(os.environ, DATABASE_URL=f'sqlite:///{db_path}', BENCH_API_KEY=seed(db_path),
+                   AUTH_SNAPSHOT_REFRESH_SECONDS='0', EXPIRY_SWEEPER_ENABLED='false')
+
+        breakdowns = {}
+        for profile in ('full', 'auth'):
+            env['APP_PROFILE'] = profile
+            runs = [run_child(env)[0] for _ in range(args.runs)]
+            _, stderr = run_child(env, importtime=True)
+            breakdowns[profile] = import_breakdown(stderr)
+
+            print(f'\n{profile} profile (median of {args.runs} starts)')
+            for phase in ('import', 'create_app', 'first_request'):
+                print(f'  {phase:<14} {statistics.median(r[phase] for r in runs) * 1000:7.1f} ms')
+            total = statistics.median(sum(r.values()) for r in runs)
+            print(f'  {"total":<14} {total * 1000:7.1f} ms')
+
+        print('\nimport time by package (ms, self time, one -X importtime run)')
+        packages = sorted(breakdowns['full'], key=breakdowns['full'].get, reverse=True)[:args.top]
+        print(f'  {"package":<20} {"full":>8} {"auth":>8}')
+        for package in packages:
+            print(f'  {package:<20} {breakdowns["full"][package]:8.1f} {breakdowns["auth"].get(package, 0):8.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -15,6 +15,9 @@ class Config:
     # Flask
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'dev-secret-key-change-in-production'
 
+    # 'full' serves everything; 'auth' only the MediaMTX endpoints and metrics (see create_app)
+    APP_PROFILE = os.environ.get('APP_PROFILE', 'full')
+
     # Database
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or \
         'sqlite:///' + os.path.join(basedir, 'instance', 'mtxman.db')
@@ -24,6 +27,49 @@ class Config:
     # SQLite doesn't support connection pooling
     SQLALCHEMY_ENGINE_OPTIONS = {}
 
+    # Connection pools per process (not used for in-memory SQLite). The default pool serves
+    # the admin UI, REST API and background jobs; MediaMTX endpoints get their own
+    # (DATABASE_AUTH_POOL_SIZE=0 shares the default pool)
+    DATABASE_POOL_SIZE = int(os.environ.get('DATABASE_POOL_SIZE', 5))
+    DATABASE_MAX_OVERFLOW = int(os.environ.get('DATABASE_MAX_OVERFLOW', 10))
+    DATABASE_POOL_TIMEOUT = float(os.environ.get('DATABASE_POOL_TIMEOUT', 30))  # seconds to wait for a connection
+    DATABASE_AUTH_POOL_SIZE = int(os.environ.get('DATABASE_AUTH_POOL_SIZE', 5))
+    DATABASE_AUTH_MAX_OVERFLOW = int(os.environ.get('DATABASE_AUTH_MAX_OVERFLOW', 5))
+
+    # REST list endpoints: default and largest page, and rows fetched at a time when streaming NDJSON
+    API_PAGE_SIZE = int(os.environ.get('API_PAGE_SIZE', 100))
+    API_MAX_PAGE_SIZE = int(os.environ.get('API_MAX_PAGE_SIZE', 1000))
+    API_STREAM_BATCH_SIZE = int(os.environ.get('API_STREAM_BATCH_SIZE', 1000))
+
+    # Customer and API key search: shortest word used, an optional cap on matches ranked per
+    # query (0 ranks all; with a cap only the newest are ranked and older best matches can be
+    # missed) and results per admin UI page
+    SEARCH_MIN_TERM_LENGTH = int(os.environ.get('SEARCH_MIN_TERM_LENGTH', 2))
+    SEARCH_RANK_CANDIDATES = int(os.environ.get('SEARCH_RANK_CANDIDATES', 0))
+    SEARCH_PAGE_SIZE = int(os.environ.get('SEARCH_PAGE_SIZE', 25))
+    # Customers per page of the admin UI customer list (newest first)
+    CUSTOMERS_PAGE_SIZE = int(os.environ.get('CUSTOMERS_PAGE_SIZE', 50))
+
+    # Per-request SQL count and time (Server-Timing header, debug log, metrics); a statement
+    # repeated this often in one request is logged as a likely N+1 query
+    QUERY_STATS_ENABLED = os.environ.get('QUERY_STATS_ENABLED', 'True').lower() == 'true'
+    QUERY_REPEAT_THRESHOLD = int(os.environ.get('QUERY_REPEAT_THRESHOLD', 5))
+
+    # Read replicas (comma-separated URLs): MediaMTX auth and REST GETs read from them
+    DATABASE_REPLICA_URLS = [url.strip() for url in os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if url.strip()]
+    REPLICA_MAX_LAG_SECONDS = float(os.environ.get('REPLICA_MAX_LAG_SECONDS', 5))  # PostgreSQL standbys only
+    REPLICA_CHECK_SECONDS = float(os.environ.get('REPLICA_CHECK_SECONDS', 5))
+    REPLICA_RETRY_SECONDS = float(os.environ.get('REPLICA_RETRY_SECONDS', 30))  # after an error marks one down
+    REPLICA_STICKY_SECONDS = float(os.environ.get('REPLICA_STICKY_SECONDS', 10))  # reads stay on the primary after a write
+
+    # SQLite production mode (file databases only): WAL and tuned pragmas, read-only
+    # connections for the MediaMTX endpoints and one queued writer for last_used_at
+    SQLITE_PRODUCTION_MODE = os.environ.get('SQLITE_PRODUCTION_MODE', 'False').lower() == 'true'
+    SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')
+    SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000))
+    SQLITE_MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE', 268435456))  # bytes
+    SQLITE_CACHE_SIZE = int(os.environ.get('SQLITE_CACHE_SIZE', -65536))  # negative: KiB per connection
+
     # LDAP Configuration
     LDAP_HOST = os.environ.get('LDAP_HOST', 'ldap://localhost')
     LDAP_PORT = int(os.environ.get('LDAP_PORT', 389))
@@ -37,11 +83,73 @@ class Config:
     LDAP_USER_OBJECT_FILTER = os.environ.get('LDAP_USER_OBJECT_FILTER', '(objectClass=person)')
     LDAP_USER_RDN_ATTR = os.environ.get('LDAP_USER_RDN_ATTR', 'cn')
     LDAP_USER_LOGIN_ATTR = os.environ.get('LDAP_USER_LOGIN_ATTR', 'sAMAccountName')
+    LDAP_POOL_SIZE = int(os.environ.get('LDAP_POOL_SIZE', 4))
+    LDAP_POOL_HEALTH_CHECK_SECONDS = int(os.environ.get('LDAP_POOL_HEALTH_CHECK_SECONDS', 30))
+    LDAP_GROUP_OBJECT_FILTER = os.environ.get('LDAP_GROUP_OBJECT_FILTER', '(objectClass=group)')
+    LDAP_ADMIN_GROUP = os.environ.get('LDAP_ADMIN_GROUP')  # cn of the group under LDAP_GROUP_DN whose members are admins
+    LDAP_SYNC_INTERVAL_SECONDS = int(os.environ.get('LDAP_SYNC_INTERVAL_SECONDS', 0))  # 0: run manage.py ldap-sync instead
+    LDAP_SYNC_PAGE_SIZE = int(os.environ.get('LDAP_SYNC_PAGE_SIZE', 500))
+    LDAP_DN_CACHE_TTL = int(os.environ.get('LDAP_DN_CACHE_TTL', 3600))  # 0 searches on every login
+    LDAP_CONNECT_TIMEOUT = float(os.environ.get('LDAP_CONNECT_TIMEOUT', 5))
+    LDAP_RECEIVE_TIMEOUT = float(os.environ.get('LDAP_RECEIVE_TIMEOUT', 10))
+    LDAP_LOGIN_WORKERS = int(os.environ.get('LDAP_LOGIN_WORKERS', 4))  # 0 runs logins on the request thread
+    LDAP_LOGIN_QUEUE_LIMIT = int(os.environ.get('LDAP_LOGIN_QUEUE_LIMIT', 16))
+    LDAP_LOGIN_TIMEOUT = float(os.environ.get('LDAP_LOGIN_TIMEOUT', 15))
+    LDAP_BREAKER_THRESHOLD = int(os.environ.get('LDAP_BREAKER_THRESHOLD', 5))  # consecutive errors before failing fast
+    LDAP_BREAKER_RESET_SECONDS = float(os.environ.get('LDAP_BREAKER_RESET_SECONDS', 30))
+    LDAP_CLIENT_STRATEGY = os.environ.get('LDAP_CLIENT_STRATEGY', 'SYNC')  # MOCK_SYNC for tests and benchmarks
 
     # MediaMTX
     MEDIAMTX_WEBHOOK_SECRET = os.environ.get('MEDIAMTX_WEBHOOK_SECRET', 'change-me')
     MEDIAMTX_BASE_URL = os.environ.get('MEDIAMTX_BASE_URL', 'http://localhost:8554')
 
+    # Degraded-mode auth: fall back to a last-known-good key snapshot when the DB fails
+    AUTH_SNAPSHOT_REFRESH_SECONDS = int(os.environ.get('AUTH_SNAPSHOT_REFRESH_SECONDS', 60))
+    # Refresh in a background thread per worker (woken by invalidations), never inside an auth request
+    AUTH_SNAPSHOT_REFRESHER_ENABLED = os.environ.get('AUTH_SNAPSHOT_REFRESHER_ENABLED', 'true').lower() == 'true'
+    AUTH_SNAPSHOT_PATH = os.environ.get('AUTH_SNAPSHOT_PATH')
+    AUTH_DB_LATENCY_BUDGET_MS = int(os.environ.get('AUTH_DB_LATENCY_BUDGET_MS', 250))
+    AUTH_DEGRADED_RETRY_SECONDS = int(os.environ.get('AUTH_DEGRADED_RETRY_SECONDS', 5))
+    AUTH_DEGRADED_POLICY = os.environ.get('AUTH_DEGRADED_POLICY', 'publish=closed,read=open')
+
+    # Cache invalidation bus: inprocess, unix (local workers), postgres (multi-node) or none
+    INVALIDATION_TRANSPORT = os.environ.get('INVALIDATION_TRANSPORT', 'inprocess')
+    INVALIDATION_SOCKET_DIR = os.environ.get('INVALIDATION_SOCKET_DIR', '/tmp/mtxman-invalidation')
+    INVALIDATION_PG_DSN = os.environ.get('INVALIDATION_PG_DSN')
+    INVALIDATION_CHANNEL = os.environ.get('INVALIDATION_CHANNEL', 'mtxman_invalidation')
+
+    # Batch key verification (/api/mediamtx/auth/batch)
+    BATCH_AUTH_MAX_ITEMS = int(os.environ.get('BATCH_AUTH_MAX_ITEMS', 10000))
+
+    # Change feed served to edge auth sidecars (disabled unless EDGE_SYNC_TOKEN is set)
+    EDGE_SYNC_TOKEN = os.environ.get('EDGE_SYNC_TOKEN')
+    CHANGE_FEED_SETTLE_SECONDS = float(os.environ.get('CHANGE_FEED_SETTLE_SECONDS', 2))
+    # Changes older than this are pruned (by the expiry sweeper or manage.py prune-changes);
+    # an edge further behind than that resyncs in full
+    CHANGE_FEED_RETENTION_HOURS = float(os.environ.get('CHANGE_FEED_RETENTION_HOURS', 168))
+    CHANGE_FEED_MAX_LIMIT = int(os.environ.get('CHANGE_FEED_MAX_LIMIT', 10000))
+
+    # Edge sidecar (edge.py)
+    EDGE_CONTROL_PLANE_URL = os.environ.get('EDGE_CONTROL_PLANE_URL', 'http://localhost:5000')
+    EDGE_SYNC_INTERVAL_SECONDS = float(os.environ.get('EDGE_SYNC_INTERVAL_SECONDS', 2))  # between polls when idle
+    EDGE_SYNC_PAGE_SIZE = int(os.environ.get('EDGE_SYNC_PAGE_SIZE', 5000))
+
+    # Expiry sweeper: deactivates keys at expires_at (disable when running manage.py expire-keys from cron)
+    EXPIRY_SWEEPER_ENABLED = os.environ.get('EXPIRY_SWEEPER_ENABLED', 'true').lower() == 'true'
+    EXPIRY_HORIZON_SECONDS = int(os.environ.get('EXPIRY_HORIZON_SECONDS', 3600))
+    EXPIRY_BATCH_SIZE = int(os.environ.get('EXPIRY_BATCH_SIZE', 1000))
+
+    # Logged-in user principals cached by the Flask-Login user loader
+    PRINCIPAL_CACHE_SECONDS = int(os.environ.get('PRINCIPAL_CACHE_SECONDS', 60))
+
+    # Warm caches in wsgi.py before serving; /api/ready answers 503 until done
+    WARMUP_ON_START = os.environ.get('WARMUP_ON_START', 'true').lower() == 'true'
+    # Keys are loaded hottest first (by last_used_at) until either budget is spent (0 keys = all)
+    WARMUP_KEY_BUDGET = int(os.environ.get('WARMUP_KEY_BUDGET', 50000))
+    WARMUP_SECONDS_BUDGET = float(os.environ.get('WARMUP_SECONDS_BUDGET', 30))
+    # Fraction of the planned keys that must be loaded before /api/ready answers 200
+    WARMUP_READY_FRACTION = float(os.environ.get('WARMUP_READY_FRACTION', 0.9))
+
     # API Keys
     API_KEY_LENGTH = int(os.environ.get('API_KEY_LENGTH', 32))
     API_KEY_PREFIX = os.environ.get('API_KEY_PREFIX', 'mtx_')
@@ -73,6 +181,12 @@ class TestingConfig(Config):
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
     WTF_CSRF_ENABLED = False
     SESSION_COOKIE_SECURE = False
+    AUTH_SNAPSHOT_REFRESH_SECONDS = 0  # Tests refresh the snapshot explicitly
+    AUTH_SNAPSHOT_REFRESHER_ENABLED = False
+    EDGE_SYNC_TOKEN = 'test-sync-token'
+    CHANGE_FEED_SETTLE_SECONDS = 0
+    EXPIRY_SWEEPER_ENABLED = False  # Tests run the scheduler explicitly
+    WARMUP_ON_START = False
 
 
 class ProductionConfig(Config):
@@ -89,6 +203,9 @@ class ProductionConfig(Config):
         'pool_recycle': 300,
     }
 
+    # Only takes effect when DATABASE_URL is a SQLite file
+    SQLITE_PRODUCTION_MODE = os.environ.get('SQLITE_PRODUCTION_MODE', 'True').lower() == 'true'
+
 
 config_by_name = {
     'development': DevelopmentConfig,
@@ -0,0 +1,18 @@
+# ABOUTME: WSGI entry point for the edge auth sidecar deployed next to MediaMTX
+# ABOUTME: Serves /api/mediamtx/auth from a local replica synced from the control plane
+
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from app.edge import create_edge_app
+
+config_name = os.environ.get('FLASK_ENV', 'production')
+app = create_edge_app(config_name)
+
+if __name__ == '__main__':
+    app.run(
+        host=os.environ.get('FLASK_HOST', '0.0.0.0'),
+        port=int(os.environ.get('EDGE_PORT', 5001)),
+    )
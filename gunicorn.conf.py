@@ -0,0 +1,41 @@
+# ABOUTME: Gunicorn settings: preload the app in the master so warm caches are shared by workers
+# ABOUTME: Freezes warmed objects out of the garbage collector and resets DB pools after fork
+
+import gc
+import os
+from dotenv import load_dotenv
+
+# Read .env before the defaults below, so its settings win over them
+load_dotenv()
+
+wsgi_app = 'wsgi:app'
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('GUNICORN_WORKERS', 4))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+
+# A revoke in one worker must reach the caches of the others; set INVALIDATION_TRANSPORT
+# (e.g. postgres for several nodes) to override
+if workers > 1:
+    os.environ.setdefault('INVALIDATION_TRANSPORT', 'unix')
+
+# Import and warm the app (wsgi.py) once in the master; workers share those pages copy-on-write.
+# Code changes then need a full restart rather than a HUP.
+preload_app = os.environ.get('GUNICORN_PRELOAD', 'true').lower() == 'true'
+
+
+def when_ready(server):
+    if preload_app:
+        # Move everything loaded so far to the permanent generation, so the
+        # collector never writes to (and un-shares) those pages in workers
+        gc.freeze()
+
+
+def post_fork(server, worker):
+    if not preload_app:
+        return
+    from app import db
+
+    # Warm-up closed its connections, but never reuse a pooled socket across fork
+    with server.app.wsgi().app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
@@ -74,7 +74,9 @@ def list_users():
 @cli.command('list-customers')
 def list_customers():
     """List all customers"""
-    customers = Customer.query.all()
+    from app.services.stats_service import StatsService
+
+    customers = StatsService.customers_with_key_counts()
 
     if not customers:
         click.echo('No customers found.')
@@ -82,12 +84,67 @@ def list_customers():
 
     click.echo('\nCustomers:')
     click.echo('-' * 80)
-    for customer in customers:
+    for customer, key_count, _ in customers:
         status = 'Active' if customer.is_active else 'Inactive'
-        key_count = customer.api_keys.count()
         click.echo(f'{customer.id:4d} | {customer.name:25s} | {customer.email:30s} | Keys: {key_count} | {status}')
     click.echo('-' * 80)
 
 
+@cli.command('expire-keys')
+@click.option('--batch-size', default=1000, show_default=True, help='Keys deactivated per UPDATE')
+def expire_keys(batch_size):
+    """Deactivate API keys past their expiration date"""
+    from app.services.expiry import ExpiryService
+
+    count = ExpiryService.expire_due(batch_size=batch_size)
+    click.echo(f'Deactivated {count} expired API key(s).')
+
+
+@cli.command('prune-changes')
+@click.option('--older-than-hours', type=float, default=None,
+              help='Age of changes to delete (default: CHANGE_FEED_RETENTION_HOURS)')
+def prune_changes(older_than_hours):
+    """Delete old change feed entries; edges further behind than that resync in full"""
+    from datetime import timedelta
+    from flask import current_app
+    from app.services.change_feed import ChangeFeedService
+
+    if older_than_hours is None:
+        older_than_hours = current_app.config['CHANGE_FEED_RETENTION_HOURS']
+    count = ChangeFeedService.prune(timedelta(hours=older_than_hours))
+    click.echo(f'Deleted {count} change feed entries older than {older_than_hours:g} hours.')
+
+
+@cli.command('rebuild-stats')
+def rebuild_stats():
+    """Recount the dashboard totals, e.g. after editing customers or keys directly in the database"""
+    from app.services.stats_service import StatsService
+
+    counts = StatsService.rebuild()
+    click.echo(', '.join(f'{name}: {value}' for name, value in counts.items()))
+
+
+@cli.command('rebuild-search')
+def rebuild_search():
+    """Reindex customers and API keys for search (SQLite), e.g. after a migration recreated their tables"""
+    from app.services.search_service import SearchService
+
+    tables = SearchService.rebuild_index()
+    click.echo(f"Reindexed: {', '.join(tables)}" if tables else 'Nothing to rebuild on this database.')
+
+
+@cli.command('ldap-sync')
+@click.option('--page-size', default=500, show_default=True, help='Entries per LDAP paged-results page')
+@click.option('--dry-run', is_flag=True, help='Report changes without applying them')
+def ldap_sync(page_size, dry_run):
+    """Sync users (email, display name, admin group, deactivation) from LDAP"""
+    from app.services.ldap_sync import LDAPSyncService
+
+    counts = LDAPSyncService.sync(page_size=page_size, dry_run=dry_run)
+    prefix = 'Would apply' if dry_run else 'Applied'
+    click.echo(f"{prefix}: {counts['updated']} updated, {counts['created']} created, "
+               f"{counts['deactivated']} deactivated.")
+
+
 if __name__ == '__main__':
     cli()
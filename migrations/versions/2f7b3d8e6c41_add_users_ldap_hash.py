@@ -0,0 +1,26 @@
+"""Add users.ldap_hash for directory sync
+
+Revision ID: 2f7b3d8e6c41
+Revises: 9a4f6c2e1b73
+Create Date: 2026-10-19 17:40:05.902144
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2f7b3d8e6c41'
+down_revision = '9a4f6c2e1b73'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('ldap_hash', sa.String(length=64), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_column('ldap_hash')
@@ -0,0 +1,96 @@
+"""Store api_keys.key_hash as a 32-byte binary digest
+
+Revision ID: 7d2e9b4c1a06
+Revises: 3c1f0a9d2b47
+Create Date: 2026-10-19 11:40:03.527719
+
+The digest is backfilled into a new column in batches, each committed on its
+own so the table is never locked for the whole run. Rows written by old code
+while the backfill runs are caught by a final pass just before the columns
+are swapped.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7d2e9b4c1a06'
+down_revision = '3c1f0a9d2b47'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 10000
+
+api_keys = sa.table(
+    'api_keys',
+    sa.column('id', sa.Integer),
+    sa.column('key_hash', sa.String),
+    sa.column('key_digest', sa.LargeBinary),
+)
+
+
+def _backfill(bind, where, column, convert):
+    """Set column = convert(row) for matching rows, BATCH_SIZE rows per statement"""
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(api_keys.c.id, api_keys.c.key_hash, api_keys.c.key_digest)
+            .where(api_keys.c.id > last_id, where)
+            .order_by(api_keys.c.id)
+            .limit(BATCH_SIZE)
+        ).fetchall()
+        if not rows:
+            return
+
+        bind.execute(
+            api_keys.update()
+            .where(api_keys.c.id == sa.bindparam('row_id'))
+            .values({column: sa.bindparam('value')}),
+            [{'row_id': row.id, 'value': convert(row)} for row in rows]
+        )
+        last_id = rows[-1].id
+
+
+def upgrade():
+    with op.batch_alter_table('api_keys', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('key_digest', sa.LargeBinary(length=32), nullable=True))
+
+    bind = op.get_bind()
+    pending = api_keys.c.key_digest.is_(None)
+
+    def to_digest(row):
+        return bytes.fromhex(row.key_hash)
+
+    # Online backfill: every batch commits on its own
+    with op.get_context().autocommit_block():
+        _backfill(bind, pending, 'key_digest', to_digest)
+
+    # Catch rows inserted while the backfill ran, then swap the columns
+    _backfill(bind, pending, 'key_digest', to_digest)
+
+    with op.batch_alter_table('api_keys', schema=None) as batch_op:
+        batch_op.drop_index('ix_api_keys_key_hash')
+        batch_op.drop_column('key_hash')
+        batch_op.alter_column('key_digest', new_column_name='key_hash', nullable=False,
+                              existing_type=sa.LargeBinary(length=32))
+
+    with op.batch_alter_table('api_keys', schema=None) as batch_op:
+        batch_op.create_unique_constraint('uq_api_keys_key_hash', ['key_hash'])
+
+
+def downgrade():
+    with op.batch_alter_table('api_keys', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_api_keys_key_hash', type_='unique')
+        batch_op.alter_column('key_hash', new_column_name='key_digest', nullable=True,
+                              existing_type=sa.LargeBinary(length=32))
+
+    with op.batch_alter_table('api_keys', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('key_hash', sa.String(length=64), nullable=True))
+
+    _backfill(op.get_bind(), api_keys.c.key_hash.is_(None), 'key_hash', lambda row: row.key_digest.hex())
+
+    with op.batch_alter_table('api_keys', schema=None) as batch_op:
+        batch_op.drop_column('key_digest')
+        batch_op.alter_column('key_hash', nullable=False, existing_type=sa.String(length=64))
+        batch_op.create_index('ix_api_keys_key_hash', ['key_hash'], unique=True)
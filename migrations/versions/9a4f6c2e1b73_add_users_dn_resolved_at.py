@@ -0,0 +1,26 @@
+"""Add users.dn_resolved_at for the LDAP DN cache
+
+Revision ID: 9a4f6c2e1b73
+Revises: e4a7c2d95b18
+Create Date: 2026-10-19 16:12:40.118305
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9a4f6c2e1b73'
+down_revision = 'e4a7c2d95b18'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('dn_resolved_at', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_column('dn_resolved_at')
@@ -0,0 +1,55 @@
+"""Add search indexes for customers and API keys
+
+FTS5 tables with sync triggers on SQLite, pg_trgm GIN indexes on PostgreSQL.
+
+Revision ID: a1e5c7b3f9d2
+Revises: f3b6a9d0c5e1
+Create Date: 2026-10-19 21:02:47.518204
+
+"""
+from alembic import op
+
+# The statements live in app.models.search_index, which also creates them with the tables
+# and backs `manage.py rebuild-search`, so the three cannot drift apart
+from app.models.search_index import (
+    SEARCH_COLUMNS,
+    postgresql_create_statements,
+    postgresql_drop_statements,
+    sqlite_create_statements,
+    sqlite_drop_statements,
+    sqlite_rebuild_statement,
+)
+
+
+# revision identifiers, used by Alembic.
+revision = 'a1e5c7b3f9d2'
+down_revision = 'f3b6a9d0c5e1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    for table in SEARCH_COLUMNS:
+        if dialect == 'sqlite':
+            # Index the existing rows too
+            statements = sqlite_create_statements(table) + [sqlite_rebuild_statement(table)]
+        elif dialect == 'postgresql':
+            statements = postgresql_create_statements(table)
+        else:
+            statements = []
+        for statement in statements:
+            op.execute(statement)
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    for table in SEARCH_COLUMNS:
+        if dialect == 'sqlite':
+            statements = sqlite_drop_statements(table)
+        elif dialect == 'postgresql':
+            statements = postgresql_drop_statements(table)
+        else:
+            statements = []
+        for statement in statements:
+            op.execute(statement)
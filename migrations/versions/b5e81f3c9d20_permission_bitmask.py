@@ -0,0 +1,53 @@
+"""Replace api_keys.can_publish/can_read with a permissions bitmask
+
+Revision ID: b5e81f3c9d20
+Revises: 7d2e9b4c1a06
+Create Date: 2026-10-19 14:12:45.180233
+
+Bits follow app.models.api_key.PERMISSION_BITS: publish=1, read=2,
+playback=4, api=8, metrics=16, pprof=32.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b5e81f3c9d20'
+down_revision = '7d2e9b4c1a06'
+branch_labels = None
+depends_on = None
+
+PUBLISH = 1
+READ = 2
+
+
+def upgrade():
+    with op.batch_alter_table('api_keys', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('permissions', sa.Integer(), nullable=True))
+
+    op.execute(
+        'UPDATE api_keys SET permissions = '
+        f'(CASE WHEN can_publish THEN {PUBLISH} ELSE 0 END) + (CASE WHEN can_read THEN {READ} ELSE 0 END)'
+    )
+
+    with op.batch_alter_table('api_keys', schema=None) as batch_op:
+        batch_op.alter_column('permissions', existing_type=sa.Integer(), nullable=False)
+        batch_op.drop_column('can_publish')
+        batch_op.drop_column('can_read')
+
+
+def downgrade():
+    with op.batch_alter_table('api_keys', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('can_publish', sa.Boolean(), nullable=True))
+        batch_op.add_column(sa.Column('can_read', sa.Boolean(), nullable=True))
+
+    op.execute(
+        f'UPDATE api_keys SET can_publish = ((permissions & {PUBLISH}) <> 0), '
+        f'can_read = ((permissions & {READ}) <> 0)'
+    )
+
+    with op.batch_alter_table('api_keys', schema=None) as batch_op:
+        batch_op.alter_column('can_publish', existing_type=sa.Boolean(), nullable=False)
+        batch_op.alter_column('can_read', existing_type=sa.Boolean(), nullable=False)
+        batch_op.drop_column('permissions')
@@ -0,0 +1,45 @@
+"""Add stat_counters for dashboard totals and index customers.created_at
+
+Revision ID: c8d1f4a7e2b9
+Revises: 2f7b3d8e6c41
+Create Date: 2026-10-19 18:40:12.305517
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c8d1f4a7e2b9'
+down_revision = '2f7b3d8e6c41'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    stat_counters = op.create_table(
+        'stat_counters',
+        sa.Column('name', sa.String(length=50), nullable=False),
+        sa.Column('value', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('name')
+    )
+
+    connection = op.get_bind()
+    counts = {}
+    for table, total, active in (('customers', 'customers', 'active_customers'),
+                                 ('api_keys', 'api_keys', 'active_api_keys')):
+        row = connection.execute(sa.text(
+            f'SELECT COUNT(*), COUNT(CASE WHEN is_active THEN 1 END) FROM {table}'
+        )).one()
+        counts[total], counts[active] = row
+    op.bulk_insert(stat_counters, [{'name': name, 'value': value} for name, value in counts.items()])
+
+    with op.batch_alter_table('customers', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_customers_created_at'), ['created_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('customers', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_customers_created_at'))
+
+    op.drop_table('stat_counters')
@@ -0,0 +1,26 @@
+"""Index api_keys.expires_at for the expiry sweeper
+
+Revision ID: e4a7c2d95b18
+Revises: b5e81f3c9d20
+Create Date: 2026-10-19 15:03:27.614902
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4a7c2d95b18'
+down_revision = 'b5e81f3c9d20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('api_keys', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_api_keys_expires_at'), ['expires_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('api_keys', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_api_keys_expires_at'))
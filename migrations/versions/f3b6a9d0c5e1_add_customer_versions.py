@@ -0,0 +1,28 @@
+"""Add customers.version and customers.keys_version for REST ETags
+
+Revision ID: f3b6a9d0c5e1
+Revises: c8d1f4a7e2b9
+Create Date: 2026-10-19 20:05:51.772093
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3b6a9d0c5e1'
+down_revision = 'c8d1f4a7e2b9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('customers', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('version', sa.Integer(), nullable=False, server_default='1'))
+        batch_op.add_column(sa.Column('keys_version', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade():
+    with op.batch_alter_table('customers', schema=None) as batch_op:
+        batch_op.drop_column('keys_version')
+        batch_op.drop_column('version')
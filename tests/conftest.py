@@ -2,7 +2,9 @@
 # ABOUTME: Sets up test database, app context, and common test data
 
 import pytest
+from contextlib import contextmanager
 from app import create_app, db
+from app.query_stats import query_stats
 from app.models.user import User
 from app.models.customer import Customer
 from app.models.api_key import ApiKey
@@ -44,6 +46,18 @@ def db_session(app):
         session.remove()
 
 
+@pytest.fixture
+def query_budget():
+    """Assert a block runs at most max_queries statements and no likely N+1 query"""
+    @contextmanager
+    def budget(max_queries):
+        with query_stats.record() as log:
+            yield log
+        assert log.count <= max_queries, f'over budget of {max_queries}: {log.summary()}'
+        assert not log.repeated(query_stats.repeat_threshold), f'repeated statements: {log.summary()}'
+    return budget
+
+
 @pytest.fixture
 def sample_user(db_session):
     """Create a sample user for testing"""
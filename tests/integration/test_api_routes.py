@@ -3,6 +3,8 @@
 
 import pytest
 import json
+import re
+from flask import g
 from flask_login import login_user
 from app.services.customer_service import CustomerService
 from app.services.api_key_service import ApiKeyService
@@ -59,3 +61,226 @@ class TestRestApi:
         """Test REST API get customer without auth"""
         response = client.get(f'/api/api/v1/customers/{sample_customer.id}')
         assert response.status_code == 302  # Redirect to login
+
+
+class TestRestApiPagination:
+    """Test keyset pagination and NDJSON streaming of REST list endpoints"""
+
+    def login(self, client, user):
+        with client.session_transaction() as session:
+            session['_user_id'] = str(user.id)
+            session['_fresh'] = True
+
+    def get(self, client, url):
+        # Requests share the test's app context, so drop the user Flask-Login kept on g
+        g.pop('_login_user', None)
+        return client.get(url)
+
+    def add_customers(self, db_session, count):
+        ids = []
+        for i in range(count):
+            ids.append(CustomerService.create_customer(name=f'Page {i}', email=f'page{i}@example.com').id)
+        return ids
+
+    def test_pages_follow_next_link(self, client, db_session, sample_admin):
+        """Test pages continue after the last id until no next link is given"""
+        ids = self.add_customers(db_session, 5)
+        self.login(client, sample_admin)
+
+        seen, url = [], '/api/api/v1/customers?limit=2'
+        while url:
+            response = self.get(client, url)
+            assert response.status_code == 200
+            assert len(response.json) <= 2
+            seen += [c['id'] for c in response.json]
+            link = response.headers.get('Link')
+            url = link[1:link.index('>')] if link else None
+
+        assert seen == sorted(seen)
+        assert set(ids) <= set(seen)
+
+    def test_full_list_without_paging(self, client, app, db_session, sample_admin, sample_customer, monkeypatch):
+        """Test a request without paging parameters still gets every row, newest first, in one array"""
+        monkeypatch.setitem(app.config, 'API_PAGE_SIZE', 2)
+        monkeypatch.setitem(app.config, 'API_STREAM_BATCH_SIZE', 2)
+        ids = self.add_customers(db_session, 4)
+        keys = [ApiKeyService.create_api_key(customer_id=sample_customer.id, name=f'Key {i}')[0].id
+                for i in range(3)]
+        self.login(client, sample_admin)
+
+        response = self.get(client, '/api/api/v1/customers')
+        assert response.mimetype == 'application/json'
+        assert 'Link' not in response.headers
+        customers = json.loads(response.get_data(as_text=True))
+        response = self.get(client, f'/api/api/v1/customers/{sample_customer.id}/keys')
+        key_list = json.loads(response.get_data(as_text=True))
+
+        assert [c['id'] for c in customers] == ids[::-1] + [sample_customer.id]
+        assert [k['id'] for k in key_list] == keys[::-1]
+
+    def test_after_id(self, client, db_session, sample_admin, sample_customer):
+        """Test after_id skips keys up to and including that id"""
+        keys = [ApiKeyService.create_api_key(customer_id=sample_customer.id, name=f'Key {i}')[0].id
+                for i in range(3)]
+        self.login(client, sample_admin)
+
+        response = self.get(client, f'/api/api/v1/customers/{sample_customer.id}/keys?after_id={keys[0]}')
+
+        assert [k['id'] for k in response.json] == keys[1:]
+        assert 'Link' not in response.headers
+
+    def test_invalid_parameters(self, client, db_session, sample_admin):
+        """Test malformed after_id, limit and format are rejected"""
+        self.login(client, sample_admin)
+
+        for query in ('after_id=-1', 'limit=ten', 'format=xml'):
+            response = self.get(client, f'/api/api/v1/customers?{query}')
+            assert response.status_code == 400
+            assert 'error' in response.json
+
+    def test_ndjson_stream(self, client, db_session, sample_admin):
+        """Test format=ndjson streams every row after after_id, one object per line"""
+        ids = self.add_customers(db_session, 5)
+        self.login(client, sample_admin)
+
+        response = self.get(client, f'/api/api/v1/customers?format=ndjson&after_id={ids[1]}')
+
+        assert response.mimetype == 'application/x-ndjson'
+        rows = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        assert [row['id'] for row in rows] == ids[2:]
+
+
+class TestRestApiConditionalGet:
+    """Test ETags and If-None-Match on REST resources"""
+
+    def login(self, client, user):
+        with client.session_transaction() as session:
+            session['_user_id'] = str(user.id)
+            session['_fresh'] = True
+
+    def get(self, client, url, etag=None):
+        # Requests share the test's app context, so drop the user Flask-Login kept on g
+        g.pop('_login_user', None)
+        return client.get(url, headers={'If-None-Match': etag} if etag else {})
+
+    def test_customer_etag(self, client, db_session, sample_admin, sample_customer):
+        """Test an unchanged customer answers 304 and an edit or key change gives a new ETag"""
+        customer_id = sample_customer.id
+        url = f'/api/api/v1/customers/{customer_id}'
+        self.login(client, sample_admin)
+
+        first = self.get(client, url)
+        etag = first.headers['ETag']
+        assert etag.startswith('W/"')
+        assert self.get(client, url, etag).status_code == 304
+
+        CustomerService.update_customer(customer_id, name='Renamed')
+        edited = self.get(client, url, etag)
+        assert edited.status_code == 200
+        assert edited.json['name'] == 'Renamed'
+
+        etag = edited.headers['ETag']
+        ApiKeyService.create_api_key(customer_id=customer_id, name='New Key')
+        assert self.get(client, url, etag).status_code == 200
+
+    def test_keys_collection_version(self, client, db_session, sample_admin, sample_api_key):
+        """Test the keys ETag changes on key mutations but not on key use"""
+        customer_id, key_id = sample_api_key.customer_id, sample_api_key.id
+        url = f'/api/api/v1/customers/{customer_id}/keys'
+        self.login(client, sample_admin)
+        etag = self.get(client, url).headers['ETag']
+
+        sample_api_key.update_last_used()
+        assert self.get(client, url, etag).status_code == 304
+
+        ApiKeyService.revoke_api_key(key_id)
+        changed = self.get(client, url, etag)
+        assert changed.status_code == 200
+        assert changed.json[0]['is_active'] is False
+
+    def test_missing_customer(self, client, db_session, sample_admin):
+        """Test unknown customers are 404 without an ETag"""
+        self.login(client, sample_admin)
+
+        response = self.get(client, '/api/api/v1/customers/999999')
+        assert response.status_code == 404
+        assert 'ETag' not in response.headers
+
+
+class TestSearch:
+    """Test customer and API key search in the REST API and the customer list"""
+
+    def login(self, client, user):
+        with client.session_transaction() as session:
+            session['_user_id'] = str(user.id)
+            session['_fresh'] = True
+
+    def get(self, client, url):
+        # Requests share the test's app context, so drop the user Flask-Login kept on g
+        g.pop('_login_user', None)
+        return client.get(url)
+
+    def test_search_unauthenticated(self, client):
+        """Test search requires a login"""
+        assert self.get(client, '/api/api/v1/search/customers?q=acme').status_code == 302
+
+    def test_ranked_pages(self, client, db_session, sample_admin):
+        """Test results come best first and pages follow the next link"""
+        for i in range(3):
+            CustomerService.create_customer(name=f'Sparrow {i}', email=f'sparrow{i}@example.com')
+        CustomerService.create_customer(name='Other', email='other@example.com', organization='Sparrow Ltd')
+        self.login(client, sample_admin)
+
+        seen, url = [], '/api/api/v1/search/customers?q=sparr&limit=2'
+        while url:
+            response = self.get(client, url)
+            assert response.status_code == 200
+            seen += [c['name'] for c in response.json]
+            link = response.headers.get('Link')
+            url = link[1:link.index('>')] if link else None
+
+        assert len(seen) == 4
+        assert seen[-1] == 'Other'
+        assert self.get(client, '/api/api/v1/search/customers?q=sparr&offset=x').status_code == 400
+
+    def test_search_keys(self, client, db_session, sample_admin, sample_customer):
+        """Test keys are found by name"""
+        ApiKeyService.create_api_key(customer_id=sample_customer.id, name='Lark uplink')
+        self.login(client, sample_admin)
+
+        response = self.get(client, '/api/api/v1/search/keys?q=lark')
+
+        assert [k['name'] for k in response.json] == ['Lark uplink']
+        assert self.get(client, '/api/api/v1/search/keys?q=').json == []
+
+    def test_customer_list_pages(self, client, app, db_session, sample_admin, monkeypatch):
+        """Test the customer list shows a page of the newest customers and links to the next"""
+        monkeypatch.setitem(app.config, 'CUSTOMERS_PAGE_SIZE', 2)
+        for i in range(5):
+            CustomerService.create_customer(name=f'Robin {i}', email=f'robin{i}@example.com')
+        self.login(client, sample_admin)
+
+        pages, url = [], '/api/customers'
+        while url:
+            response = self.get(client, url)
+            assert response.status_code == 200
+            pages.append(re.findall(r'robin(\d)@example.com', response.data.decode()))
+            after_id = re.search(r'after_id=(\d+)', response.data.decode())
+            url = f'/api/customers?after_id={after_id.group(1)}' if after_id else None
+
+        assert pages == [['4', '3'], ['2', '1'], ['0']]
+
+    def test_customer_list_search(self, client, db_session, sample_admin, sample_customer):
+        """Test the customer list shows matching customers with key counts and matching keys"""
+        CustomerService.create_customer(name='Finch', email='finch@example.com')
+        ApiKeyService.create_api_key(customer_id=sample_customer.id, name='Finch relay')
+        self.login(client, sample_admin)
+
+        response = self.get(client, '/api/customers?q=finch')
+
+        assert response.status_code == 200
+        assert b'Matching API Keys' in response.data
+        assert b'Finch relay' in response.data
+        assert b'finch@example.com' in response.data
+        assert sample_customer.email.encode() not in response.data
+        assert b'No customers match' in self.get(client, '/api/customers?q=nomatchzz').data
@@ -0,0 +1,174 @@
+# ABOUTME: Integration tests for the change feed and the edge auth sidecar
+# ABOUTME: Tests full and incremental sync and local auth decisions on the edge
+
+import pytest
+import json
+from datetime import datetime, timedelta
+from app import db
+from app.edge import EdgeReplica, create_edge_app
+from app.models.auth_change import AuthChange
+from app.services.change_feed import ChangeFeedService
+from app.services.api_key_service import ApiKeyService
+from app.services.customer_service import CustomerService
+
+AUTH_HEADER = {'Authorization': 'Bearer test-sync-token'}
+
+
+@pytest.fixture
+def fetch(client):
+    """Fetch change feed pages through the control plane test client"""
+    def _fetch(params):
+        response = client.get('/api/mediamtx/changes', query_string=params, headers=AUTH_HEADER)
+        assert response.status_code == 200
+        return json.loads(response.data)
+    return _fetch
+
+
+@pytest.fixture
+def edge(fetch):
+    """Edge sidecar app whose replica is synced explicitly by the test"""
+    edge = create_edge_app('testing', fetch=fetch)
+    edge.extensions['edge_replica'].ensure_started = lambda logger=None: None
+    return edge
+
+
+class TestChangeFeed:
+    """Test the control plane change feed endpoint"""
+
+    def test_requires_token(self, client, db_session):
+        """Test the feed rejects requests without the sync token"""
+        response = client.get('/api/mediamtx/changes')
+        assert response.status_code == 401
+
+    def test_full_sync_pages(self, client, db_session, sample_customer):
+        """Test a full sync pages through active keys"""
+        for i in range(3):
+            ApiKeyService.create_api_key(customer_id=sample_customer.id, name=f'Key {i}')
+
+        response = client.get('/api/mediamtx/changes?since=0&limit=2', headers=AUTH_HEADER)
+        data = json.loads(response.data)
+
+        assert data['full'] is True
+        assert data['more'] is True
+        assert len(data['api_keys']) == 2
+        assert data['customers'][0]['id'] == sample_customer.id
+
+    def test_changes_since_reports_revocation(self, client, db_session, sample_api_key):
+        """Test a revoked key appears as inactive in the incremental feed"""
+        full = json.loads(client.get('/api/mediamtx/changes?since=0', headers=AUTH_HEADER).data)
+
+        ApiKeyService.revoke_api_key(sample_api_key.id)
+
+        response = client.get(f'/api/mediamtx/changes?since={full["seq"]}', headers=AUTH_HEADER)
+        data = json.loads(response.data)
+        assert data['seq'] > full['seq']
+        assert [k['is_active'] for k in data['api_keys'] if k['id'] == sample_api_key.id] == [False]
+        assert data['resync'] is False
+
+
+class TestChangeFeedPruning:
+    """Test pruning old changes and resyncing readers that fell behind them"""
+
+    def age_changes(self, hours):
+        AuthChange.query.update({AuthChange.created_at: datetime.utcnow() - timedelta(hours=hours)})
+        db.session.flush()
+
+    def test_prune_keeps_newest(self, db_session, sample_customer):
+        """Test old changes are deleted in batches except the newest, so the sequence never goes back"""
+        for i in range(3):
+            ApiKeyService.create_api_key(customer_id=sample_customer.id, name=f'Key {i}')
+        count, seq = AuthChange.query.count(), ChangeFeedService.current_seq()
+        self.age_changes(200)
+
+        assert ChangeFeedService.prune(timedelta(hours=168), batch_size=2) == count - 1
+        assert [change.id for change in AuthChange.query.all()] == [seq]
+
+        ApiKeyService.create_api_key(customer_id=sample_customer.id, name='Recent')
+        assert ChangeFeedService.prune(timedelta(hours=168)) == 1
+        assert ChangeFeedService.prune(timedelta(hours=168)) == 0
+        assert min(change.id for change in AuthChange.query.all()) > seq
+
+    def test_resync_when_pruned_past(self, client, db_session, sample_customer):
+        """Test a reader behind the oldest kept change is told to resync in full"""
+        for i in range(3):
+            ApiKeyService.create_api_key(customer_id=sample_customer.id, name=f'Key {i}')
+        seq = ChangeFeedService.current_seq()
+        self.age_changes(200)
+        ChangeFeedService.prune(timedelta(hours=168))
+
+        behind = json.loads(client.get('/api/mediamtx/changes?since=1', headers=AUTH_HEADER).data)
+        current = json.loads(client.get(f'/api/mediamtx/changes?since={seq}', headers=AUTH_HEADER).data)
+
+        assert behind['resync'] is True
+        assert current['resync'] is False
+
+
+class TestEdgeReplica:
+    """Test the edge sidecar replica and auth endpoint"""
+
+    def test_edge_authenticates_locally(self, db_session, sample_api_key, edge):
+        """Test the edge answers auth from its replica"""
+        replica = edge.extensions['edge_replica']
+        replica.sync_once()
+
+        response = edge.test_client().post('/api/mediamtx/auth', json={
+            'action': 'publish',
+            'path': 'test/stream',
+            'query': f'api_key={sample_api_key._plaintext}',
+            'ip': '10.0.0.1'
+        })
+
+        assert response.status_code == 200
+        assert json.loads(response.data)['customer_id'] == sample_api_key.customer_id
+
+    def test_edge_not_ready_before_sync(self, db_session, edge):
+        """Test the edge refuses auth until the first full sync"""
+        response = edge.test_client().post('/api/mediamtx/auth', json={
+            'action': 'read', 'query': 'api_key=mtx_x', 'ip': '10.0.0.1'
+        })
+
+        assert response.status_code == 503
+
+    def test_replica_applies_incremental_changes(self, db_session, sample_customer, fetch):
+        """Test revocations and customer deactivation reach the replica"""
+        api_key, plaintext = ApiKeyService.create_api_key(
+            customer_id=sample_customer.id, name='Edge Key', can_read=True
+        )
+        replica = EdgeReplica(fetch)
+        replica.sync_once()
+        key_hash = api_key.key_hash
+        assert replica.lookup(key_hash) is not None
+
+        CustomerService.update_customer(sample_customer.id, name='Renamed')
+        replica.sync_once()
+        assert replica.lookup(key_hash).customer.name == 'Renamed'
+
+        ApiKeyService.revoke_api_key(api_key.id)
+        replica.sync_once()
+        assert replica.lookup(key_hash) is None
+
+    def test_replica_drops_deleted_customer(self, db_session, sample_api_key, fetch):
+        """Test deleting a customer removes their keys from the replica"""
+        replica = EdgeReplica(fetch)
+        replica.sync_once()
+
+        CustomerService.delete_customer(sample_api_key.customer_id)
+        replica.sync_once()
+
+        assert replica.lookup(sample_api_key.key_hash) is None
+
+    def test_replica_resyncs_when_pruned_past(self, db_session, sample_customer, fetch):
+        """Test a replica behind the pruned feed starts over with a full sync"""
+        old_key, _ = ApiKeyService.create_api_key(customer_id=sample_customer.id, name='Old')
+        replica = EdgeReplica(fetch)
+        replica.sync_once()
+
+        ApiKeyService.revoke_api_key(old_key.id)
+        new_key, _ = ApiKeyService.create_api_key(customer_id=sample_customer.id, name='New')
+        AuthChange.query.update({AuthChange.created_at: datetime.utcnow() - timedelta(hours=200)})
+        ChangeFeedService.prune(timedelta(hours=168))
+
+        assert replica.sync_once() is True
+        assert replica.lookup(old_key.key_hash) is None
+        assert replica.lookup(new_key.key_hash) is not None
+        assert replica.sync_once() is False
@@ -66,6 +66,45 @@ class TestMediaMTXAuth:
         data = json.loads(response.data)
         assert 'error' in data
 
+    def test_key_id_out_of_range_rejected(self, client, db_session):
+        """Test a key whose id overflows the id column is denied, not a server error"""
+        from app.models.api_key import ApiKey
+        key = ApiKey.format_key(2 ** 63, ApiKey.generate_secret())
+
+        single = client.post('/api/mediamtx/auth', json={
+            'action': 'read', 'path': 'test/stream', 'query': f'api_key={key}', 'ip': '127.0.0.1'
+        })
+        batch = client.post('/api/mediamtx/auth/batch', json={'items': [
+            {'key': key, 'action': 'read', 'path': 'a', 'ip': '127.0.0.1'},
+        ]})
+
+        assert single.status_code == 401
+        assert [r['status'] for r in json.loads(batch.data)['results']] == [401]
+        assert ApiKeyService.verify_api_key(key) is None
+        assert ApiKeyService.verify_api_keys([key]) == {}
+
+    def test_malformed_key_rejected_without_lookup(self, client, db_session, sample_api_key, monkeypatch):
+        """Test truncated keys are rejected before hashing and counted separately"""
+        from app.metrics import metrics
+        from app.models.api_key import ApiKey
+        metrics.reset()
+
+        def no_hashing(key):
+            raise AssertionError('malformed key was hashed')
+        monkeypatch.setattr(ApiKey, 'hash_key', staticmethod(no_hashing))
+
+        response = client.post('/api/mediamtx/auth', json={
+            'action': 'read',
+            'path': 'test/stream',
+            'query': f'api_key={sample_api_key._plaintext[:-2]}',
+            'ip': '127.0.0.1'
+        })
+
+        assert response.status_code == 401
+        assert json.loads(response.data)['error'] == 'Malformed API key'
+        assert metrics.value('mtxman_auth_rejections_total', reason='malformed') == 1
+        assert metrics.value('mtxman_auth_rejections_total', reason='unknown_key') is None
+
     def test_auth_with_no_key(self, client, db_session):
         """Test authentication without API key"""
         response = client.post('/api/mediamtx/auth', json={
@@ -152,3 +191,159 @@ class TestMediaMTXAuth:
         assert response.status_code == 200
         data = json.loads(response.data)
         assert data['received'] is True
+
+
+class TestMediaMTXDegradedMode:
+    """Test MediaMTX auth when the database is unavailable"""
+
+    @pytest.fixture(autouse=True)
+    def snapshot(self, app):
+        from app.services.key_snapshot import key_snapshot
+        key_snapshot.clear()
+        yield key_snapshot
+        key_snapshot.clear()
+        key_snapshot.retry_interval = app.config['AUTH_DEGRADED_RETRY_SECONDS']
+        key_snapshot.latency_budget = app.config['AUTH_DB_LATENCY_BUDGET_MS'] / 1000.0
+
+    @pytest.fixture
+    def database_down(self, monkeypatch):
+        from sqlalchemy.exc import OperationalError
+
+        def fail(plaintext_key):
+            raise OperationalError('SELECT', {}, Exception('connection refused'))
+
+        monkeypatch.setattr(ApiKeyService, 'verify_api_key', staticmethod(fail))
+
+    def test_read_served_from_snapshot(self, client, db_session, sample_api_key, snapshot, database_down):
+        """Test read access falls back to the last-known-good snapshot"""
+        snapshot.refresh()
+
+        response = client.post('/api/mediamtx/auth', json={
+            'action': 'read',
+            'path': 'test/stream',
+            'query': f'api_key={sample_api_key._plaintext}',
+            'ip': '127.0.0.1'
+        })
+
+        assert response.status_code == 200
+        data = json.loads(response.data)
+        assert data['degraded'] is True
+        assert snapshot.is_degraded() is True
+
+    def test_publish_fails_closed(self, client, db_session, sample_api_key, snapshot, database_down):
+        """Test publish is refused while degraded"""
+        snapshot.refresh()
+
+        response = client.post('/api/mediamtx/auth', json={
+            'action': 'publish',
+            'path': 'test/stream',
+            'query': f'api_key={sample_api_key._plaintext}',
+            'ip': '127.0.0.1'
+        })
+
+        assert response.status_code == 503
+
+    def test_unknown_key_denied_while_degraded(self, client, db_session, snapshot, database_down):
+        """Test keys missing from the snapshot are denied"""
+        response = client.post('/api/mediamtx/auth', json={
+            'action': 'read',
+            'path': 'test/stream',
+            'query': 'api_key=mtx_notinsnap00',
+            'ip': '127.0.0.1'
+        })
+
+        assert response.status_code == 401
+
+    def test_recovers_after_retry_interval(self, client, db_session, sample_api_key, snapshot):
+        """Test auth goes back to the database once it is healthy"""
+        snapshot.retry_interval = 0
+        snapshot.mark_degraded('error')
+
+        response = client.post('/api/mediamtx/auth', json={
+            'action': 'publish',
+            'path': 'test/stream',
+            'query': f'api_key={sample_api_key._plaintext}',
+            'ip': '127.0.0.1'
+        })
+
+        assert response.status_code == 200
+        assert json.loads(response.data)['degraded'] is False
+
+    def test_slow_batch_lookup_degrades(self, client, db_session, sample_api_key, snapshot, monkeypatch):
+        """Test a batch lookup over the latency budget sends the next batches to the snapshot"""
+        snapshot.refresh()
+        snapshot.latency_budget = -1
+        items = [
+            {'key': sample_api_key._plaintext, 'action': 'read', 'path': 'a', 'ip': '10.0.0.1'},
+            {'key': sample_api_key._plaintext, 'action': 'publish', 'path': 'a', 'ip': '10.0.0.1'},
+        ]
+
+        first = client.post('/api/mediamtx/auth/batch', json={'items': items})
+        assert [r['status'] for r in json.loads(first.data)['results']] == [200, 200]
+        assert snapshot.is_degraded() is True
+
+        def fail(plaintext_keys):
+            raise AssertionError('database queried while degraded')
+
+        monkeypatch.setattr(ApiKeyService, 'verify_api_keys', staticmethod(fail))
+        second = client.post('/api/mediamtx/auth/batch', json={'items': items})
+        assert [r['status'] for r in json.loads(second.data)['results']] == [200, 503]
+
+    def test_metrics_report_snapshot_age(self, client, db_session, snapshot):
+        """Test snapshot staleness is exposed as a metric"""
+        snapshot.refresh()
+
+        response = client.get('/api/metrics')
+
+        assert response.status_code == 200
+        assert b'mtxman_auth_snapshot_age_seconds' in response.data
+        assert b'mtxman_auth_degraded 0' in response.data
+
+
+class TestMediaMTXBatchAuth:
+    """Test MediaMTX batch authentication endpoint"""
+
+    def test_batch_decisions_in_order(self, client, db_session, sample_customer):
+        """Test each item gets the decision the single endpoint would give"""
+        _, read_only = ApiKeyService.create_api_key(
+            customer_id=sample_customer.id, name='Read Key', can_publish=False, can_read=True
+        )
+        _, publisher = ApiKeyService.create_api_key(
+            customer_id=sample_customer.id, name='Publish Key', can_publish=True, can_read=True
+        )
+
+        response = client.post('/api/mediamtx/auth/batch', json={'items': [
+            {'key': read_only, 'action': 'read', 'path': 'a', 'ip': '10.0.0.1'},
+            {'key': read_only, 'action': 'publish', 'path': 'a', 'ip': '10.0.0.1'},
+            {'query': f'api_key={publisher}', 'action': 'publish', 'path': 'b', 'ip': '10.0.0.2'},
+            {'key': 'mtx_unknown0000', 'action': 'read', 'path': 'c', 'ip': '10.0.0.3'},
+            {'key': read_only[:-1], 'action': 'read', 'path': 'c', 'ip': '10.0.0.3'},
+            {'action': 'read', 'path': 'd', 'ip': '10.0.0.4'},
+        ]})
+
+        assert response.status_code == 200
+        statuses = [r['status'] for r in json.loads(response.data)['results']]
+        assert statuses == [200, 403, 200, 401, 401, 401]
+
+    def test_batch_records_usage(self, client, db_session, sample_api_key):
+        """Test verified keys get last_used_at set"""
+        client.post('/api/mediamtx/auth/batch', json={'items': [
+            {'key': sample_api_key._plaintext, 'action': 'read'},
+        ]})
+
+        db_session.refresh(sample_api_key)
+        assert sample_api_key.last_used_at is not None
+
+    def test_batch_rejects_invalid_payload(self, client, db_session):
+        """Test a payload without an items list is rejected"""
+        response = client.post('/api/mediamtx/auth/batch', json={'key': 'mtx_x'})
+
+        assert response.status_code == 400
+
+    def test_batch_rejects_too_many_items(self, client, app, db_session, monkeypatch):
+        """Test oversized batches are refused"""
+        monkeypatch.setitem(app.config, 'BATCH_AUTH_MAX_ITEMS', 2)
+
+        response = client.post('/api/mediamtx/auth/batch', json={'items': [{}, {}, {}]})
+
+        assert response.status_code == 413
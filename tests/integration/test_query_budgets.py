@@ -0,0 +1,113 @@
+# ABOUTME: Integration tests holding routes to SQL query budgets
+# ABOUTME: Fails when a route starts running more statements or repeats one per row (N+1)
+
+from flask import g
+from app.models.customer import Customer
+from app.services.api_key_service import ApiKeyService
+
+
+def login(client, user):
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user.id)
+        session['_fresh'] = True
+
+
+def get(client, url):
+    # Requests share the test's app context, so drop the user Flask-Login kept on g
+    g.pop('_login_user', None)
+    return client.get(url)
+
+
+class TestMediaMTXBudgets:
+    """Test MediaMTX endpoint budgets"""
+
+    def test_auth(self, client, db_session, sample_customer, query_budget):
+        """Test an auth call: key, customer and the usage timestamp"""
+        _, plaintext = ApiKeyService.create_api_key(customer_id=sample_customer.id, name='Budget')
+
+        with query_budget(4):
+            response = client.post('/api/mediamtx/auth', json={'action': 'read', 'query': f'api_key={plaintext}'})
+
+        assert response.status_code == 200
+        assert 'db;dur=' in response.headers['Server-Timing']
+
+
+class TestRestApiBudgets:
+    """Test REST API budgets"""
+
+    def test_list_customers(self, client, db_session, sample_admin, query_budget):
+        """Test the customer list costs the same for many customers"""
+        for i in range(10):
+            db_session.add(Customer(name=f'Customer {i}', email=f'c{i}@example.com'))
+        db_session.commit()
+        login(client, sample_admin)
+
+        with query_budget(3):
+            assert get(client, '/api/api/v1/customers').status_code == 200
+
+    def test_customer_keys(self, client, db_session, sample_admin, sample_customer, query_budget):
+        """Test listing a customer's keys"""
+        for i in range(10):
+            ApiKeyService.create_api_key(customer_id=sample_customer.id, name=f'Key {i}')
+        url = f'/api/api/v1/customers/{sample_customer.id}/keys'
+        login(client, sample_admin)
+
+        with query_budget(3):
+            assert get(client, url).status_code == 200
+
+
+class TestAdminPageBudgets:
+    """Test admin page budgets"""
+
+    def add_customers(self, db_session, count):
+        for i in range(count):
+            customer = Customer(name=f'Customer {i}', email=f'c{i}@example.com')
+            db_session.add(customer)
+            db_session.commit()
+            ApiKeyService.create_api_key(customer_id=customer.id, name='Key')
+
+    def test_dashboard(self, client, db_session, sample_admin, query_budget):
+        """Test the dashboard reads its rows with key counts and the counters, however many customers exist"""
+        self.add_customers(db_session, 15)
+        login(client, sample_admin)
+
+        with query_budget(3):
+            response = get(client, '/api/dashboard')
+
+        assert response.status_code == 200
+        assert b'Customer 14' in response.data
+        assert b'Customer 4' not in response.data  # only the newest ten
+
+    def test_customer_list(self, client, db_session, sample_admin, query_budget):
+        """Test the customer list counts keys in the same query as the customers"""
+        self.add_customers(db_session, 15)
+        login(client, sample_admin)
+
+        with query_budget(2):
+            response = get(client, '/api/customers')
+
+        assert response.status_code == 200
+        assert response.data.count(b'1 (1 active)') == 15
+
+    def test_unchanged_customer_not_loaded(self, client, db_session, sample_admin, sample_api_key, query_budget):
+        """Test a conditional GET of an unchanged customer reads only its versions"""
+        url = f'/api/api/v1/customers/{sample_api_key.customer_id}'
+        login(client, sample_admin)
+        etag = get(client, url).headers['ETag']
+
+        with query_budget(2):
+            g.pop('_login_user', None)
+            response = client.get(url, headers={'If-None-Match': etag})
+
+        assert response.status_code == 304
+
+    def test_customer_search(self, client, db_session, sample_admin, query_budget):
+        """Test a search page reads matches, their key counts and matching keys once each"""
+        self.add_customers(db_session, 15)
+        login(client, sample_admin)
+
+        with query_budget(4):
+            response = get(client, '/api/customers?q=customer')
+
+        assert response.status_code == 200
+        assert response.data.count(b'1 (1 active)') == 15
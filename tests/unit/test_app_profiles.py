@@ -0,0 +1,50 @@
+# ABOUTME: Unit tests for the create_app profiles
+# ABOUTME: Tests the auth-only profile registers only MediaMTX routes and skips admin-only imports
+
+import json
+import os
+import subprocess
+import sys
+import pytest
+from app import create_app
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# A fresh interpreter, since the test session has already imported the full app
+AUTH_PROFILE_PROBE = '''
+import json, sys
+from app import create_app
+app = create_app('testing', 'auth')
+print(json.dumps({
+    'rules': sorted(rule.rule for rule in app.url_map.iter_rules()),
+    'modules': sorted({name.split('.')[0] for name in sys.modules}),
+}))
+'''
+
+
+class TestAppProfiles:
+    """Test create_app profiles"""
+
+    def test_auth_profile(self):
+        """Test the auth profile serves MediaMTX endpoints without admin modules"""
+        result = subprocess.run([sys.executable, '-c', AUTH_PROFILE_PROBE], cwd=ROOT,
+                                capture_output=True, text=True, check=True)
+        probe = json.loads(result.stdout.strip().splitlines()[-1])
+
+        assert '/api/mediamtx/auth' in probe['rules']
+        assert '/api/metrics' in probe['rules']
+        assert not any(rule.startswith(('/auth', '/api/customers')) for rule in probe['rules'])
+        for module in ('flask_migrate', 'alembic', 'flask_wtf', 'wtforms', 'ldap3'):
+            assert module not in probe['modules']
+
+    def test_full_profile_routes(self, app):
+        """Test the default profile still serves the admin UI and MediaMTX"""
+        rules = {rule.rule for rule in app.url_map.iter_rules()}
+
+        assert {'/auth/login', '/api/customers', '/api/mediamtx/auth', '/api/metrics'} <= rules
+        assert app.config['APP_PROFILE'] == 'full'
+
+    def test_unknown_profile(self):
+        """Test a mistyped profile is rejected"""
+        with pytest.raises(ValueError, match='APP_PROFILE'):
+            create_app('testing', 'nope')
@@ -0,0 +1,188 @@
+# ABOUTME: Unit tests for connection pool sizing, instrumentation and the MediaMTX auth pool
+# ABOUTME: Tests pool metrics on SQLite file engines and which pool each blueprint uses in a fresh interpreter
+
+import json
+import os
+import subprocess
+import sys
+import pytest
+from flask import Flask
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from app import db
+from app.database import AUTH_BIND, InstrumentedQueuePool, RoutingSession, configure, instrument_pool
+from app.metrics import metrics
+from config import ProductionConfig
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def pooled_engine(app, tmp_path):
+    """An instrumented SQLite file engine with one pooled connection and no overflow"""
+    metrics.reset()
+    engine = create_engine(f"sqlite:///{tmp_path / 'pool.db'}", poolclass=InstrumentedQueuePool,
+                           metrics_name='probe', pool_size=1, max_overflow=0, pool_timeout=0.05,
+                           pool_pre_ping=True)
+    instrument_pool(engine)
+    yield engine
+    engine.dispose()
+
+
+class TestInstrumentedPool:
+    """Test pool metrics"""
+
+    def test_checkout_usage_and_age(self, pooled_engine):
+        """Test checkouts are timed and usage follows checkouts and checkins"""
+        with pooled_engine.connect() as conn:
+            conn.execute(text('SELECT 1'))
+            assert metrics.value('mtxman_db_pool_checked_out', pool='probe') == 1
+        assert metrics.value('mtxman_db_pool_checked_out', pool='probe') == 0
+
+        with pooled_engine.connect():
+            pass
+
+        assert metrics.value('mtxman_db_pool_size', pool='probe') == 1
+        assert metrics.value('mtxman_db_pool_checkout_seconds', pool='probe') == 2
+        assert metrics.value('mtxman_db_pool_connection_age_seconds', pool='probe') == 2
+
+    def test_exhausted_pool_times_out(self, pooled_engine):
+        """Test a checkout that gives up waiting is counted"""
+        with pooled_engine.connect():
+            with pytest.raises(PoolTimeoutError):
+                pooled_engine.connect()
+
+        assert metrics.value('mtxman_db_pool_checkout_timeouts_total', pool='probe') == 1
+
+    def test_pre_ping_failure_counted(self, pooled_engine):
+        """Test a dead pooled connection is found by the pre-ping and replaced"""
+        with pooled_engine.connect() as conn:
+            dbapi_connection = conn.connection.dbapi_connection
+        dbapi_connection.close()
+
+        with pooled_engine.connect() as conn:
+            assert conn.execute(text('SELECT 1')).scalar() == 1
+
+        assert metrics.value('mtxman_db_pool_pre_ping_failures_total', pool='probe') == 1
+
+    def test_name_survives_dispose(self, pooled_engine):
+        """Test the recreated pool keeps its metrics label"""
+        pooled_engine.dispose()
+
+        assert pooled_engine.pool.metrics_name == 'probe'
+        with pooled_engine.connect():
+            assert metrics.value('mtxman_db_pool_checked_out', pool='probe') == 1
+
+
+class TestPoolConfiguration:
+    """Test configure() pool options"""
+
+    def configured(self, **config):
+        app = Flask(__name__)
+        app.config.from_object(ProductionConfig)
+        app.config.update(DATABASE_REPLICA_URLS=[], SQLITE_PRODUCTION_MODE=False, **config)
+        configure(app)
+        return app.config
+
+    def test_postgres_gets_sized_pools(self):
+        """Test the default and auth binds get their own sizes and keep the production options"""
+        config = self.configured(SQLALCHEMY_DATABASE_URI='postgresql://db/mtxman', DATABASE_POOL_SIZE=8,
+                                 DATABASE_AUTH_POOL_SIZE=3, DATABASE_AUTH_MAX_OVERFLOW=2)
+        default = config['SQLALCHEMY_ENGINE_OPTIONS']
+        auth = config['SQLALCHEMY_BINDS'][AUTH_BIND]
+
+        assert (default['pool_size'], default['metrics_name'], default['pool_pre_ping']) == (8, 'default', True)
+        assert (auth['url'], auth['pool_size'], auth['max_overflow']) == ('postgresql://db/mtxman', 3, 2)
+        assert (auth['poolclass'], auth['metrics_name'], auth['pool_pre_ping']) == (InstrumentedQueuePool, 'auth', True)
+
+    def test_shared_pool_and_memory_database(self):
+        """Test no auth bind when disabled, and no pool options for in-memory SQLite"""
+        shared = self.configured(SQLALCHEMY_DATABASE_URI='postgresql://db/mtxman', DATABASE_AUTH_POOL_SIZE=0)
+        memory = self.configured(SQLALCHEMY_DATABASE_URI='sqlite://')
+
+        assert AUTH_BIND not in (shared.get('SQLALCHEMY_BINDS') or {})
+        assert AUTH_BIND not in (memory.get('SQLALCHEMY_BINDS') or {})
+        assert 'poolclass' not in memory['SQLALCHEMY_ENGINE_OPTIONS']
+
+
+class TestPoolBind:
+    """Test RoutingSession with a pool bind"""
+
+    def test_pool_bind_takes_all_but_routed_reads(self, app):
+        """Test the pool bind replaces the default bind, while the read bind still takes SELECTs"""
+        from sqlalchemy import select, update
+        from app.models.api_key import ApiKey
+
+        session = RoutingSession(db)
+        pool_bind, reader = object(), object()
+        session.info['pool_bind'] = pool_bind
+
+        assert session.get_bind(clause=select(ApiKey)) is pool_bind
+        assert session.get_bind(mapper=ApiKey.__mapper__) is pool_bind
+
+        session.info['read_bind'] = reader
+        assert session.get_bind(clause=select(ApiKey)) is reader
+        assert session.get_bind(clause=update(ApiKey).values(name='x')) is pool_bind
+        session.close()
+
+
+# A fresh interpreter on a SQLite file, counting checkouts per pool for an auth call and an admin page
+POOL_PROBE = '''
+import json
+from app import create_app, db
+from app.metrics import metrics
+from app.models.customer import Customer
+from app.models.user import User
+from app.services.api_key_service import ApiKeyService
+
+app = create_app('production')
+app.logger.disabled = True
+with app.app_context():
+    db.create_all()
+    db.session.add(User(username='admin', is_active=True, is_admin=True))
+    customer = Customer(name='Acme', email='ops@acme.test')
+    db.session.add(customer)
+    db.session.commit()
+    _, plaintext = ApiKeyService.create_api_key(customer_id=customer.id, name='Probe')
+    engines = sorted(key or 'default' for key in db.engines)
+
+client = app.test_client()
+with client.session_transaction(base_url='https://localhost') as session:
+    session['_user_id'] = '1'
+    session['_fresh'] = True
+
+def checkouts():
+    return {pool: metrics.value('mtxman_db_pool_checkout_seconds', pool=pool) or 0 for pool in ('default', 'auth')}
+
+before = checkouts()
+auth_status = client.post('/api/mediamtx/auth', json={'action': 'read', 'query': 'api_key=' + plaintext}).status_code
+after_auth = checkouts()
+admin_status = client.get('/api/customers', base_url='https://localhost').status_code
+after_admin = checkouts()
+print(json.dumps({
+    'engines': engines, 'auth_status': auth_status, 'admin_status': admin_status,
+    'auth_call': {pool: after_auth[pool] - before[pool] for pool in before},
+    'admin_page': {pool: after_admin[pool] - after_auth[pool] for pool in before},
+}))
+'''
+
+
+class TestAuthPool:
+    """Test the MediaMTX endpoints use their own pool"""
+
+    def test_auth_and_admin_use_separate_pools(self, tmp_path):
+        """Test an auth call checks out from the auth pool and an admin page from the default pool"""
+        env = dict(os.environ, DATABASE_URL=f"sqlite:///{tmp_path / 'pools.db'}", SQLITE_PRODUCTION_MODE='false',
+                   WARMUP_ON_START='false', EXPIRY_SWEEPER_ENABLED='false',
+                   AUTH_SNAPSHOT_REFRESHER_ENABLED='false')
+        env.pop('DATABASE_REPLICA_URLS', None)
+        result = subprocess.run([sys.executable, '-c', POOL_PROBE], cwd=ROOT, env=env,
+                                capture_output=True, text=True, check=True)
+        probe = json.loads(result.stdout.strip().splitlines()[-1])
+
+        assert probe['engines'] == ['auth', 'default']
+        assert (probe['auth_status'], probe['admin_status']) == (200, 200)
+        assert probe['auth_call']['default'] == 0
+        assert probe['auth_call']['auth'] >= 1
+        assert probe['admin_page']['auth'] == 0
+        assert probe['admin_page']['default'] >= 1
@@ -0,0 +1,145 @@
+# ABOUTME: Unit tests for the API key expiry sweeper and scheduler
+# ABOUTME: Tests batched deactivation, cache eviction, min-heap scheduling and change feed pruning
+
+from datetime import datetime, timedelta
+import pytest
+from app import db
+from app.models.auth_change import AuthChange
+from app.services.api_key_service import ApiKeyService
+from app.services.customer_service import CustomerService
+from app.services.expiry import ExpiryScheduler, ExpiryService
+from app.services.invalidation import invalidation_bus
+from app.services.key_snapshot import key_snapshot
+
+
+@pytest.fixture
+def scheduler(app):
+    scheduler = ExpiryScheduler()
+    scheduler.horizon = timedelta(hours=1)
+    invalidation_bus.subscribe(scheduler.on_changes)
+    yield scheduler
+    invalidation_bus._handlers.remove(scheduler.on_changes)
+
+
+def create_key(customer, name, expires_at):
+    api_key, plaintext = ApiKeyService.create_api_key(customer_id=customer.id, name=name)
+    api_key.expires_at = expires_at
+    db.session.commit()
+    return api_key, plaintext
+
+
+class TestExpiryService:
+    """Test ExpiryService"""
+
+    def test_expire_due_deactivates_in_batches(self, db_session, sample_customer):
+        """Test every expired key is deactivated and others are left alone"""
+        past = datetime.utcnow() - timedelta(minutes=1)
+        expired = [create_key(sample_customer, f'Old {i}', past)[0] for i in range(5)]
+        current, _ = create_key(sample_customer, 'Current', datetime.utcnow() + timedelta(days=1))
+
+        assert ExpiryService.expire_due(batch_size=2) == 5
+        assert ExpiryService.expire_due(batch_size=2) == 0
+
+        db_session.expire_all()
+        assert not any(key.is_active for key in expired)
+        assert current.is_active is True
+
+    def test_expiry_evicts_from_snapshot_and_feeds_edges(self, db_session, sample_customer):
+        """Test bulk deactivation is published like an ORM change"""
+        api_key, plaintext = create_key(sample_customer, 'Soon', datetime.utcnow() + timedelta(hours=1))
+        key_snapshot.refresh()
+        assert key_snapshot.find(plaintext) is not None
+
+        ExpiryService.expire_keys([api_key.id], now=datetime.utcnow() + timedelta(hours=2))
+
+        assert key_snapshot.find(plaintext) is None
+        assert AuthChange.query.filter_by(entity='api_key', entity_id=api_key.id).count() >= 2
+        key_snapshot.clear()
+
+    def test_expiry_bumps_keys_version(self, db_session, sample_customer):
+        """Test bulk deactivation changes the customer's keys ETag version"""
+        api_key, _ = create_key(sample_customer, 'Soon', datetime.utcnow() + timedelta(hours=1))
+        version, keys_version = CustomerService.get_versions(sample_customer.id)
+
+        ExpiryService.expire_keys([api_key.id], now=datetime.utcnow() + timedelta(hours=2))
+
+        assert CustomerService.get_versions(sample_customer.id) == (version, keys_version + 1)
+
+
+    @pytest.mark.parametrize('returning', [True, False])
+    def test_concurrent_sweep_expires_once(self, db_session, sample_customer, monkeypatch, returning):
+        """Test a key another sweeper already expired is not counted or published again"""
+        from app.services.stats_service import StatsService
+        monkeypatch.setattr(db.session.get_bind().dialect, 'update_returning', returning)
+        past = datetime.utcnow() - timedelta(minutes=1)
+        first, _ = create_key(sample_customer, 'First', past)
+        second, _ = create_key(sample_customer, 'Second', past)
+        active = StatsService.get_counters()['active_api_keys']
+
+        assert ExpiryService.expire_keys([first.id], past + timedelta(minutes=1)) == 1
+        seq = AuthChange.query.count()
+        assert ExpiryService.expire_keys([first.id, second.id], past + timedelta(minutes=1)) == 1
+        assert ExpiryService.expire_keys([first.id, second.id], past + timedelta(minutes=1)) == 0
+
+        assert StatsService.get_counters()['active_api_keys'] == active - 2
+        assert [c.entity_id for c in AuthChange.query.order_by(AuthChange.id).offset(seq)] == [second.id]
+
+
+class TestExpiryScheduler:
+    """Test ExpiryScheduler"""
+
+    def test_expires_keys_at_their_instant(self, db_session, sample_customer, scheduler):
+        """Test keys are expired in expires_at order as time passes"""
+        now = datetime.utcnow()
+        first, _ = create_key(sample_customer, 'First', now + timedelta(minutes=5))
+        second, _ = create_key(sample_customer, 'Second', now + timedelta(minutes=10))
+        create_key(sample_customer, 'Later', now + timedelta(days=2))
+
+        assert scheduler.run_pending(now) == pytest.approx(300, abs=1)
+        assert len(scheduler._heap) == 2
+
+        assert scheduler.run_pending(now + timedelta(minutes=5)) == pytest.approx(300, abs=1)
+        db_session.expire_all()
+        assert first.is_active is False
+        assert second.is_active is True
+
+        assert scheduler.run_pending(now + timedelta(minutes=10)) is None
+        db_session.expire_all()
+        assert second.is_active is False
+
+    def test_schedules_keys_created_later(self, db_session, sample_customer, scheduler):
+        """Test new keys reach the heap through invalidation messages"""
+        now = datetime.utcnow()
+        assert scheduler.run_pending(now) is None
+
+        create_key(sample_customer, 'New', now + timedelta(minutes=1))
+
+        assert scheduler.run_pending(now) == pytest.approx(60, abs=1)
+
+    def test_stale_entries_do_not_expire_extended_keys(self, db_session, sample_customer, scheduler):
+        """Test a key extended after scheduling stays active"""
+        now = datetime.utcnow()
+        api_key, _ = create_key(sample_customer, 'Extended', now + timedelta(minutes=1))
+        scheduler.run_pending(now)
+
+        api_key.expires_at = now + timedelta(days=30)
+        db_session.commit()
+        scheduler.run_pending(now + timedelta(minutes=2))
+
+        db_session.expire_all()
+        assert api_key.is_active is True
+
+    def test_prunes_change_feed_hourly(self, db_session, sample_customer, scheduler):
+        """Test the sweeper prunes old changes at most once per prune interval"""
+        now = datetime.utcnow()
+        create_key(sample_customer, 'First', None)
+        create_key(sample_customer, 'Second', None)
+        AuthChange.query.update({AuthChange.created_at: now - timedelta(days=8)})
+        db_session.commit()
+
+        assert scheduler.prune_changes(now) > 0
+        create_key(sample_customer, 'Third', None)
+        AuthChange.query.update({AuthChange.created_at: now - timedelta(days=8)})
+        db_session.commit()
+        assert scheduler.prune_changes(now + timedelta(minutes=30)) == 0
+        assert scheduler.prune_changes(now + timedelta(hours=1)) > 0
@@ -0,0 +1,169 @@
+# ABOUTME: Unit tests for the cache invalidation bus and its transports
+# ABOUTME: Tests commit-driven publishing, sequence gap detection and snapshot eviction
+
+import json
+import threading
+import pytest
+from app.models.api_key import ApiKey
+from app.services.api_key_service import ApiKeyService
+from app.services.invalidation import (
+    InvalidationBus, InProcessTransport, UnixDatagramTransport, invalidation_bus
+)
+from app.services.key_snapshot import key_snapshot
+
+
+@pytest.fixture
+def received():
+    """Record changes delivered by the global bus"""
+    changes = []
+    invalidation_bus.subscribe(changes.extend)
+    yield changes
+    invalidation_bus._handlers.remove(changes.extend)
+
+
+def make_bus(hub):
+    bus = InvalidationBus()
+    bus.transport = InProcessTransport(hub)
+    bus.ensure_started()
+    return bus
+
+
+class TestInvalidationBus:
+    """Test InvalidationBus"""
+
+    def test_commit_publishes_key_change(self, db_session, sample_api_key, received):
+        """Test committing an API key change publishes it"""
+        ApiKeyService.revoke_api_key(sample_api_key.id)
+
+        assert ('api_key', sample_api_key.id, 'upsert') in received
+
+    def test_rollback_publishes_nothing(self, db_session, sample_api_key, received):
+        """Test rolled back changes are not published"""
+        sample_api_key.name = 'Renamed'
+        db_session.flush()
+        db_session.rollback()
+
+        assert received == []
+
+    def test_last_used_update_not_published(self, db_session, sample_api_key, received):
+        """Test recording key usage is not treated as a key change"""
+        sample_api_key.update_last_used()
+
+        assert received == []
+
+    def test_message_reaches_other_bus(self):
+        """Test a message published on one bus is delivered to another"""
+        hub = []
+        sender, receiver = make_bus(hub), make_bus(hub)
+        changes = []
+        receiver.subscribe(changes.extend)
+
+        sender.publish([('api_key', 7, 'upsert')])
+
+        assert changes == [('api_key', 7, 'upsert')]
+
+    def test_sequence_gap_requests_full_refresh(self):
+        """Test a missed message triggers a full refresh"""
+        hub = []
+        sender, receiver = make_bus(hub), make_bus(hub)
+        refreshes = []
+        receiver.on_full_refresh(lambda: refreshes.append(True))
+
+        sender.publish([('api_key', 1, 'upsert')])
+        receiver._receive(json.dumps({'origin': sender.origin, 'seq': 5, 'changes': []}))
+
+        assert refreshes == [True]
+
+    def test_failing_handler_does_not_stop_others(self):
+        """Test a subscriber that raises is logged and the remaining subscribers still run"""
+        hub = []
+        sender, receiver = make_bus(hub), make_bus(hub)
+        changes = []
+
+        def broken(changes):
+            raise RuntimeError('subscriber failed')
+
+        receiver.subscribe(broken)
+        receiver.subscribe(changes.extend)
+        sender.publish([('api_key', 3, 'upsert')])
+
+        assert changes == [('api_key', 3, 'upsert')]
+
+    def test_revoke_evicts_key_from_snapshot(self, db_session, sample_api_key):
+        """Test revoking a key removes it from the auth snapshot"""
+        key_hash = ApiKey.hash_key(sample_api_key._plaintext)
+        key_snapshot.refresh()
+        assert key_snapshot.lookup(key_hash) is not None
+
+        ApiKeyService.revoke_api_key(sample_api_key.id)
+
+        assert key_snapshot.lookup(key_hash) is None
+        key_snapshot.clear()
+
+
+class TestUnixDatagramTransport:
+    """Test UnixDatagramTransport"""
+
+    def test_delivers_between_workers(self, tmp_path):
+        """Test datagrams reach the other worker's socket"""
+        delivered = threading.Event()
+        payloads = []
+
+        def deliver(payload):
+            payloads.append(payload)
+            delivered.set()
+
+        sender = UnixDatagramTransport(str(tmp_path))
+        receiver = UnixDatagramTransport(str(tmp_path))
+        sender.start(lambda payload: None, lambda: None)
+        receiver.start(deliver, lambda: None)
+        try:
+            sender.publish('{"seq": 1}')
+            assert delivered.wait(2)
+            assert payloads == ['{"seq": 1}']
+        finally:
+            sender.close()
+            receiver.close()
+
+    def test_full_receiver_does_not_block(self, tmp_path):
+        """Test publishing drops datagrams for a socket nobody reads instead of blocking"""
+        import socket
+        from app.metrics import metrics
+        stuck = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        stuck.bind(str(tmp_path / 'stuck.sock'))
+        sender = UnixDatagramTransport(str(tmp_path))
+        sender.start(lambda payload: None, lambda: None)
+        before = metrics.value('mtxman_invalidation_dropped_total') or 0
+        try:
+            done = threading.Thread(target=lambda: [sender.publish('x' * 1000) for _ in range(500)], daemon=True)
+            done.start()
+            done.join(5)
+            assert not done.is_alive()
+            assert (metrics.value('mtxman_invalidation_dropped_total') or 0) > before
+        finally:
+            sender.close()
+            stuck.close()
+
+    def test_receiver_survives_failing_delivery(self, tmp_path):
+        """Test an exception while handling one datagram does not end the receive thread"""
+        delivered = threading.Event()
+        payloads = []
+
+        def deliver(payload):
+            if payload == 'bad':
+                raise RuntimeError('handler failed')
+            payloads.append(payload)
+            delivered.set()
+
+        sender = UnixDatagramTransport(str(tmp_path))
+        receiver = UnixDatagramTransport(str(tmp_path))
+        sender.start(lambda payload: None, lambda: None)
+        receiver.start(deliver, lambda: None)
+        try:
+            sender.publish('bad')
+            sender.publish('good')
+            assert delivered.wait(2)
+            assert payloads == ['good']
+        finally:
+            sender.close()
+            receiver.close()
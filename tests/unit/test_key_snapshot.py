@@ -0,0 +1,187 @@
+# ABOUTME: Unit tests for the last-known-good API key snapshot
+# ABOUTME: Tests snapshot loading, change feed catch-up, persistence, policy parsing and degraded state
+
+import pytest
+from app.models.api_key import ApiKey
+from app.services.api_key_service import ApiKeyService
+from app.services.key_snapshot import KeySnapshot, SnapshotKey, parse_policy
+
+
+class TestKeySnapshot:
+    """Test KeySnapshot"""
+
+    def test_refresh_loads_active_keys(self, app, db_session, sample_api_key):
+        """Test snapshot contains active keys with their customer"""
+        snapshot = KeySnapshot()
+        snapshot.refresh()
+
+        entry = snapshot.lookup(ApiKey.hash_key(sample_api_key._plaintext))
+        assert entry is not None
+        assert entry.id == sample_api_key.id
+        assert entry.customer.email == sample_api_key.customer.email
+        assert entry.is_valid() is True
+        assert snapshot.age_seconds() is not None
+
+    def test_find_by_embedded_id(self, app, db_session, sample_api_key):
+        """Test plaintext lookups go through the id index and check the hash"""
+        snapshot = KeySnapshot()
+        snapshot.refresh()
+
+        assert snapshot.find(sample_api_key._plaintext).id == sample_api_key.id
+        assert snapshot.find(ApiKey.format_key(sample_api_key.id, ApiKey.generate_secret())) is None
+
+    def test_refresh_skips_revoked_keys(self, app, db_session, sample_api_key):
+        """Test revoked keys are not in the snapshot"""
+        ApiKeyService.revoke_api_key(sample_api_key.id)
+
+        snapshot = KeySnapshot()
+        snapshot.refresh()
+
+        assert snapshot.lookup(ApiKey.hash_key(sample_api_key._plaintext)) is None
+
+    def test_preload_adds_to_snapshot(self, app, db_session, sample_api_key):
+        """Test preloading keys by id marks the snapshot loaded and keeps existing entries"""
+        other, plaintext = ApiKeyService.create_api_key(customer_id=sample_api_key.customer_id, name='Other')
+        snapshot = KeySnapshot()
+
+        assert snapshot.preload([sample_api_key.id]) == 1
+        assert snapshot.age_seconds() is not None
+        assert snapshot.find(plaintext) is None
+
+        assert snapshot.preload([other.id]) == 1
+        assert snapshot.find(plaintext).id == other.id
+        assert snapshot.find(sample_api_key._plaintext).id == sample_api_key.id
+
+    def test_catch_up_applies_feed_in_place(self, app, db_session, sample_api_key):
+        """Test a refresh reloads only changed keys from the change feed, in the existing dicts"""
+        snapshot = KeySnapshot()
+        snapshot.settle_seconds = 0
+        snapshot.refresh()
+        keys, by_id, seq = snapshot._keys, snapshot._by_id, snapshot._seq
+
+        new_key, plaintext = ApiKeyService.create_api_key(customer_id=sample_api_key.customer_id, name='New')
+        ApiKeyService.revoke_api_key(sample_api_key.id)
+        snapshot.catch_up()
+
+        assert snapshot._keys is keys and snapshot._by_id is by_id
+        assert snapshot.find(plaintext).id == new_key.id
+        assert snapshot.find(sample_api_key._plaintext) is None
+        assert snapshot._seq > seq
+
+    def test_catch_up_fills_partial_warm_up(self, app, db_session, sample_api_key):
+        """Test keys a warm-up did not preload are added in place by the next refresh"""
+        other, plaintext = ApiKeyService.create_api_key(customer_id=sample_api_key.customer_id, name='Other')
+        snapshot = KeySnapshot()
+        snapshot.preload([sample_api_key.id])
+        keys = snapshot._keys
+
+        snapshot.catch_up()
+
+        assert snapshot._keys is keys
+        assert snapshot.find(plaintext).id == other.id
+        assert snapshot.find(sample_api_key._plaintext).id == sample_api_key.id
+
+    def test_catch_up_rebuilds_when_feed_pruned(self, app, db_session, sample_api_key):
+        """Test a snapshot behind the pruned change feed is rebuilt in full"""
+        from datetime import timedelta
+        from app.services.change_feed import ChangeFeedService
+        snapshot = KeySnapshot()
+        snapshot.refresh()
+        keys = snapshot._keys
+
+        ApiKeyService.create_api_key(customer_id=sample_api_key.customer_id, name='Other')
+        snapshot._seq = 0
+        assert ChangeFeedService.prune(timedelta(0)) > 0
+        snapshot.catch_up()
+
+        assert snapshot._keys is not keys
+        assert len(snapshot._keys) == 2
+
+    def test_persisted_snapshot_is_loaded(self, app, db_session, sample_api_key, tmp_path):
+        """Test a new snapshot loads last-known-good data from disk"""
+        path = str(tmp_path / 'snapshot.json')
+        snapshot = KeySnapshot()
+        snapshot.path = path
+        snapshot.refresh()
+
+        restarted = KeySnapshot()
+        restarted.path = path
+        entry = restarted.lookup(ApiKey.hash_key(sample_api_key._plaintext))
+
+        assert entry is not None
+        assert entry.can_publish is True
+        assert entry.customer.id == sample_api_key.customer_id
+
+    def test_save_survives_concurrent_eviction(self, app, db_session, sample_api_key, tmp_path, monkeypatch):
+        """Test keys evicted while the snapshot is being saved do not break the save"""
+        other, _ = ApiKeyService.create_api_key(customer_id=sample_api_key.customer_id, name='Other')
+        snapshot = KeySnapshot()
+        snapshot.refresh()
+        snapshot.path = str(tmp_path / 'snapshot.json')
+        to_dict = SnapshotKey.to_dict
+
+        def evicting_to_dict(key):
+            snapshot.invalidate([('api_key', other.id, 'upsert')])
+            return to_dict(key)
+
+        monkeypatch.setattr(SnapshotKey, 'to_dict', evicting_to_dict)
+        snapshot._save_file()
+
+        assert (tmp_path / 'snapshot.json').exists()
+        assert snapshot.find(sample_api_key._plaintext) is not None
+
+    def test_saves_through_own_temp_file(self, app, db_session, sample_api_key, tmp_path, monkeypatch):
+        """Test each save writes a unique temp file in the snapshot's directory and leaves none behind"""
+        import tempfile
+        temp_files = []
+        mkstemp = tempfile.mkstemp
+
+        def recording_mkstemp(**kwargs):
+            fd, path = mkstemp(**kwargs)
+            temp_files.append(path)
+            return fd, path
+
+        monkeypatch.setattr(tempfile, 'mkstemp', recording_mkstemp)
+        snapshot = KeySnapshot()
+        snapshot.path = str(tmp_path / 'snapshot.json')
+        snapshot.refresh()
+        snapshot.refresh()
+
+        assert len(set(temp_files)) == 2
+        assert all(path.startswith(str(tmp_path)) for path in temp_files)
+        assert [p.name for p in tmp_path.iterdir()] == ['snapshot.json']
+
+    def test_auth_request_does_not_refresh(self, app, client, db_session, sample_api_key, monkeypatch):
+        """Test a stale snapshot is left to the refresher thread, which invalidations wake"""
+        snapshot = KeySnapshot()
+        snapshot.refresh_interval = 1
+        monkeypatch.setattr('app.services.api_key_service.key_snapshot', snapshot)
+        monkeypatch.setattr(snapshot, 'refresh', lambda: pytest.fail('refreshed during a request'))
+
+        response = client.post('/api/mediamtx/auth', json={
+            'action': 'read', 'query': f'api_key={sample_api_key._plaintext}',
+        })
+
+        assert response.status_code == 200
+        snapshot._loaded_at = 0.0
+        snapshot.invalidate([('api_key', sample_api_key.id, 'upsert')])
+        assert snapshot._wake.is_set()
+
+    def test_degraded_state_expires(self, app):
+        """Test degraded mode ends after the retry interval"""
+        snapshot = KeySnapshot()
+        snapshot.retry_interval = 0
+        snapshot.mark_degraded('error')
+
+        assert snapshot.is_degraded() is False
+
+    def test_parse_policy(self):
+        """Test parsing degraded-mode policy strings"""
+        policy = parse_policy('publish=closed, read=open')
+
+        assert policy == {'publish': 'closed', 'read': 'open'}
+
+    def test_parse_policy_invalid(self):
+        """Test invalid policy values are rejected"""
+        with pytest.raises(ValueError):
+            parse_policy('read=maybe')
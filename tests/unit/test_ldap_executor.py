@@ -0,0 +1,161 @@
+# ABOUTME: Unit tests for the LDAP login thread pool and circuit breaker
+# ABOUTME: Tests timeouts, queue limits, fail-fast and background half-open probes
+
+import threading
+import time
+import pytest
+from ldap3.core.exceptions import LDAPSocketOpenError
+from app.services.ldap_executor import CircuitBreaker, LDAPExecutor, LDAPUnavailable, ldap_executor
+
+
+@pytest.fixture
+def executor(app):
+    """An executor with two workers, one queue slot and a three-error breaker"""
+    executor = LDAPExecutor()
+    executor._app = app
+    executor.workers = 2
+    executor.queue_limit = 1
+    executor.timeout = 0.2
+    executor.breaker.threshold = 3
+    executor.breaker.reset_seconds = 0.05
+    executor.breaker.probe = lambda: False
+    with app.test_request_context():
+        yield executor
+    executor.breaker.probe = lambda: True  # let pending probes close the breaker and stop
+
+
+def directory_down():
+    raise LDAPSocketOpenError('connection refused')
+
+
+def call_in_background(executor, fn):
+    with executor._app.test_request_context():
+        executor.call(fn)
+
+
+def wait_for(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not predicate() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return predicate()
+
+
+class TestLDAPExecutor:
+    """Test LDAPExecutor"""
+
+    def test_returns_result_from_worker_thread(self, executor):
+        """Test calls run off the request thread and return their result"""
+        assert executor.call(lambda: threading.current_thread().name).startswith('ldap')
+        assert executor.call(lambda: None) is None
+
+    def test_ldap_errors_raise_unavailable(self, executor):
+        """Test directory errors surface as LDAPUnavailable"""
+        with pytest.raises(LDAPUnavailable):
+            executor.call(directory_down)
+        assert executor.breaker.state == CircuitBreaker.CLOSED
+
+    def test_timeout(self, executor):
+        """Test a call slower than the timeout is abandoned"""
+        started = time.monotonic()
+        with pytest.raises(LDAPUnavailable, match='timeout'):
+            executor.call(time.sleep, 1)
+        assert time.monotonic() - started < 0.5
+
+    def test_queue_limit(self, executor):
+        """Test calls beyond workers plus queue slots are refused immediately"""
+        executor.timeout = 5
+        release = threading.Event()
+        for _ in range(3):
+            threading.Thread(target=call_in_background, args=(executor, release.wait)).start()
+        assert wait_for(lambda: executor._in_flight == 3)
+        assert executor.queue_depth() == 1
+
+        with pytest.raises(LDAPUnavailable, match='queue full'):
+            executor.call(lambda: None)
+        release.set()
+        assert wait_for(lambda: executor._in_flight == 0)
+
+    def test_inline_when_no_workers(self, executor):
+        """Test workers=0 runs calls on the calling thread"""
+        executor.workers = 0
+        assert executor.call(lambda: threading.current_thread()) is threading.current_thread()
+
+
+class TestCircuitBreaker:
+    """Test the LDAP circuit breaker"""
+
+    def test_opens_after_threshold_and_fails_fast(self, executor):
+        """Test repeated errors open the breaker and later calls never run"""
+        for _ in range(3):
+            with pytest.raises(LDAPUnavailable):
+                executor.call(directory_down)
+        assert executor.breaker.state != CircuitBreaker.CLOSED
+
+        calls = []
+        with pytest.raises(LDAPUnavailable, match='breaker open'):
+            executor.call(calls.append, 1)
+        assert calls == []
+
+    def test_successes_reset_the_count(self, executor):
+        """Test errors must be consecutive to open the breaker"""
+        for _ in range(5):
+            with pytest.raises(LDAPUnavailable):
+                executor.call(directory_down)
+            executor.call(lambda: None)  # e.g. a wrong password: the directory answered
+        assert executor.breaker.state == CircuitBreaker.CLOSED
+
+    def test_background_probe_closes_breaker(self, executor):
+        """Test the breaker closes once a background probe succeeds"""
+        healthy = threading.Event()
+        executor.breaker.probe = healthy.is_set
+        for _ in range(3):
+            with pytest.raises(LDAPUnavailable):
+                executor.call(directory_down)
+
+        time.sleep(0.15)
+        assert executor.breaker.state != CircuitBreaker.CLOSED
+
+        healthy.set()
+        assert wait_for(lambda: executor.breaker.state == CircuitBreaker.CLOSED)
+        assert executor.call(lambda: 'ok') == 'ok'
+
+
+    def test_late_success_cancels_pending_probe(self, app):
+        """Test a success while open cancels the probe, and a stale probe leaves a closed breaker alone"""
+        breaker = CircuitBreaker()
+        breaker.threshold = 1
+        breaker.reset_seconds = 60
+        breaker.probe = lambda: False
+        try:
+            breaker.record_failure()
+            first = breaker._timer
+            assert breaker.state == CircuitBreaker.OPEN
+
+            breaker.record_success()
+            assert first.finished.is_set()  # cancelled
+            breaker._run_probe()  # a probe that fired anyway
+            assert breaker.state == CircuitBreaker.CLOSED
+
+            breaker.record_failure()
+            breaker.record_failure()
+            assert breaker._timer is not first
+            breaker._run_probe()
+            assert breaker.state == CircuitBreaker.OPEN
+        finally:
+            breaker.reset()
+        assert breaker._timer is None
+
+
+class TestLoginWhenDirectoryUnavailable:
+    """Test the login page while the breaker is open"""
+
+    def test_login_returns_503(self, app, client):
+        """Test a login attempt fails fast with a clear message"""
+        ldap_executor.breaker.state = CircuitBreaker.OPEN
+        try:
+            response = client.post('/auth/login', data={'username': 'alice', 'password': 'pw'})
+        finally:
+            ldap_executor.breaker.reset()
+
+        assert response.status_code == 503
+        assert b'directory is unavailable' in response.data
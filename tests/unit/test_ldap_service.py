@@ -0,0 +1,297 @@
+# ABOUTME: Unit tests for LDAP authentication against an in-memory ldap3 MOCK_SYNC directory
+# ABOUTME: Tests login, connection pooling, schema caching, reconnects, DN caching and directory sync
+
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+import pytest
+from ldap3 import Connection, MOCK_SYNC
+from ldap3.core.exceptions import LDAPException
+from sqlalchemy import event
+from app import db
+from app.models.user import User
+from app.services.ldap_dn_cache import dn_cache
+from app.services.ldap_pool import ldap_pool
+from app.services.ldap_service import LDAPService
+from app.services.ldap_sync import LDAPSyncService
+
+BIND_DN = 'cn=service,dc=example,dc=com'
+USERS_DN = 'ou=users,dc=example,dc=com'
+GROUPS_DN = 'ou=groups,dc=example,dc=com'
+
+LDAP_SETTINGS = {
+    'LDAP_HOST': 'mock-ad',
+    'LDAP_BASE_DN': 'dc=example,dc=com',
+    'LDAP_USER_DN': USERS_DN,
+    'LDAP_BIND_USER_DN': BIND_DN,
+    'LDAP_BIND_USER_PASSWORD': 'service-pw',
+    'LDAP_CLIENT_STRATEGY': MOCK_SYNC,
+}
+
+
+@pytest.fixture
+def searches(monkeypatch):
+    """Count directory searches made by LDAPService.authenticate"""
+    calls = []
+    find_user = LDAPService._find_user
+
+    def counting(*args):
+        calls.append(args[-1])
+        return find_user(*args)
+
+    monkeypatch.setattr(LDAPService, '_find_user', staticmethod(counting))
+    return calls
+
+
+def add_user(username, password, **attributes):
+    """Add a person entry to the mock directory"""
+    conn = Connection(ldap_pool.server, client_strategy=MOCK_SYNC)
+    conn.strategy.add_entry(f'cn={username},{USERS_DN}', dict({
+        'objectClass': 'person',
+        'cn': username,
+        'sAMAccountName': username,
+        'userPassword': password,
+    }, **attributes))
+
+
+def add_admin_group(*usernames):
+    """Add the admin group with the given users as members"""
+    conn = Connection(ldap_pool.server, client_strategy=MOCK_SYNC)
+    conn.strategy.add_entry(f'cn=mtx-admins,{GROUPS_DN}', {
+        'objectClass': 'group',
+        'cn': 'mtx-admins',
+        'member': [f'cn={username},{USERS_DN}' for username in usernames],
+    })
+
+
+@pytest.fixture
+def directory(app):
+    """Point the app at a MOCK_SYNC directory with a service account and one user"""
+    saved = {key: app.config.get(key) for key in LDAP_SETTINGS}
+    app.config.update(LDAP_SETTINGS)
+    ldap_pool.reset()
+    dn_cache.clear()
+    LDAPService._pool()
+
+    conn = Connection(ldap_pool.server, client_strategy=MOCK_SYNC)
+    conn.strategy.add_entry(BIND_DN, {'objectClass': 'person', 'cn': 'service', 'userPassword': 'service-pw'})
+    add_user('alice', 'alice-pw', mail='alice@example.com', displayName='Alice Example')
+
+    yield ldap_pool
+
+    ldap_pool.reset()
+    dn_cache.clear()
+    app.config.update(saved)
+
+
+class TestLDAPService:
+    """Test LDAPService"""
+
+    def test_authenticate_success(self, app, db_session, directory):
+        """Test a valid login returns the directory attributes"""
+        user = LDAPService.authenticate('alice', 'alice-pw')
+
+        assert user == {
+            'username': 'alice',
+            'dn': f'cn=alice,{USERS_DN}',
+            'email': 'alice@example.com',
+            'display_name': 'Alice Example',
+        }
+
+    def test_authenticate_wrong_password(self, app, db_session, directory):
+        """Test a wrong password is rejected"""
+        assert LDAPService.authenticate('alice', 'wrong') is None
+
+    def test_authenticate_unknown_user(self, app, db_session, directory):
+        """Test an unknown user is rejected"""
+        assert LDAPService.authenticate('mallory', 'whatever') is None
+
+    def test_service_connection_is_reused(self, app, db_session, directory):
+        """Test repeated logins reuse one server object and one service connection"""
+        server = directory.server
+        LDAPService.authenticate('alice', 'alice-pw')
+        first = directory._idle[0][0]
+        dn_cache.clear()
+
+        LDAPService.authenticate('alice', 'alice-pw')
+
+        assert directory.server is server
+        assert len(directory._idle) == 1
+        assert directory._idle[0][0] is first
+
+    def test_closed_connection_is_replaced(self, app, db_session, directory):
+        """Test a dropped service connection is rebound on the next checkout"""
+        LDAPService.authenticate('alice', 'alice-pw')
+        directory._idle[0][0].unbind()
+        dn_cache.clear()
+
+        assert LDAPService.authenticate('alice', 'alice-pw') is not None
+        assert directory._idle[0][0].bound
+
+    def test_test_connection(self, app, db_session, directory):
+        """Test the connection check binds the service account"""
+        assert LDAPService.test_connection() is True
+
+
+class TestDNCache:
+    """Test username to DN caching in LDAPService.authenticate"""
+
+    def test_repeat_login_skips_search(self, app, db_session, directory, searches):
+        """Test a second login binds to the cached DN without searching"""
+        first = LDAPService.authenticate('alice', 'alice-pw')
+        second = LDAPService.authenticate('alice', 'alice-pw')
+
+        assert second == first
+        assert searches == ['alice']
+
+    def test_users_table_serves_other_processes(self, app, db_session, directory, searches):
+        """Test a recently resolved DN on the users row is used without searching"""
+        db_session.add(User(username='alice', dn=f'cn=alice,{USERS_DN}', email='alice@example.com',
+                            display_name='Alice Example', dn_resolved_at=datetime.utcnow()))
+        db_session.commit()
+
+        user = LDAPService.authenticate('alice', 'alice-pw')
+
+        assert user['dn'] == f'cn=alice,{USERS_DN}'
+        assert searches == []
+
+    def test_stale_users_row_is_searched_and_refreshed(self, app, db_session, directory, searches):
+        """Test a users row resolved longer ago than the TTL triggers a search"""
+        user = User(username='alice', dn=f'cn=alice,{USERS_DN}',
+                    dn_resolved_at=datetime.utcnow() - timedelta(days=1))
+        db_session.add(user)
+        db_session.commit()
+
+        LDAPService.authenticate('alice', 'alice-pw')
+
+        assert searches == ['alice']
+        db_session.refresh(user)
+        assert user.email == 'alice@example.com'
+        assert user.dn_resolved_at > datetime.utcnow() - timedelta(minutes=1)
+
+    def test_moved_user_falls_back_to_search(self, app, db_session, directory, searches):
+        """Test a failed bind to the cached DN is retried at the DN found by search"""
+        dn_cache._remember('alice', {'username': 'alice', 'dn': 'cn=alice,ou=old,dc=example,dc=com',
+                                     'email': None, 'display_name': 'alice'}, 3600)
+
+        user = LDAPService.authenticate('alice', 'alice-pw')
+
+        assert user['dn'] == f'cn=alice,{USERS_DN}'
+        assert searches == ['alice']
+        assert dn_cache.get('alice')['dn'] == f'cn=alice,{USERS_DN}'
+
+    def test_wrong_password_with_cached_dn(self, app, db_session, directory, searches):
+        """Test a wrong password is rejected and the cached DN is kept"""
+        LDAPService.authenticate('alice', 'alice-pw')
+
+        assert LDAPService.authenticate('alice', 'wrong') is None
+        assert searches == ['alice', 'alice']
+        assert dn_cache.get('alice')['dn'] == f'cn=alice,{USERS_DN}'
+
+
+@pytest.fixture
+def admin_group(app, directory):
+    """Enable group-managed admin flags"""
+    app.config.update(LDAP_GROUP_DN=GROUPS_DN, LDAP_ADMIN_GROUP='mtx-admins')
+    yield
+    app.config['LDAP_ADMIN_GROUP'] = None
+
+
+@contextmanager
+def recorded_statements():
+    """Collect every SQL statement executed inside the block"""
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        yield statements
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+
+
+class TestLDAPSync:
+    """Test LDAPSyncService"""
+
+    def test_updates_changed_attributes(self, app, db_session, directory):
+        """Test email and display name are copied from the directory"""
+        user = User(username='alice', email='old@example.com', display_name='Old Name')
+        db_session.add(user)
+        db_session.commit()
+
+        counts = LDAPSyncService.sync(page_size=2)
+
+        assert counts == {'updated': 1, 'deactivated': 0, 'created': 0}
+        db_session.refresh(user)
+        assert (user.email, user.display_name, user.dn) == ('alice@example.com', 'Alice Example', f'cn=alice,{USERS_DN}')
+        assert user.is_admin is False
+
+    def test_unchanged_users_are_skipped(self, app, db_session, directory):
+        """Test a second sync finds nothing to do"""
+        db_session.add(User(username='alice'))
+        db_session.commit()
+        LDAPSyncService.sync()
+
+        assert LDAPSyncService.sync() == {'updated': 0, 'deactivated': 0, 'created': 0}
+
+    def test_missing_users_are_deactivated(self, app, db_session, directory):
+        """Test users no longer in the directory are deactivated and not reactivated"""
+        gone = User(username='bob')
+        db_session.add_all([User(username='alice'), gone])
+        db_session.commit()
+
+        assert LDAPSyncService.sync()['deactivated'] == 1
+        db_session.refresh(gone)
+        assert gone.is_active is False
+
+        add_user('bob', 'bob-pw')
+        LDAPSyncService.sync()
+        db_session.refresh(gone)
+        assert gone.is_active is False
+
+    def test_admin_group_membership(self, app, db_session, directory, admin_group):
+        """Test admin flags follow the group and members without a row are created"""
+        add_user('bob', 'bob-pw')
+        add_user('carol', 'carol-pw')
+        add_admin_group('bob', 'carol')
+        alice = User(username='alice', is_admin=True)
+        bob = User(username='bob')
+        db_session.add_all([alice, bob])
+        db_session.commit()
+
+        assert LDAPSyncService.sync(page_size=1) == {'updated': 2, 'deactivated': 0, 'created': 1}
+
+        db_session.expire_all()
+        assert alice.is_admin is False
+        assert bob.is_admin is True
+        carol = User.query.filter_by(username='carol').one()
+        assert carol.is_admin is True and carol.is_active is True
+
+    def test_query_count_does_not_grow_with_directory(self, app, db_session, directory, admin_group):
+        """Test the sync runs the same statements for 2 users as for 40"""
+        add_admin_group()
+
+        def statements_for(usernames):
+            for username in usernames:
+                add_user(username, 'pw')
+                db_session.add(User(username=username))
+            db_session.commit()
+            with recorded_statements() as statements:
+                assert LDAPSyncService.sync(page_size=5)['updated'] == len(usernames)
+            return len(statements)
+
+        small = statements_for([f'small{i}' for i in range(2)])
+        large = statements_for([f'large{i}' for i in range(40)])
+
+        assert large == small
+
+    def test_empty_directory_changes_nothing(self, app, db_session, directory):
+        """Test a search returning no users aborts instead of deactivating everyone"""
+        app.config['LDAP_USER_DN'] = 'ou=nobody,dc=example,dc=com'
+        db_session.add(User(username='alice'))
+        db_session.commit()
+
+        with pytest.raises(LDAPException):
+            LDAPSyncService.sync()
+        assert User.query.filter_by(username='alice').one().is_active is True
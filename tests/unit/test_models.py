@@ -5,7 +5,7 @@ import pytest
 from datetime import datetime, timedelta
 from app.models.user import User
 from app.models.customer import Customer
-from app.models.api_key import ApiKey
+from app.models.api_key import ApiKey, MAX_KEY_ID, PERMISSION_BITS
 
 
 class TestUserModel:
@@ -86,7 +86,7 @@ class TestCustomerModel:
         api_key = ApiKey(
             customer_id=sample_customer.id,
             name='Test Key',
-            key_hash='abc123',
+            key_hash=ApiKey.hash_key('abc123'),
             key_prefix='mtx_test'
         )
         db_session.add(api_key)
@@ -100,14 +100,14 @@ class TestCustomerModel:
         active_key = ApiKey(
             customer_id=sample_customer.id,
             name='Active Key',
-            key_hash='active123',
+            key_hash=ApiKey.hash_key('active123'),
             key_prefix='mtx_act',
             is_active=True
         )
         inactive_key = ApiKey(
             customer_id=sample_customer.id,
             name='Inactive Key',
-            key_hash='inactive123',
+            key_hash=ApiKey.hash_key('inactive123'),
             key_prefix='mtx_ina',
             is_active=False
         )
@@ -129,6 +129,43 @@ class TestApiKeyModel:
         assert key.startswith('test_')
         assert len(key) > 40
 
+    def test_self_identifying_key_format(self):
+        """Test keys embed their id and legacy keys are not mistaken for them"""
+        secret = ApiKey.generate_secret()
+        key = ApiKey.format_key(42, secret)
+
+        assert key.startswith(f'mtx_42_{secret}')
+        assert len(secret) == 32
+        assert ApiKey.parse_key_id(key) == 42
+        assert ApiKey.parse_key_id(ApiKey.generate_key()) is None
+        assert ApiKey.parse_key_id('mtx_42_short') is None
+        assert ApiKey.parse_key_id(f'mtx_042_{secret}') is None
+
+    def test_key_id_beyond_column_range(self):
+        """Test ids the id column cannot hold make a key malformed instead of reaching the database"""
+        secret = ApiKey.generate_secret()
+        largest = ApiKey.format_key(MAX_KEY_ID, secret)
+
+        assert ApiKey.parse_key_id(largest) == MAX_KEY_ID
+        assert ApiKey.is_well_formed(largest) is True
+        for key_id in (MAX_KEY_ID + 1, 2 ** 63, 10 ** 19 - 1):
+            key = ApiKey.format_key(key_id, secret)
+            assert ApiKey.parse_key_id(key) is None
+            assert ApiKey.is_well_formed(key) is False
+
+    def test_is_well_formed(self):
+        """Test checksum, length and charset validation of keys"""
+        key = ApiKey.format_key(7, ApiKey.generate_secret())
+        typo = key[:10] + ('b' if key[10] == 'a' else 'a') + key[11:]
+
+        assert ApiKey.is_well_formed(key) is True
+        assert ApiKey.is_well_formed(key[:-6]) is True  # issued before checksums
+        assert ApiKey.is_well_formed(ApiKey.generate_key()) is True  # legacy
+        assert ApiKey.is_well_formed(typo) is False
+        assert ApiKey.is_well_formed(key[:-1]) is False
+        assert ApiKey.is_well_formed(key + ' ') is False
+        assert ApiKey.is_well_formed('invalid_key_123') is False
+
     def test_hash_key(self):
         """Test API key hashing"""
         key = 'test_key_123'
@@ -136,7 +173,8 @@ class TestApiKeyModel:
         hash2 = ApiKey.hash_key(key)
 
         assert hash1 == hash2
-        assert len(hash1) == 64
+        assert isinstance(hash1, bytes)
+        assert len(hash1) == 32
 
     def test_verify_key(self, sample_api_key):
         """Test API key verification"""
@@ -169,6 +207,25 @@ class TestApiKeyModel:
         assert sample_api_key.last_used_at is not None
         assert sample_api_key.last_used_at != original_last_used
 
+    def test_permission_bitmask(self, db_session, sample_customer):
+        """Test can_* keyword arguments and properties map onto the bitmask"""
+        api_key = ApiKey(
+            customer_id=sample_customer.id,
+            name='Bitmask Key',
+            key_hash=ApiKey.hash_key('bits123'),
+            key_prefix='mtx_bit',
+            can_publish=True
+        )
+
+        assert api_key.actions == ['publish', 'read']
+
+        api_key.can_read = False
+        api_key.set_permission('pprof', True)
+
+        assert api_key.permissions == PERMISSION_BITS['publish'] | PERMISSION_BITS['pprof']
+        assert api_key.has_permission('pprof') is True
+        assert api_key.can_read is False
+
     def test_api_key_to_dict(self, sample_api_key):
         """Test API key to dictionary conversion"""
         key_dict = sample_api_key.to_dict()
@@ -176,4 +233,8 @@ class TestApiKeyModel:
         assert key_dict['name'] == 'Test Key'
         assert key_dict['can_publish'] is True
         assert key_dict['can_read'] is True
+        assert key_dict['permissions'] == {
+            'publish': True, 'read': True, 'playback': False,
+            'api': False, 'metrics': False, 'pprof': False,
+        }
         assert key_dict['is_active'] is True
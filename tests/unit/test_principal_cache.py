@@ -0,0 +1,126 @@
+# ABOUTME: Unit tests for the cached Flask-Login user principal
+# ABOUTME: Tests caching, eviction on user changes and admin checks without a user query
+
+import pytest
+from flask import g
+from sqlalchemy import event
+from app import db
+from app.services.principal_cache import UserPrincipal, principal_cache
+from app.services.user_service import UserService
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    principal_cache.clear()
+    yield
+    principal_cache.clear()
+
+
+def user_queries(statements):
+    return [s for s in statements if 'FROM users' in s]
+
+
+@pytest.fixture
+def statements(app):
+    """SQL statements executed during the test"""
+    recorded = []
+
+    def record(conn, cursor, statement, *args):
+        recorded.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', record)
+    yield recorded
+    event.remove(db.engine, 'before_cursor_execute', record)
+
+
+class TestPrincipalCache:
+    """Test PrincipalCache"""
+
+    def test_principal_fields(self, db_session, sample_admin):
+        """Test the principal carries what authorisation and the layout need"""
+        principal = principal_cache.get(sample_admin.id)
+
+        assert isinstance(principal, UserPrincipal)
+        assert principal.get_id() == str(sample_admin.id)
+        assert (principal.username, principal.is_active, principal.is_admin) == ('admin', True, True)
+        assert principal.is_authenticated and not principal.is_anonymous
+
+    def test_second_lookup_is_cached(self, db_session, sample_user, statements):
+        """Test only the first lookup queries the users table"""
+        user_id = sample_user.id
+        del statements[:]
+
+        principal_cache.get(user_id)
+        principal_cache.get(user_id)
+
+        assert len(user_queries(statements)) == 1
+
+    def test_unknown_user(self, db_session):
+        """Test a missing user loads as None"""
+        assert principal_cache.get(99999) is None
+
+    @pytest.mark.parametrize('change', [
+        lambda user: UserService.toggle_admin(user.id),
+        lambda user: UserService.toggle_active(user.id),
+        lambda user: UserService.update_user(user.id, is_admin=True),
+    ])
+    def test_user_service_changes_evict(self, db_session, sample_user, change):
+        """Test admin and active changes apply on the next lookup"""
+        before = principal_cache.get(sample_user.id)
+
+        change(sample_user)
+
+        after = principal_cache.get(sample_user.id)
+        assert (after.is_active, after.is_admin) != (before.is_active, before.is_admin)
+
+    def test_delete_evicts(self, db_session, sample_user):
+        """Test a deleted user no longer loads"""
+        user_id = sample_user.id
+        principal_cache.get(user_id)
+
+        UserService.delete_user(user_id)
+
+        assert principal_cache.get(user_id) is None
+
+    def test_last_login_does_not_evict(self, db_session, sample_user, statements):
+        """Test logging in does not invalidate the cached principal"""
+        user_id = sample_user.id
+        principal_cache.get(user_id)
+        sample_user.update_last_login()
+        del statements[:]
+
+        principal_cache.get(user_id)
+
+        assert user_queries(statements) == []
+
+
+class TestAdminRequired:
+    """Test admin checks use the cached principal"""
+
+    def login(self, client, user):
+        with client.session_transaction() as session:
+            session['_user_id'] = str(user.id)
+            session['_fresh'] = True
+
+    def get(self, client, url):
+        # Requests share the test's app context, so drop the user Flask-Login kept on g
+        g.pop('_login_user', None)
+        return client.get(url)
+
+    def test_admin_page_without_user_query(self, client, db_session, sample_admin, statements):
+        """Test repeat admin requests do not query the users table"""
+        self.login(client, sample_admin)
+        assert self.get(client, '/api/customers/create').status_code == 200
+        del statements[:]
+
+        assert self.get(client, '/api/customers/create').status_code == 200
+        assert user_queries(statements) == []
+
+    def test_demotion_applies_on_next_request(self, client, db_session, sample_admin):
+        """Test removing admin rights takes effect immediately"""
+        self.login(client, sample_admin)
+        assert self.get(client, '/api/customers/create').status_code == 200
+
+        UserService.toggle_admin(sample_admin.id)
+
+        assert self.get(client, '/api/customers/create').status_code == 302
@@ -0,0 +1,55 @@
+# ABOUTME: Unit tests for per-request SQL statistics and repeated statement detection
+# ABOUTME: Tests the Server-Timing header, metrics, N+1 warnings and record()
+
+import logging
+from flask import Response
+from sqlalchemy import select, text
+from app.metrics import metrics
+from app.models.customer import Customer
+from app.query_stats import QueryLog, query_stats
+
+
+class TestQueryLog:
+    """Test QueryLog"""
+
+    def test_counts_and_repeats(self):
+        """Test statements are counted and repeats found at the threshold"""
+        log = QueryLog()
+        for statement in ('SELECT a', 'SELECT b', 'SELECT b', 'SELECT b'):
+            log.add(statement, 0.001)
+
+        assert log.count == 4
+        assert round(log.seconds, 6) == 0.004
+        assert log.repeated(3) == [('SELECT b', 3)]
+        assert log.repeated(4) == []
+
+
+class TestQueryStats:
+    """Test request reporting"""
+
+    def test_request_reported(self, app, db_session, sample_customer, caplog):
+        """Test a request's statements go to Server-Timing and metrics, and repeats are logged"""
+        metrics.reset()
+        customer_id = sample_customer.id
+        with app.test_request_context('/probe'):
+            query_stats.start()
+            db_session.execute(text('SELECT 1'))
+            for _ in range(query_stats.repeat_threshold):
+                db_session.execute(select(Customer).where(Customer.id == customer_id))
+            with caplog.at_level(logging.WARNING):
+                response = query_stats.finish(Response())
+
+        count = query_stats.repeat_threshold + 1
+        assert response.headers['Server-Timing'].startswith('db;dur=')
+        assert response.headers['Server-Timing'].endswith(f'desc="{count} queries"')
+        assert metrics.value('mtxman_db_request_queries', endpoint='unmatched') == 1
+        assert metrics.value('mtxman_db_repeated_statements_total', endpoint='unmatched') == 1
+        assert f'ran one statement {query_stats.repeat_threshold} times' in caplog.text
+
+    def test_record_outside_requests(self, app, db_session):
+        """Test record() sees statements run outside a request, and only inside its block"""
+        with query_stats.record() as log:
+            db_session.execute(text('SELECT 1'))
+        db_session.execute(text('SELECT 2'))
+
+        assert log.statements == {'SELECT 1': 1}
@@ -0,0 +1,156 @@
+# ABOUTME: Unit tests for read replica selection and request routing
+# ABOUTME: Tests round-robin, health and lag fallback, and routing between two SQLite files
+
+import json
+import os
+import subprocess
+import sys
+import pytest
+from sqlalchemy import create_engine, text
+from app.database import ReplicaSet
+from app.metrics import metrics
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def replicas(app, tmp_path):
+    """A ReplicaSet over two SQLite files"""
+    replica_set = ReplicaSet()
+    replica_set.set_engines({
+        f'replica_{i}': create_engine(f"sqlite:///{tmp_path / f'replica_{i}.db'}") for i in range(2)
+    })
+    yield replica_set
+    for engine in replica_set._engines.values():
+        engine.dispose()
+
+
+class TestReplicaSet:
+    """Test ReplicaSet"""
+
+    def test_round_robin(self, replicas):
+        """Test replicas take turns"""
+        chosen = [replicas.choose() for _ in range(4)]
+
+        assert chosen[0] is not chosen[1]
+        assert chosen[:2] == chosen[2:]
+
+    def test_down_replica_skipped_until_retry(self, replicas):
+        """Test a replica marked down is skipped, and all down falls back to the primary"""
+        replicas.mark_down('replica_0', 'test')
+        assert {replicas.choose() for _ in range(4)} == {replicas._engines['replica_1']}
+
+        replicas.mark_down('replica_1', 'test')
+        assert replicas.choose() is None
+
+        replicas.retry_interval = 0
+        replicas.mark_down('replica_0', 'test')
+        assert replicas.choose() is not None
+
+    def test_lagging_replica_skipped(self, replicas, monkeypatch):
+        """Test a replica behind by more than max_lag is not used"""
+        lags = {'replica_0': 30.0, 'replica_1': 0.5}
+        engines = {engine: key for key, engine in replicas._engines.items()}
+        monkeypatch.setattr(ReplicaSet, 'lag_seconds', staticmethod(lambda engine: lags[engines[engine]]))
+
+        assert {replicas.choose() for _ in range(4)} == {replicas._engines['replica_1']}
+        assert metrics.value('mtxman_db_replica_lag_seconds', replica='replica_0') == 30.0
+
+    def test_connection_error_marks_down(self, app, tmp_path):
+        """Test a database error on a replica takes it out of rotation"""
+        replica_set = ReplicaSet()
+        broken = create_engine(f"sqlite:///{tmp_path / 'missing' / 'replica.db'}")
+        replica_set.set_engines({'replica_0': broken})
+
+        with pytest.raises(Exception):
+            with broken.connect() as conn:
+                conn.execute(text('SELECT 1'))
+
+        assert replica_set.choose() is None
+        assert metrics.value('mtxman_db_replica_up', replica='replica_0') == 0
+
+
+# A fresh interpreter with a primary and a replica file that disagree, so responses show which was read
+ROUTING_PROBE = '''
+import json
+from sqlalchemy import insert, select, update
+from app import create_app, db
+from app.database import replica_set
+from app.models.api_key import ApiKey
+from app.models.customer import Customer
+from app.models.user import User
+from app.services.api_key_service import ApiKeyService
+
+app = create_app('production')
+app.logger.disabled = True
+with app.app_context():
+    replica = db.engines['replica_0']
+    db.create_all()
+    db.metadatas[None].create_all(replica)
+    db.session.add(User(username='admin', is_active=True, is_admin=True))
+    customer = Customer(name='Acme', email='ops@acme.test')
+    db.session.add(customer)
+    db.session.commit()
+    _, plaintext = ApiKeyService.create_api_key(customer_id=customer.id, name='Probe')
+    with replica.begin() as conn:
+        for table in (User.__table__, Customer.__table__, ApiKey.__table__):
+            rows = [dict(row._mapping) for row in db.session.execute(select(table))]
+            conn.execute(insert(table), rows)
+        conn.execute(update(Customer.__table__).values(name='Replica'))
+    # The primary has moved on: key revoked, customer renamed
+    db.session.execute(update(ApiKey.__table__).values(is_active=False))
+    db.session.execute(update(Customer.__table__).values(name='Primary'))
+    db.session.commit()
+
+client = app.test_client()
+with client.session_transaction(base_url='https://localhost') as session:
+    session['_user_id'] = '1'
+    session['_fresh'] = True
+
+def customer_name():
+    return client.get('/api/api/v1/customers/1', base_url='https://localhost').json['name']
+
+def streamed_name():
+    body = client.get('/api/api/v1/customers?format=ndjson', base_url='https://localhost').get_data(as_text=True)
+    return json.loads(body.splitlines()[0])['name']
+
+result = {
+    'auth_status': client.post('/api/mediamtx/auth', json={
+        'action': 'read', 'query': 'api_key=' + plaintext,
+    }).status_code,
+    'rest_read': customer_name(),
+    'stream_read': streamed_name(),
+}
+client.post('/api/customers/1/edit', base_url='https://localhost', data={
+    'name': 'Edited', 'email': 'ops@acme.test', 'is_active': 'on',
+})
+result['after_write'] = customer_name()
+with client.session_transaction(base_url='https://localhost') as session:
+    session.pop('_db_primary_until')
+with app.app_context():
+    replica_set.mark_down('replica_0', 'probe')
+result['replica_down'] = customer_name()
+print(json.dumps(result))
+'''
+
+
+class TestReplicaRouting:
+    """Test which database requests read from"""
+
+    def test_routing_between_primary_and_replica(self, tmp_path):
+        """Test auth and REST GETs read the replica, except after a write or when it is down"""
+        env = dict(os.environ, DATABASE_URL=f"sqlite:///{tmp_path / 'primary.db'}",
+                   DATABASE_REPLICA_URLS=f"sqlite:///{tmp_path / 'replica.db'}",
+                   SQLITE_PRODUCTION_MODE='false', WARMUP_ON_START='false',
+                   EXPIRY_SWEEPER_ENABLED='false', AUTH_SNAPSHOT_REFRESHER_ENABLED='false')
+        result = subprocess.run([sys.executable, '-c', ROUTING_PROBE], cwd=ROOT, env=env,
+                                capture_output=True, text=True, check=True)
+        probe = json.loads(result.stdout.strip().splitlines()[-1])
+
+        assert probe == {
+            'auth_status': 200,          # the key is still active on the replica
+            'rest_read': 'Replica',
+            'stream_read': 'Replica',    # streamed after the view returned, still from the replica
+            'after_write': 'Edited',     # read-your-writes from the primary
+            'replica_down': 'Edited',    # fallback to the primary
+        }
@@ -0,0 +1,126 @@
+# ABOUTME: Unit tests for customer and API key search
+# ABOUTME: Tests FTS5 prefix matching, ranking, index maintenance by triggers and the PostgreSQL statement
+
+from sqlalchemy.dialects import postgresql
+from app import db
+from app.models.customer import Customer
+from app.services.api_key_service import ApiKeyService
+from app.services.customer_service import CustomerService
+from app.services.search_service import SearchService
+
+
+def names(customers):
+    return [customer.name for customer in customers]
+
+
+class TestSearchTerms:
+    """Test query parsing"""
+
+    def test_terms(self, app):
+        """Test words are split like the FTS5 tokenizer, and short words and FTS syntax are dropped"""
+        assert SearchService.terms('Acme-Broadcast ops@acme.TEST') == ['acme', 'broadcast', 'ops', 'acme', 'test']
+        assert SearchService.terms('mtx_12_Ab') == ['mtx', '12', 'ab']
+        assert SearchService.terms('a "b" OR c*') == ['or']
+        assert SearchService.terms('  ') == []
+
+    def test_no_usable_terms(self, db_session):
+        """Test a query without usable words finds nothing"""
+        assert SearchService.select_matches(Customer, 'x', limit=10) is None
+        assert SearchService.search_customers('') == []
+
+
+class TestSearchSqlite:
+    """Test search on the FTS5 indexes"""
+
+    def add(self, *rows):
+        return [CustomerService.create_customer(name=name, email=email, organization=org) for name, email, org in rows]
+
+    def test_prefix_match_all_words(self, db_session):
+        """Test every word must match as a prefix of some word in any column"""
+        self.add(('Zephyr Broadcast', 'ops@zephyr.test', 'Zephyr Ltd'),
+                 ('Quill Media', 'info@quill.test', 'Zephyr Partners'),
+                 ('Other', 'other@example.test', None))
+
+        assert sorted(names(SearchService.search_customers('zeph'))) == ['Quill Media', 'Zephyr Broadcast']
+        assert names(SearchService.search_customers('zeph partn')) == ['Quill Media']
+        assert names(SearchService.search_customers('quill.test')) == ['Quill Media']
+        assert SearchService.search_customers('zephyrs') == []
+
+    def test_ranked_by_column_weight(self, db_session):
+        """Test a name match ranks above an email match, which ranks above an organization match"""
+        self.add(('Plain', 'plain@example.test', 'Yarrow Group'),
+                 ('Other', 'yarrow@example.test', None),
+                 ('Yarrow', 'y@example.test', None))
+
+        assert names(SearchService.search_customers('yarrow')) == ['Yarrow', 'Other', 'Plain']
+
+    def test_pages(self, db_session):
+        """Test limit and offset page through the ranked matches"""
+        self.add(*((f'Vireo {i}', f'vireo{i}@example.test', None) for i in range(5)))
+
+        pages = [names(SearchService.search_customers('vireo', limit=2, offset=offset)) for offset in (0, 2, 4)]
+
+        assert [len(page) for page in pages] == [2, 2, 1]
+        assert len(set(sum(pages, []))) == 5
+
+    def test_ranks_every_match(self, db_session):
+        """Test the best match is found however many newer, weaker matches there are"""
+        self.add(('Wren', 'old@example.test', None),
+                 *((f'Plain {i}', f'p{i}@example.test', 'Wren Ltd') for i in range(5)))
+
+        assert names(SearchService.search_customers('wren', limit=1)) == ['Wren']
+
+    def test_rank_candidates_newest(self, app, db_session, monkeypatch):
+        """Test a SEARCH_RANK_CANDIDATES cap ranks only the newest matches when a page fits in them"""
+        self.add(('Wren', 'old@example.test', None), ('Other', 'wren@example.test', None),
+                 ('Plain', 'plain@example.test', 'Wren Ltd'))
+        monkeypatch.setitem(app.config, 'SEARCH_RANK_CANDIDATES', 2)
+
+        assert names(SearchService.search_customers('wren', limit=2)) == ['Other', 'Plain']
+        assert len(SearchService.search_customers('wren', limit=3)) == 3
+
+    def test_index_follows_changes(self, db_session):
+        """Test the triggers reindex updated rows and drop deleted ones"""
+        customer, = self.add(('Kestrel', 'k@example.test', None))
+
+        CustomerService.update_customer(customer.id, name='Osprey')
+        assert names(SearchService.search_customers('ospr')) == ['Osprey']
+        assert SearchService.search_customers('kestrel') == []
+
+        CustomerService.delete_customer(customer.id)
+        assert SearchService.search_customers('ospr') == []
+
+    def test_keys_by_name_and_prefix(self, db_session, sample_customer):
+        """Test keys are found by name or by the start of their prefix"""
+        key, _ = ApiKeyService.create_api_key(customer_id=sample_customer.id, name='Heron encoder')
+        ApiKeyService.create_api_key(customer_id=sample_customer.id, name='Other')
+
+        assert [k.id for k in SearchService.search_keys('hero enc')] == [key.id]
+        assert key.id in [k.id for k in SearchService.search_keys(key.key_prefix)]
+
+    def test_rebuild_index(self, db_session):
+        """Test a rebuild reindexes rows missing from the index"""
+        customer, = self.add(('Plover', 'plover@example.test', None))
+        db.session.execute(db.text(
+            "INSERT INTO customers_fts (customers_fts, rowid, name, email, organization) "
+            "VALUES ('delete', :id, 'Plover', 'plover@example.test', NULL)"
+        ), {'id': customer.id})
+        assert SearchService.search_customers('plover') == []
+
+        assert SearchService.rebuild_index() == ['customers', 'api_keys']
+        assert names(SearchService.search_customers('plover')) == ['Plover']
+
+
+class TestSearchPostgresql:
+    """Test the statement used on PostgreSQL"""
+
+    def test_trigram_statement(self, app, monkeypatch):
+        """Test every word filters on an ILIKE per column and matches are ranked by word similarity"""
+        monkeypatch.setattr(db.engine.dialect, 'name', 'postgresql')
+        statement = SearchService.select_matches(Customer, 'acme ops', limit=10)
+        sql = str(statement.compile(dialect=postgresql.dialect(), compile_kwargs={'literal_binds': True}))
+
+        assert "customers.name ILIKE '%%acme%%'" in sql
+        assert "customers.organization ILIKE '%%ops%%'" in sql
+        assert 'word_similarity' in sql
+        assert 'LIMIT 10' in sql
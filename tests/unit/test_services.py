@@ -90,7 +90,8 @@ class TestApiKeyService:
         assert api_key.name == 'New Key'
         assert api_key.can_publish is True
         assert api_key.can_read is True
-        assert plaintext.startswith('mtx_')
+        assert plaintext.startswith(f'mtx_{api_key.id}_')
+        assert api_key.key_prefix == plaintext[:8]
 
     def test_create_api_key_with_expiration(self, db_session, sample_customer):
         """Test creating API key with expiration"""
@@ -115,6 +116,51 @@ class TestApiKeyService:
 
         assert verified is None
 
+    def test_verify_api_key_wrong_secret_for_id(self, db_session, sample_api_key):
+        """Test a key naming an existing id with the wrong secret is rejected"""
+        forged = ApiKey.format_key(sample_api_key.id, ApiKey.generate_secret())
+
+        assert ApiKeyService.verify_api_key(forged) is None
+
+    def test_verify_legacy_api_key(self, db_session, sample_customer):
+        """Test keys in the legacy format still verify through key_hash"""
+        plaintext = ApiKey.generate_key()
+        legacy = ApiKey(
+            customer_id=sample_customer.id,
+            name='Legacy Key',
+            key_hash=ApiKey.hash_key(plaintext),
+            key_prefix=plaintext[:8]
+        )
+        db_session.add(legacy)
+        db_session.commit()
+
+        assert ApiKeyService.verify_api_key(plaintext).id == legacy.id
+        assert ApiKeyService.verify_api_keys([plaintext])[plaintext].id == legacy.id
+
+    def test_verify_api_keys_single_query(self, app, db_session, sample_customer):
+        """Test batch verification resolves keys and customers in one query"""
+        from sqlalchemy import event
+        from app import db
+
+        plaintexts = [
+            ApiKeyService.create_api_key(customer_id=sample_customer.id, name=f'Key {i}')[1]
+            for i in range(5)
+        ]
+        db_session.expire_all()
+
+        statements = []
+        listener = lambda *args: statements.append(args[2])
+        event.listen(db.engine, 'before_cursor_execute', listener)
+        try:
+            found = ApiKeyService.verify_api_keys(plaintexts + ['mtx_unknown'])
+            customers = {k.customer.email for k in found.values()}
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', listener)
+
+        assert set(found) == set(plaintexts)
+        assert customers == {sample_customer.email}
+        assert len(statements) == 1
+
     def test_get_customer_keys(self, db_session, sample_customer, sample_api_key):
         """Test getting customer keys"""
         keys = ApiKeyService.get_customer_keys(sample_customer.id)
@@ -145,6 +191,18 @@ class TestApiKeyService:
         """Test checking read permission"""
         assert ApiKeyService.check_permission(sample_api_key, 'read') is True
 
+    def test_check_permission_all_actions(self, db_session, sample_customer):
+        """Test keys can be granted any MediaMTX action"""
+        api_key, _ = ApiKeyService.create_api_key(
+            customer_id=sample_customer.id, name='Ops Key', actions=['playback', 'metrics']
+        )
+
+        assert ApiKeyService.check_permission(api_key, 'playback') is True
+        assert ApiKeyService.check_permission(api_key, 'metrics') is True
+        assert ApiKeyService.check_permission(api_key, 'read') is False
+        assert ApiKeyService.check_permission(api_key, 'pprof') is False
+        assert ApiKeyService.check_permission(api_key, 'unknown') is False
+
     def test_check_permission_inactive_key(self, db_session, sample_api_key):
         """Test permission check on inactive key"""
         sample_api_key.is_active = False
@@ -0,0 +1,138 @@
+# ABOUTME: Unit tests for SQLite production mode, read routing and the write queue
+# ABOUTME: Tests pragmas and read-only MediaMTX reads on a real file in a fresh interpreter
+
+import json
+import os
+import subprocess
+import sys
+import pytest
+from sqlalchemy import select, update
+from app import db
+from app.database import RoutingSession
+from app.models.api_key import ApiKey
+from app.services.api_key_service import ApiKeyService
+from app.services.write_queue import WriteQueue
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# A fresh interpreter, since create_app re-initialises the service singletons
+SQLITE_MODE_PROBE = '''
+import json
+from sqlalchemy import event
+from app import create_app, db
+from app.models.api_key import ApiKey
+from app.models.customer import Customer
+from app.services.api_key_service import ApiKeyService
+from app.services.write_queue import write_queue
+
+app = create_app('production')
+app.logger.disabled = True
+with app.app_context():
+    db.create_all()
+    customer = Customer(name='Probe', email='probe@example.com')
+    db.session.add(customer)
+    db.session.commit()
+    api_key, plaintext = ApiKeyService.create_api_key(customer_id=customer.id, name='Probe')
+    key_id = api_key.id
+    with db.engine.connect() as conn:
+        pragmas = {name: conn.exec_driver_sql(f'PRAGMA {name}').scalar()
+                   for name in ('journal_mode', 'synchronous', 'busy_timeout')}
+    read_engine = db.engines['sqlite_read']
+    try:
+        with read_engine.connect() as conn:
+            conn.exec_driver_sql('DELETE FROM api_keys')
+        read_only = False
+    except Exception:
+        read_only = True
+
+reads = []
+event.listen(read_engine, 'before_cursor_execute', lambda *args: reads.append(args[2]))
+write_queue.ensure_started = lambda: None  # flushed explicitly below
+
+status = app.test_client().post('/api/mediamtx/auth', json={
+    'action': 'read', 'query': 'api_key=' + plaintext,
+}).status_code
+with app.app_context():
+    queued = sorted(write_queue._pending)
+    written = write_queue.flush()
+    last_used = db.session.get(ApiKey, key_id).last_used_at is not None
+
+print(json.dumps({'pragmas': pragmas, 'read_only': read_only, 'status': status,
+                  'auth_reads': sum('api_keys' in s for s in reads), 'queued': queued == [key_id],
+                  'written': written, 'last_used': last_used}))
+'''
+
+
+class TestSQLiteProductionMode:
+    """Test SQLite production mode end to end"""
+
+    def test_production_mode(self, tmp_path):
+        """Test pragmas, read-only auth reads and queued usage writes on a SQLite file"""
+        env = dict(os.environ, DATABASE_URL=f"sqlite:///{tmp_path / 'probe.db'}",
+                   WARMUP_ON_START='false', EXPIRY_SWEEPER_ENABLED='false',
+                   AUTH_SNAPSHOT_REFRESHER_ENABLED='false')
+        result = subprocess.run([sys.executable, '-c', SQLITE_MODE_PROBE], cwd=ROOT, env=env,
+                                capture_output=True, text=True, check=True)
+        probe = json.loads(result.stdout.strip().splitlines()[-1])
+
+        assert probe['pragmas'] == {'journal_mode': 'wal', 'synchronous': 1, 'busy_timeout': 5000}
+        assert probe['read_only'] is True
+        assert probe['status'] == 200
+        assert probe['auth_reads'] >= 1
+        assert probe['queued'] is True
+        assert (probe['written'], probe['last_used']) == (1, True)
+
+    def test_memory_database_unaffected(self, app):
+        """Test the in-memory test database has no read bind or write queue"""
+        assert 'sqlite_read' not in db.engines
+        assert app.extensions['write_queue'].enabled is False
+
+
+class TestRoutingSession:
+    """Test RoutingSession bind selection"""
+
+    def test_selects_use_read_bind(self, app):
+        """Test only SELECTs go to the read bind while it is set"""
+        session = RoutingSession(db)
+        reader = object()
+
+        assert session.get_bind(clause=select(ApiKey)) is db.engine
+
+        session.info['read_bind'] = reader
+        assert session.get_bind(clause=select(ApiKey)) is reader
+        assert session.get_bind(clause=update(ApiKey).values(name='x')) is db.engine
+        assert session.get_bind(mapper=ApiKey.__mapper__) is db.engine
+        session.close()
+
+
+class TestWriteQueue:
+    """Test WriteQueue"""
+
+    def test_touches_coalesce_into_one_write(self, db_session, sample_api_key, monkeypatch):
+        """Test repeated touches are written once, in one batch"""
+        queue = WriteQueue()
+        monkeypatch.setattr(queue, 'ensure_started', lambda: None)
+        batches = []
+        monkeypatch.setattr(ApiKeyService, 'write_usage', staticmethod(batches.append))
+
+        queue.touch([sample_api_key.id])
+        queue.touch([sample_api_key.id, 99])
+
+        assert queue.flush() == 2
+        assert batches == [{sample_api_key.id, 99}]
+        assert queue.flush() == 0
+
+    def test_failed_write_is_requeued(self, db_session, monkeypatch):
+        """Test keys stay queued when the write fails"""
+        queue = WriteQueue()
+        monkeypatch.setattr(queue, 'ensure_started', lambda: None)
+
+        def locked(key_ids):
+            raise RuntimeError('database is locked')
+
+        monkeypatch.setattr(ApiKeyService, 'write_usage', staticmethod(locked))
+        queue.touch([1, 2])
+
+        with pytest.raises(RuntimeError):
+            queue.flush()
+        assert queue._pending == {1, 2}
@@ -0,0 +1,73 @@
+# ABOUTME: Unit tests for the maintained dashboard counters and customer key counts
+# ABOUTME: Tests counters follow ORM and bulk changes and match a full recount
+
+from datetime import datetime, timedelta
+from app.models.customer import Customer
+from app.services.api_key_service import ApiKeyService
+from app.services.customer_service import CustomerService
+from app.services.expiry import ExpiryService
+from app.services.stats_service import StatsService
+
+
+def changes(before):
+    after = StatsService.get_counters()
+    return {name: after[name] - before[name] for name in after if after[name] != before[name]}
+
+
+class TestStatCounters:
+    """Test counters are maintained on flush"""
+
+    def test_create_deactivate_delete(self, db_session):
+        """Test creating, deactivating and deleting customers and keys"""
+        before = StatsService.get_counters()
+        customer = CustomerService.create_customer(name='Counted', email='counted@example.com')
+        ApiKeyService.create_api_key(customer_id=customer.id, name='One')
+        ApiKeyService.create_api_key(customer_id=customer.id, name='Two')
+        assert changes(before) == {'customers': 1, 'active_customers': 1, 'api_keys': 2, 'active_api_keys': 2}
+
+        CustomerService.deactivate_customer(customer.id)
+        assert changes(before) == {'customers': 1, 'api_keys': 2}
+
+        CustomerService.delete_customer(customer.id)
+        assert changes(before) == {}
+
+    def test_expired_keys_counted(self, db_session, sample_customer):
+        """Test the expiry sweeper's bulk UPDATE adjusts the active count"""
+        ApiKeyService.create_api_key(customer_id=sample_customer.id, name='Short', expires_in_days=1)
+        before = StatsService.get_counters()
+
+        assert ExpiryService.expire_due(now=datetime.utcnow() + timedelta(days=2)) == 1
+        assert changes(before) == {'active_api_keys': -1}
+
+    def test_rebuild_matches_maintained(self, db_session, sample_api_key):
+        """Test a full recount agrees with the maintained values"""
+        maintained = StatsService.get_counters()
+
+        assert StatsService.rebuild() == maintained
+
+
+class TestCustomersWithKeyCounts:
+    """Test the grouped customer list"""
+
+    def test_counts_and_limit(self, db_session):
+        """Test total and active key counts per customer, newest customers first"""
+        now = datetime.utcnow()
+        customers = []
+        for i in range(3):
+            customer = Customer(name=f'C{i}', email=f'c{i}@example.com', created_at=now + timedelta(seconds=i))
+            db_session.add(customer)
+            db_session.commit()
+            customers.append(customer)
+        for i in range(2):
+            ApiKeyService.create_api_key(customer_id=customers[2].id, name=f'Key {i}')
+        revoked, _ = ApiKeyService.create_api_key(customer_id=customers[2].id, name='Revoked')
+        ApiKeyService.revoke_api_key(revoked.id)
+
+        rows = StatsService.customers_with_key_counts(limit=2)
+
+        assert [(row.Customer.name, row.total_keys, row.active_keys) for row in rows] == [
+            ('C2', 3, 2), ('C1', 0, 0),
+        ]
+
+        rest = StatsService.customers_with_key_counts(limit=2, after_id=rows[-1].Customer.id)
+        assert [row.Customer.name for row in rest] == ['C0']
@@ -0,0 +1,116 @@
+# ABOUTME: Unit tests for start-up warm-up and the readiness endpoint
+# ABOUTME: Tests hotness ordering, budgets, the readiness threshold and retries
+
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy.engine import Engine
+from app import db
+from app.services.api_key_service import ApiKeyService
+from app.services.key_snapshot import key_snapshot
+from app.services.warmup import Warmup, warmup
+
+
+@pytest.fixture
+def required_warmup(app, monkeypatch):
+    """Make warm-up required and keep it from closing the in-memory test database"""
+    monkeypatch.setattr(Engine, 'dispose', lambda self, close=True: None)
+    monkeypatch.setattr(warmup, 'required', True)
+    monkeypatch.setattr(warmup, 'state', Warmup.PENDING)
+    monkeypatch.setattr(warmup, 'stats', {})
+    monkeypatch.setattr(warmup, 'progress', {'target': 0, 'warmed': 0})
+    monkeypatch.setattr(warmup, 'key_budget', 50000)
+    monkeypatch.setattr(warmup, 'seconds_budget', 30.0)
+    monkeypatch.setattr(warmup, 'ready_fraction', 0.9)
+    key_snapshot.clear()
+    yield warmup
+    warmup.error = None
+    key_snapshot.clear()
+
+
+@pytest.fixture
+def used_keys(db_session, sample_customer):
+    """Three keys used 1, 2 and 3 hours ago, plus one never used"""
+    keys = []
+    for hours in (3, 1, None, 2):
+        api_key, plaintext = ApiKeyService.create_api_key(customer_id=sample_customer.id, name=f'Key {hours}')
+        api_key.last_used_at = datetime.utcnow() - timedelta(hours=hours) if hours else None
+        keys.append((api_key.id, plaintext))
+    db.session.commit()
+    return keys
+
+
+class TestWarmup:
+    """Test Warmup and /api/ready"""
+
+    def test_ready_when_warmup_not_required(self, client):
+        """Test processes that skip warm-up report ready"""
+        assert client.get('/api/ready').status_code == 200
+
+    def test_unready_until_warm(self, app, client, db_session, sample_api_key, required_warmup):
+        """Test readiness flips once warm-up has loaded keys and compiled templates"""
+        assert client.get('/api/ready').status_code == 503
+
+        assert required_warmup.run(app) is True
+
+        response = client.get('/api/ready')
+        assert response.status_code == 200
+        assert response.json['warmup']['keys'] == 1
+        assert response.json['warmup']['templates'] > 0
+        assert key_snapshot.find(sample_api_key._plaintext) is not None
+
+    def test_probe_uses_id_lookups(self, app, db_session, required_warmup, monkeypatch):
+        """Test the warm-up probe key goes through the id lookup, not the legacy key_hash one"""
+        from app.models.api_key import ApiKey
+        probes = []
+        monkeypatch.setattr(ApiKeyService, 'verify_api_key', staticmethod(probes.append))
+        monkeypatch.setattr(ApiKeyService, 'verify_api_keys', staticmethod(lambda keys: probes.extend(keys)))
+
+        required_warmup.run(app)
+
+        assert len(probes) == 2
+        assert all(ApiKey.parse_key_id(probe) is not None for probe in probes)
+
+    def test_key_budget_takes_hottest_keys(self, app, db_session, used_keys, required_warmup):
+        """Test a key budget loads the most recently used keys first"""
+        required_warmup.key_budget = 2
+
+        assert required_warmup.run(app) is True
+
+        warmed = [key_id for key_id, plaintext in used_keys if key_snapshot.find(plaintext)]
+        assert warmed == [used_keys[1][0], used_keys[3][0]]
+        assert required_warmup.progress == {'target': 2, 'warmed': 2}
+
+    def test_unready_below_threshold(self, app, client, db_session, used_keys, required_warmup):
+        """Test a spent time budget leaves the process unready and retries in the background"""
+        required_warmup.seconds_budget = 0
+
+        assert required_warmup.run(app) is False
+        assert required_warmup.progress == {'target': 4, 'warmed': 0}
+
+        assert required_warmup.is_ready() is False
+
+        required_warmup.seconds_budget = 30.0
+        client.get('/api/ready')
+        required_warmup._thread.join()
+
+        assert client.get('/api/ready').status_code == 200
+        assert required_warmup.progress == {'target': 4, 'warmed': 4}
+
+    def test_failed_warmup_is_retried(self, app, client, db_session, required_warmup, monkeypatch):
+        """Test a failed warm-up stays unready and is retried by the readiness check"""
+        def broken(self, app, deadline):
+            raise RuntimeError('database is starting')
+
+        warm = Warmup._warm
+        monkeypatch.setattr(Warmup, '_warm', broken)
+        assert required_warmup.run(app) is False
+        monkeypatch.setattr(Warmup, '_warm', warm)
+        assert required_warmup.is_ready() is False
+
+        client.get('/api/ready')
+        required_warmup._thread.join()
+
+        response = client.get('/api/ready')
+        assert response.status_code == 200
+        assert response.json['state'] == 'done'
@@ -10,5 +10,10 @@ load_dotenv()
 config_name = os.environ.get('FLASK_ENV', 'production')
 app = create_app(config_name)
 
+# With gunicorn's preload_app this runs once in the master, before workers fork
+if app.config['WARMUP_ON_START']:
+    from app.services.warmup import warmup
+    warmup.run(app)
+
 if __name__ == '__main__':
     app.run()